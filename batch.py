@@ -0,0 +1,284 @@
+"""
+Thousands of games stepped at once.
+
+    python batch.py --level expert --games 10000 --steps 100
+
+BatchGame holds K independent games as stacked (K, rows, cols) arrays
+and makes one move in every game per step with whole-stack NumPy
+operations, so the Python overhead of a move is paid once per step
+instead of once per game.  It follows the rules of engine.Game:
+
+    reveal  the first reveal of a game makes its board, with the clicked
+            cell and its neighbours kept clear; a zero uncovers its
+            opening by growing it one ring of neighbours at a time until
+            nothing changes, which every game with a zero does together
+    flag    toggles a flag on a covered cell of a started game
+    chord   uncovers the covered, unflagged neighbours of a revealed
+            number once the right number of flags is around it
+
+One difference: a chord that hits a mine still uncovers its other cells
+(and a lost game is lost even if they were the last safe ones), where
+engine.Game stops at the mine.  Games that end are restarted in place
+with refill=True, or are left alone and ignore further moves.
+
+Run as a script it plays random moves with the batch and with one
+engine.Game per game and prints the moves per second of both.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from cli import add_board_arguments, board_size
+from engine import Game, PLAYING, WON, LOST
+from minefield import MINE
+from replay import REVEAL, FLAG, CHORD
+from topology import KINDS, get_topology
+
+ACTIONS = ['reveal', 'flag', 'chord']
+# What .status holds per game: small ints for the arrays, not engine's
+# status strings.  STATUSES[code] is the engine status of a code.
+ON, WIN, LOSS = range(3)
+STATUSES = [PLAYING, WON, LOST]
+
+
+class BatchGame:
+    """
+    k games of the same size and topology.  .minefields, .revealed and
+    .flagged are (k, rows, cols) arrays; .status holds ON, WIN or LOSS
+    per game.  .won and .lost count the games refilled so far and .moves
+    the moves made in games that were still on.
+    """
+    def __init__(self, k, rows=9, cols=9, num_mines=10, seed=None,
+                 topology='square', refill=True):
+        if not 0 <= num_mines < rows * cols:
+            raise ValueError(''.join((
+                'Cannot place ', str(num_mines), ' mines on a ', str(rows),
+                ' x ', str(cols), ' board and keep a first click clear.')))
+        self.k = k
+        self.rows = rows
+        self.cols = cols
+        self.num_mines = num_mines
+        self.topology = get_topology(topology, rows, cols)
+        self.rng = np.random.default_rng(seed)
+        self.refill = refill
+        self.minefields = np.zeros((k, rows, cols), dtype=np.uint8)
+        self.revealed = np.zeros((k, rows, cols), dtype=bool)
+        self.flagged = np.zeros((k, rows, cols), dtype=bool)
+        self.started = np.zeros(k, dtype=bool)
+        self.status = np.zeros(k, dtype=np.int8)
+        self.num_revealed = np.zeros(k, dtype=np.int64)
+        self.num_flagged = np.zeros(k, dtype=np.int64)
+        self.games = np.arange(k)
+        self.won = 0
+        self.lost = 0
+        self.moves = 0
+
+    def restart(self, games=None):
+        """Start the given games (an index array or mask; all by default) over."""
+        if games is None:
+            games = self.games
+        self.revealed[games] = False
+        self.flagged[games] = False
+        self.started[games] = False
+        self.status[games] = ON
+        self.num_revealed[games] = 0
+        self.num_flagged[games] = 0
+
+    def load(self, games, minefields):
+        """Play the given games on ready-made boards instead."""
+        self.restart(games)
+        self.minefields[games] = minefields
+        self.started[games] = True
+
+    def generate(self, games, cells):
+        """
+        New boards for games with their first click on cells, sampled like
+        minefield.generate_minefields: the num_mines smallest of a row of
+        random keys, with the keys of the cleared cells out of reach.
+        """
+        n = self.rows * self.cols
+        m = len(games)
+        click = np.zeros((m, n), dtype=bool)
+        click[np.arange(m), cells] = True
+        clear = self.topology.dilate(
+            click.reshape(m, self.rows, self.cols)).reshape(m, n)
+        crowded = n - np.count_nonzero(clear, axis=1) < self.num_mines
+        clear[crowded] = click[crowded]
+        mines = np.zeros((m, n), dtype=bool)
+        if self.num_mines:
+            keys = self.rng.random((m, n), dtype=np.float32)
+            keys[clear] = 2
+            picks = np.argpartition(keys, self.num_mines - 1,
+                                    axis=1)[:, :self.num_mines]
+            np.put_along_axis(mines, picks, True, axis=1)
+        self.minefields[games] = self.topology.minefield(
+            mines.reshape(m, self.rows, self.cols))
+        self.started[games] = True
+
+    def step(self, actions, rows, cols):
+        """
+        Make move actions[i] (replay.REVEAL, FLAG or CHORD) on
+        (rows[i], cols[i]) in game i, for every game at once; scalars
+        apply to every game.  Moves in finished games do nothing.  Returns
+        the mask of the games this step finished; with refill they have
+        already been counted in .won or .lost and restarted.
+        """
+        k = self.k
+        n = self.rows * self.cols
+        actions = np.broadcast_to(actions, (k,))
+        cells = np.broadcast_to(np.asarray(rows) * self.cols +
+                                np.asarray(cols), (k,))
+        live = self.status == ON
+        self.moves += int(np.count_nonzero(live))
+        first = live & ~self.started & (actions == REVEAL)
+        if first.any():
+            self.generate(np.flatnonzero(first), cells[first])
+        live &= self.started
+        minefields = self.minefields.reshape(k, n)
+        revealed = self.revealed.reshape(k, n)
+        flagged = self.flagged.reshape(k, n)
+        shown = revealed[self.games, cells]
+        flags = flagged[self.games, cells]
+
+        toggle = np.flatnonzero(live & (actions == FLAG) & ~shown)
+        if toggle.size:
+            flagged[toggle, cells[toggle]] = ~flags[toggle]
+            self.num_flagged[toggle] += np.where(flags[toggle], -1, 1)
+
+        # Reveals and chords both come down to uncovering (game, cell) pairs.
+        games = np.flatnonzero(live & (actions == REVEAL) & ~shown & ~flags)
+        targets = cells[games]
+        chords = np.flatnonzero(live & (actions == CHORD) & shown)
+        if chords.size:
+            around = self.topology.adjacent(cells[chords])
+            inside = around < n
+            near = np.where(inside, around, 0)
+            owner = np.broadcast_to(chords[:, None], around.shape)
+            near_flags = flagged[owner, near] & inside
+            ready = np.count_nonzero(near_flags, axis=1) == \
+                minefields[chords, cells[chords]]
+            pick = inside & ready[:, None] & ~near_flags & \
+                ~revealed[owner, near]
+            games = np.concatenate([games, owner[pick]])
+            targets = np.concatenate([targets, around[pick]])
+        if games.size:
+            self.uncover(games, targets)
+
+        won = live & (self.status == ON) & \
+            (self.num_revealed >= n - self.num_mines)
+        self.status[won] = WIN
+        finished = live & (self.status != ON)
+        if self.refill and finished.any():
+            ends = np.bincount(self.status[finished], minlength=3)
+            self.won += int(ends[WIN])
+            self.lost += int(ends[LOSS])
+            self.restart(finished)
+        return finished
+
+    def uncover(self, games, cells):
+        """Reveal the given covered cells, cascading from the zeros."""
+        n = self.rows * self.cols
+        values = self.minefields.reshape(self.k, n)[games, cells]
+        self.revealed.reshape(self.k, n)[games, cells] = True
+        self.num_revealed += np.bincount(games, minlength=self.k)
+        self.status[games[values == MINE]] = LOSS
+        zero = (values == 0) & (self.status[games] == ON)
+        if zero.any():
+            self.cascade(games[zero], cells[zero])
+
+    def cascade(self, games, cells):
+        """
+        Open the openings of the given zero cells.  The zeros reached so
+        far grow by one ring of neighbours per round until no new zero is
+        reached; every game takes part until its own openings are done,
+        then drops out.  The numbers around them are uncovered at the end.
+        As in engine.Game, the cascade only goes on through covered,
+        unflagged zeros.
+        """
+        n = self.rows * self.cols
+        shape = (self.rows, self.cols)
+        games, index = np.unique(games, return_inverse=True)
+        front = np.zeros((len(games), n), dtype=bool)
+        front[index, cells] = True
+        front = front.reshape((len(games),) + shape)
+        zero = (self.minefields[games] == 0) & ~self.revealed[games] & \
+            ~self.flagged[games]
+        seen = front.copy()
+        done = []
+        while games.size:
+            front = self.topology.dilate(front) & zero & ~seen
+            seen |= front
+            going = front.any(axis=(1, 2))
+            if not going.all():
+                done.append((games[~going], seen[~going]))
+                games, front, zero, seen = (games[going], front[going],
+                                            zero[going], seen[going])
+        games = np.concatenate([g for g, _ in done])
+        seen = np.concatenate([s for _, s in done])
+        opened = self.topology.dilate(seen) & ~self.revealed[games] & \
+            ~self.flagged[games]
+        self.revealed[games] |= opened
+        self.num_revealed[games] += np.count_nonzero(opened, axis=(1, 2))
+
+
+def random_moves(steps, k, rows, cols, seed=None):
+    """steps x k random (action, row, col) moves, mostly reveals."""
+    rng = np.random.default_rng(seed)
+    actions = rng.choice([REVEAL, FLAG, CHORD], size=(steps, k),
+                         p=[0.8, 0.1, 0.1])
+    return (actions, rng.integers(rows, size=(steps, k)),
+            rng.integers(cols, size=(steps, k)))
+
+
+def play_batch(batch, moves):
+    for actions, rows, cols in zip(*moves):
+        batch.step(actions, rows, cols)
+
+
+def play_games(games, moves):
+    """The same moves through one engine.Game per game, restarting ends."""
+    for actions, rows, cols in zip(*moves):
+        for game, action, r, c in zip(games, actions.tolist(), rows.tolist(),
+                                      cols.tolist()):
+            getattr(game, ACTIONS[action])(r, c)
+            if game.gameover:
+                game.restart()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_board_arguments(parser, 'expert')
+    parser.add_argument('--topology', choices=KINDS, default='square')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--loop-games', type=int, default=1000,
+                        help='games for the one-at-a-time comparison')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rows, cols, num_mines = board_size(args)
+
+    batch = BatchGame(args.games, rows, cols, num_mines, seed=args.seed,
+                      topology=args.topology)
+    moves = random_moves(args.steps, args.games, rows, cols, args.seed)
+    start = time.perf_counter()
+    play_batch(batch, moves)
+    batch_rate = batch.moves / (time.perf_counter() - start)
+
+    k = min(args.loop_games, args.games)
+    games = [Game(rows, cols, num_mines, seed=args.seed + i,
+                  topology=args.topology) for i in range(k)]
+    start = time.perf_counter()
+    play_games(games, tuple(m[:, :k] for m in moves))
+    loop_rate = args.steps * k / (time.perf_counter() - start)
+
+    print(''.join(('batch:      ', format(batch_rate, ',.0f'), ' moves/s (',
+                   str(batch.won), ' won, ', str(batch.lost), ' lost)')))
+    print(''.join(('one by one: ', format(loop_rate, ',.0f'), ' moves/s')))
+    print(''.join(('speedup:    ', format(batch_rate / loop_rate, '.1f'), 'x')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
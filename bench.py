@@ -0,0 +1,216 @@
+"""
+Benchmarks for the hot paths of the game.
+
+    python bench.py                      run everything, print a table
+    python bench.py -o results.json      also write the results as JSON
+    python bench.py --baseline base.json compare against earlier results
+
+Every benchmark is a setup function that builds its state (untimed) with
+fixed seeds and returns the call to time.  Each is run --repeat times on
+fresh state and the best and median times are reported.  With --baseline,
+any benchmark slower than the baseline by more than --threshold makes the
+exit status non-zero.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from batch import BatchGame, play_batch, random_moves
+from engine import Game
+from metrics import board_metrics
+from minefield import generate_minefield, generate_minefields
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a setup function under name."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def started_game(rows, cols, num_mines, seed=1):
+    """A game whose board has been generated without revealing anything."""
+    game = Game(rows, cols, num_mines, seed=seed)
+    game.load(generate_minefield(rows, cols, num_mines, rows // 2, cols // 2,
+                                 seed=seed))
+    return game
+
+
+for rows, cols, density in [(9, 9, 0.12), (16, 30, 0.21), (100, 100, 0.1),
+                            (100, 100, 0.3), (1000, 1000, 0.1),
+                            (1000, 1000, 0.2), (1000, 1000, 0.5)]:
+    def setup(rows=rows, cols=cols, density=density):
+        mines = int(rows * cols * density)
+        return lambda: generate_minefield(rows, cols, mines, 0, 0, seed=1)
+    benchmark(''.join(('generate/', str(rows), 'x', str(cols), '@',
+                       str(density))))(setup)
+
+
+@benchmark('generate/batch-10000-expert')
+def _():
+    return lambda: generate_minefields(10000, 16, 30, 99, 8, 15, seed=1)
+
+
+@benchmark('metrics/batch-10000-expert')
+def _():
+    boards = generate_minefields(10000, 16, 30, 99, 8, 15, seed=1)
+    return lambda: board_metrics(boards)
+
+
+@benchmark('reveal/flood-1000x1000')
+def _():
+    game = Game(1000, 1000, 1000, seed=1)
+    return lambda: game.reveal(500, 500)
+
+
+@benchmark('reveal/flood-1000x1000-hex')
+def _():
+    game = Game(1000, 1000, 1000, seed=1, topology='hex')
+    return lambda: game.reveal(500, 500)
+
+
+@benchmark('batch/step-10000-expert')
+def _():
+    # Ten random moves in each of 10000 games, refilling the ones that end.
+    batch = BatchGame(10000, 16, 30, 99, seed=1)
+    moves = random_moves(10, 10000, 16, 30, seed=1)
+    return lambda: play_batch(batch, moves)
+
+
+@benchmark('win/reveal-all-safe-100x100')
+def _():
+    # Reveal every safe cell one click at a time, ending in a win.
+    game = started_game(100, 100, 1500)
+    cells = list(zip(*np.nonzero(game.minefield != 9)))
+    cells = [(int(r), int(c)) for r, c in cells]
+
+    def run():
+        for r, c in cells:
+            game.reveal(r, c)
+        assert game.status == 'won'
+    return run
+
+
+@benchmark('chord/expert')
+def _():
+    # Flag every mine, reveal the numbers, then chord on all of them.
+    game = started_game(16, 30, 99)
+    for r, c in zip(*np.nonzero(game.minefield == 9)):
+        game.flag(int(r), int(c))
+    numbers = [(int(r), int(c)) for r, c in zip(*np.nonzero(
+        (game.minefield > 0) & (game.minefield < 9)))]
+    for r, c in numbers:
+        game.reveal(r, c)
+
+    def run():
+        for r, c in numbers:
+            game.chord(r, c)
+    return run
+
+
+@benchmark('flag/toggle-10000')
+def _():
+    game = started_game(100, 100, 1500)
+    cells = [(int(r), int(c)) for r, c in
+             np.random.default_rng(1).integers(100, size=(10000, 2))]
+
+    def run():
+        for r, c in cells:
+            game.flag(r, c)
+    return run
+
+
+@benchmark('restart/1000x1000')
+def _():
+    game = started_game(1000, 1000, 100000)
+    return game.restart
+
+
+@benchmark('render/cells-100x100')
+def _():
+    # What a view does after a full-board change: look up every cell.
+    game = started_game(100, 100, 1500)
+    game.reveal(50, 50)
+    cells = [(r, c) for r in range(100) for c in range(100)]
+    return lambda: [game.cell(r, c) for r, c in cells]
+
+
+def run(names=None, repeat=5):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and not any(n in name for n in names):
+            continue
+        times = []
+        for _ in range(repeat):
+            call = setup()
+            t = time.perf_counter()
+            call()
+            times.append(time.perf_counter() - t)
+        results[name] = {'best': min(times),
+                         'median': statistics.median(times),
+                         'repeat': repeat}
+        print('{:<34} {:>12.3f} ms {:>12.3f} ms'.format(
+            name, results[name]['best'] * 1e3, results[name]['median'] * 1e3))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change against baseline; return the names that regressed."""
+    regressed = []
+    print()
+    print('{:<34} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline',
+                                              'now', 'ratio'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['best'] / baseline[name]['best']
+        mark = ''
+        if ratio > threshold:
+            mark = '  SLOWER'
+            regressed.append(name)
+        elif ratio < 1 / threshold:
+            mark = '  faster'
+        print('{:<34} {:>9.3f} ms {:>9.3f} ms {:>8.2f}{}'.format(
+            name, baseline[name]['best'] * 1e3, result['best'] * 1e3,
+            ratio, mark))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio counted as a regression')
+    args = parser.parse_args(argv)
+
+    print('{:<34} {:>15} {:>15}'.format('benchmark', 'best', 'median'))
+    results = run(args.names, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
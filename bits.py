@@ -0,0 +1,85 @@
+"""
+Bit-packed boolean grids.
+"""
+import numpy as np
+
+# Number of set bits in every byte value.
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None],
+                         axis=1).sum(axis=1).astype(np.uint8)
+# The mask of each bit of a byte, first cell in the high bit.
+BIT = np.array([128 >> i for i in range(8)], dtype=np.uint8)
+
+
+class BitGrid:
+    """
+    A rows x cols boolean array stored eight cells to a byte.
+    Index it with [r, c] for a single cell, with [row slice, col slice]
+    for a block or with [row array, col array] for scattered cells; the
+    last two come back (and can be assigned) as bool arrays.
+    np.asarray() unpacks the whole grid.
+    """
+    def __init__(self, rows, cols):
+        self.shape = (rows, cols)
+        self.bits = np.zeros((rows, (cols + 7) // 8), dtype=np.uint8)
+
+    def __getitem__(self, key):
+        r, c = key
+        if isinstance(r, np.ndarray):
+            if len(r) * 8 > self.bits.size:
+                return np.asarray(self)[r, c]
+            return self.bits[r, c >> 3] & BIT[c & 7] != 0
+        if isinstance(r, slice) or isinstance(c, slice):
+            rows, start, stop, first = self._block(r, c)
+            block = np.unpackbits(self.bits[rows, first:(stop + 7) // 8],
+                                  axis=1)
+            return block[:, start - 8 * first:stop - 8 * first].view(bool)
+        return (self.bits.item(r, c >> 3) >> (7 - (c & 7))) & 1 == 1
+
+    def __setitem__(self, key, value):
+        r, c = key
+        if isinstance(r, np.ndarray):
+            self._scatter(r, c, value)
+        elif isinstance(r, slice) or isinstance(c, slice):
+            rows, start, stop, first = self._block(r, c)
+            last = (stop + 7) // 8
+            block = np.unpackbits(self.bits[rows, first:last], axis=1)
+            block[:, start - 8 * first:stop - 8 * first] = value
+            self.bits[rows, first:last] = np.packbits(block, axis=1)
+        elif value:
+            self.bits[r, c >> 3] = self.bits.item(r, c >> 3) | (128 >> (c & 7))
+        else:
+            self.bits[r, c >> 3] = self.bits.item(r, c >> 3) & ~(128 >> (c & 7))
+
+    def _scatter(self, r, c, value):
+        if len(r) * 8 > self.bits.size:
+            # Cheaper to rewrite the whole grid than to go bit by bit.
+            grid = np.asarray(self)
+            grid[r, c] = value
+            self.bits[:] = np.packbits(grid, axis=1)
+        elif value:
+            np.bitwise_or.at(self.bits, (r, c >> 3), BIT[c & 7])
+        else:
+            np.bitwise_and.at(self.bits, (r, c >> 3), ~BIT[c & 7])
+
+    def _block(self, r, c):
+        if not isinstance(r, slice):
+            r = slice(r, r + 1)
+        if not isinstance(c, slice):
+            c = slice(c, c + 1)
+        start, stop, _ = c.indices(self.shape[1])
+        return r, start, stop, start // 8
+
+    def __array__(self, dtype=None, copy=None):
+        grid = np.unpackbits(self.bits, axis=1, count=self.shape[1]).view(bool)
+        return grid if dtype is None else grid.astype(dtype)
+
+    def __invert__(self):
+        return ~np.asarray(self)
+
+    def count(self):
+        """Number of cells that are set."""
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
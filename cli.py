@@ -0,0 +1,25 @@
+"""
+Command-line options shared by the tools.
+"""
+from engine import LEVELS
+
+
+def add_board_arguments(parser, default='beginner'):
+    """
+    Add --level, a lower-case name from engine.LEVELS, and --size ROWS COLS
+    MINES to an argparse parser.
+    """
+    parser.add_argument('--level', default=default,
+                        choices=[name.lower() for name, _, _, _ in LEVELS])
+    parser.add_argument('--size', nargs=3, type=int,
+                        metavar=('ROWS', 'COLS', 'MINES'),
+                        help='custom board, overrides --level')
+
+
+def board_size(args):
+    """The (rows, cols, mines) asked for by add_board_arguments() options."""
+    if args.size:
+        return tuple(args.size)
+    for name, rows, cols, num_mines in LEVELS:
+        if name.lower() == args.level:
+            return rows, cols, num_mines
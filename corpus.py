@@ -0,0 +1,320 @@
+"""
+Board corpora: large libraries of boards on disk.
+
+    python corpus.py build expert-boards --level expert -n 10000000
+    python corpus.py info expert-boards
+    python corpus.py verify expert-boards
+
+A corpus is a directory holding manifest.json and numbered shard files.
+Every shard starts with a 32 byte header
+
+    b'MSCB', version, 3 pad bytes, rows, cols, mines, record size (u32 LE),
+    number of boards (u64 LE)
+
+followed by fixed-size records: the board's mines as np.packbits bytes
+and then the metadata columns named in the manifest (a seed, 3BV, ...).
+Shards hold up to shard_size boards; all but the last are full.  The
+manifest also keeps the CRC-32 of every shard's records, kept up to date
+as boards are appended.
+
+Shards are opened with np.memmap, so reading part of a column or indexing
+boards only touches the pages involved, and neighbour counts are rebuilt
+just for the boards asked for.  Nothing reads a whole column into memory
+unless asked to: index it with [:], or stream it with iter_shards().
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from cli import add_board_arguments, board_size
+from metrics import board_metrics
+from minefield import (MINE, game_seed, generate_minefields,
+                       mines_to_minefield)
+
+MAGIC = b'MSCB'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xIIIIQ')
+MANIFEST = 'manifest.json'
+
+
+def build_columns(rows, cols):
+    """
+    The columns of a corpus made by build.  The metrics are at most the
+    number of cells, which fits in two bytes on the usual boards.
+    """
+    count = '<u2' if rows * cols <= np.iinfo(np.uint16).max else '<u4'
+    return [('seed', '<u8'), ('slot', '<u4'), ('3bv', count),
+            ('openings', count), ('islands', count)]
+
+
+class Corpus:
+    """
+    An open corpus.  len(corpus) is the number of boards, .mines[key],
+    .minefields[key] and .column(name)[key] read the boards or a metadata
+    column at an int, slice or index array.  .append() adds boards.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != VERSION:
+            raise ValueError(''.join(('Unknown corpus version ',
+                                      str(self.manifest.get('version')), '.')))
+        self.rows = self.manifest['rows']
+        self.cols = self.manifest['cols']
+        self.num_mines = self.manifest['mines']
+        self.shard_size = self.manifest['shard_size']
+        self.dtype = np.dtype(
+            [('mines', 'u1', ((self.rows * self.cols + 7) // 8,))] +
+            [(name, dtype) for name, dtype in self.manifest['columns']])
+        self.maps = {}   # shard number -> memmap of its records
+
+    @classmethod
+    def create(cls, path, rows, cols, num_mines, columns=None,
+               shard_size=1 << 20):
+        """
+        Make an empty corpus in the new directory path, with the columns of
+        build_columns() unless others are given.
+        """
+        if columns is None:
+            columns = build_columns(rows, cols)
+        os.makedirs(path)
+        manifest = {'version': VERSION, 'rows': rows, 'cols': cols,
+                    'mines': num_mines, 'columns': [list(c) for c in columns],
+                    'shard_size': shard_size, 'shards': []}
+        write_manifest(path, manifest)
+        return cls(path)
+
+    def __len__(self):
+        return sum(shard['count'] for shard in self.manifest['shards'])
+
+    def shard_path(self, i):
+        return os.path.join(self.path, self.manifest['shards'][i]['file'])
+
+    def shard(self, i):
+        """The records of shard i as a read-only memmap."""
+        records = self.maps.get(i)
+        count = self.manifest['shards'][i]['count']
+        if records is None or len(records) != count:
+            records = np.memmap(self.shard_path(i), dtype=self.dtype,
+                                mode='r', offset=HEADER.size, shape=(count,))
+            self.maps[i] = records
+        return records
+
+    def records(self, key, name=None):
+        """
+        The records at key, or just their column name, gathered from the
+        shards they live in.
+        """
+        n = len(self)
+        if isinstance(key, slice):
+            index = np.arange(*key.indices(n))
+        else:
+            index = np.asarray(key, dtype=np.int64)
+            index = np.where(index < 0, index + n, index)
+            if ((index < 0) | (index >= n)).any():
+                raise IndexError('Board index out of range.')
+        single = index.ndim == 0
+        index = np.atleast_1d(index)
+        out = np.empty(index.shape,
+                       dtype=self.dtype if name is None else self.dtype[name])
+        shards, offsets = np.divmod(index, self.shard_size)
+        for i in np.unique(shards):
+            here = shards == i
+            records = self.shard(int(i))
+            if name is not None:
+                records = records[name]
+            out[here] = records[offsets[here]]
+        return out[0] if single else out
+
+    def unpack(self, packed):
+        cells = self.rows * self.cols
+        mines = np.unpackbits(packed, axis=-1, count=cells)
+        return mines.reshape(packed.shape[:-1] + (self.rows, self.cols)) \
+                    .view(bool)
+
+    @property
+    def mines(self):
+        """Index for bool mine masks: corpus.mines[10:20]."""
+        return Indexer(lambda key: self.unpack(self.records(key)['mines']))
+
+    @property
+    def minefields(self):
+        """Index for uint8 minefields, numbers rebuilt on demand."""
+        return Indexer(lambda key: mines_to_minefield(
+            self.unpack(self.records(key)['mines'])))
+
+    def column(self, name):
+        """
+        Index for a metadata column, read only from the shards the boards
+        asked for live in: corpus.column('3bv')[10:20].
+        """
+        if name not in self.dtype.names or name == 'mines':
+            raise ValueError(''.join(('No column ', name, '.')))
+        return Indexer(lambda key: self.records(key, name))
+
+    def iter_shards(self):
+        """Stream the corpus one shard memmap at a time."""
+        for i in range(len(self.manifest['shards'])):
+            yield self.shard(i)
+
+    def append(self, boards, **columns):
+        """
+        Add an (n, rows, cols) stack of boards, given as bool mine masks or
+        as uint8 minefields, with a value or an array for each metadata
+        column.  Raises ValueError for boards of any other type, uint8
+        boards that are not minefields (a 0/1 mask, say) and values too big
+        for a column, rather than store something else.
+        """
+        boards = np.asarray(boards)
+        if boards.ndim != 3 or boards.shape[1:] != (self.rows, self.cols):
+            raise ValueError('Boards do not match the corpus size.')
+        if boards.dtype == bool:
+            mines = boards
+        elif boards.dtype == np.uint8:
+            mines = boards == MINE
+            if not (mines_to_minefield(mines) == boards).all():
+                raise ValueError('uint8 boards must be minefields; '
+                                 'give mine masks as bool.')
+        else:
+            raise ValueError('Boards must be bool mine masks or uint8 '
+                             'minefields.')
+        if (np.count_nonzero(mines, axis=(1, 2)) != self.num_mines).any():
+            raise ValueError(''.join(('Boards must have ',
+                                      str(self.num_mines), ' mines.')))
+        records = np.zeros(len(boards), dtype=self.dtype)
+        records['mines'] = np.packbits(mines.reshape(len(boards), -1), axis=1)
+        for name, values in columns.items():
+            if name not in self.dtype.names or name == 'mines':
+                raise ValueError(''.join(('No column ', name, '.')))
+            values = np.asarray(values)
+            kind = self.dtype[name]
+            if kind.kind in 'iu' and values.size and \
+                    (values.min() < np.iinfo(kind).min or
+                     values.max() > np.iinfo(kind).max):
+                raise ValueError(''.join(('Values of column ', name,
+                                          ' do not fit in ', str(kind), '.')))
+            records[name] = values
+        shards = self.manifest['shards']
+        done = 0
+        while done < len(records):
+            if not shards or shards[-1]['count'] == self.shard_size:
+                name = ''.join(('shard-', format(len(shards), '05d'), '.msc'))
+                shards.append({'file': name, 'count': 0, 'crc32': 0})
+                self.write_header(len(shards) - 1)
+            shard = shards[-1]
+            part = records[done:done + self.shard_size - shard['count']]
+            data = part.tobytes()
+            with open(self.shard_path(len(shards) - 1), 'r+b') as f:
+                f.seek(HEADER.size + shard['count'] * self.dtype.itemsize)
+                f.write(data)
+                shard['count'] += len(part)
+                shard['crc32'] = zlib.crc32(data, shard['crc32'])
+                f.seek(0)
+                f.write(self.header(shard['count']))
+            done += len(part)
+        write_manifest(self.path, self.manifest)
+
+    def header(self, count):
+        return HEADER.pack(MAGIC, VERSION, self.rows, self.cols,
+                           self.num_mines, self.dtype.itemsize, count)
+
+    def write_header(self, i):
+        with open(self.shard_path(i), 'wb') as f:
+            f.write(self.header(0))
+
+    def verify(self):
+        """Check every shard's header and checksum.  Raises ValueError."""
+        for i, shard in enumerate(self.manifest['shards']):
+            with open(self.shard_path(i), 'rb') as f:
+                header = f.read(HEADER.size)
+                if header != self.header(shard['count']):
+                    raise ValueError(''.join(('Bad header in ',
+                                              shard['file'], '.')))
+                crc = 0
+                size = shard['count'] * self.dtype.itemsize
+                while size > 0:
+                    data = f.read(min(size, 1 << 24))
+                    if not data:
+                        break
+                    crc = zlib.crc32(data, crc)
+                    size -= len(data)
+            if size != 0 or crc != shard['crc32']:
+                raise ValueError(''.join(('Checksum mismatch in ',
+                                          shard['file'], '.')))
+
+
+class Indexer:
+    def __init__(self, get):
+        self.get = get
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+
+def write_manifest(path, manifest):
+    """Replace the manifest in one step so readers never see half of it."""
+    temp = os.path.join(path, MANIFEST + '.tmp')
+    with open(temp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp, os.path.join(path, MANIFEST))
+
+
+def build(path, rows, cols, num_mines, n, seed=0, batch=100000,
+          shard_size=1 << 20):
+    """
+    Generate n boards with their metrics into a new corpus.  Board slot of
+    batch seed s is generate_minefields(batch, rows, cols, num_mines,
+    seed=s)[slot].
+    """
+    corpus = Corpus.create(path, rows, cols, num_mines,
+                           build_columns(rows, cols), shard_size)
+    for k, start in enumerate(range(0, n, batch)):
+        s = game_seed(seed, k)
+        boards = generate_minefields(batch, rows, cols, num_mines, seed=s)
+        boards = boards[:n - start]
+        metrics = board_metrics(boards)
+        corpus.append(boards, seed=s, slot=np.arange(len(boards)),
+                      openings=metrics['openings'], islands=metrics['islands'],
+                      **{'3bv': metrics['3bv']})
+    return corpus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    make = commands.add_parser('build', help='generate a new corpus')
+    make.add_argument('path')
+    add_board_arguments(make, 'expert')
+    make.add_argument('-n', '--boards', type=int, default=1000000)
+    make.add_argument('--seed', type=int, default=0)
+    make.add_argument('--batch', type=int, default=100000)
+    make.add_argument('--shard-size', type=int, default=1 << 20)
+    for name in ['info', 'verify']:
+        commands.add_parser(name).add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        rows, cols, num_mines = board_size(args)
+        corpus = build(args.path, rows, cols, num_mines, args.boards,
+                       args.seed, args.batch, args.shard_size)
+    else:
+        corpus = Corpus(args.path)
+    if args.command == 'verify':
+        corpus.verify()
+        print('ok')
+    else:
+        print(''.join((str(len(corpus)), ' boards of ', str(corpus.rows),
+                       ' x ', str(corpus.cols), ', ', str(corpus.num_mines),
+                       ' mines in ', str(len(corpus.manifest['shards'])),
+                       ' shards')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
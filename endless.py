@@ -0,0 +1,242 @@
+"""
+Endless minesweeper.
+
+The world is cut into CHUNK x CHUNK chunks.  A chunk's mines are drawn
+from (seed, chunk row, chunk column) alone, so any chunk can be made, thrown
+away and made again identically.  Chunks are only generated when a reveal
+(or a lost game's view) needs their numbers; the numbers along a chunk's
+edges come from the mines of the chunks around it.
+
+Generated chunks live in a least-recently-used cache and are dropped when
+it is full.  The only state kept for good is the revealed and flagged
+bits of chunks the player has touched, 256 bytes per chunk, so memory
+does not depend on how far the player scrolls.
+
+The eviction is plain LRU on purpose: it ignores how far a chunk is from
+the player and whether the player has touched it.  Neither matters for
+correctness, since touched chunks keep their bits outside the cache and
+a dropped chunk comes back identical; at worst a chunk near the player
+is made again sooner than a smarter policy would have made it.
+"""
+import collections
+
+import numpy as np
+
+from bits import BitGrid
+from engine import PLAYING, LOST
+from minefield import MINE, count_neighbors, dilate
+
+CHUNK = 32
+
+
+class EndlessGame:
+    """
+    An endless game with the same interface as engine.Game.
+
+    The world is size x size cells (size a multiple of CHUNK), which is as
+    good as endless for a player, with the start at its centre.  The cells
+    around the start are always clear, and the first reveal moves the
+    start to the clicked cell, so the first click is always safe.  density
+    is the chance of a mine under any cell; below about 0.12 openings can
+    grow without bound, so that is not allowed.
+    """
+    def __init__(self, seed=None, density=0.16, size=2**21, cache_size=512):
+        if not 0.12 <= density < 1:
+            raise ValueError('density should be between 0.12 and 1.')
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2**63))
+        self.seed = seed
+        self.density = density
+        self.rows = size
+        self.cols = size
+        self.chunks = size // CHUNK
+        self.start = (size // 2, size // 2)
+        self.cache_size = cache_size
+        self.mine_cache = collections.OrderedDict()
+        self.number_cache = collections.OrderedDict()
+        self.state = {}   # (chunk row, chunk col) -> (revealed, flagged)
+        self.num_revealed = 0
+        self.num_flagged = 0
+        self.status = PLAYING
+        self.lost_cell = None
+
+    @property
+    def first(self):
+        return self.num_revealed == 0
+
+    @property
+    def gameover(self):
+        return self.status != PLAYING
+
+    @property
+    def mines_left(self):
+        """There is no mine count in an endless world; count flags instead."""
+        return self.num_flagged
+
+    def cached(self, cache, key, make):
+        value = cache.get(key)
+        if value is None:
+            value = make(*key)
+            cache[key] = value
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return value
+
+    def make_mines(self, cx, cy):
+        if not (0 <= cx < self.chunks and 0 <= cy < self.chunks):
+            return np.zeros((CHUNK, CHUNK), dtype=bool)
+        rng = np.random.default_rng([self.seed, cx, cy])
+        mines = rng.random((CHUNK, CHUNK)) < self.density
+        r, c = self.start[0] - cx * CHUNK, self.start[1] - cy * CHUNK
+        mines[max(r - 1, 0):max(min(r + 2, CHUNK), 0),
+              max(c - 1, 0):max(min(c + 2, CHUNK), 0)] = False
+        return mines
+
+    def make_numbers(self, cx, cy):
+        block = np.block([[self.cached(self.mine_cache, (cx + i, cy + j),
+                                       self.make_mines)
+                           for j in (-1, 0, 1)] for i in (-1, 0, 1)])
+        numbers = count_neighbors(block)[CHUNK:2 * CHUNK, CHUNK:2 * CHUNK]
+        numbers[block[CHUNK:2 * CHUNK, CHUNK:2 * CHUNK]] = MINE
+        return numbers
+
+    def numbers(self, cx, cy):
+        """The minefield of a chunk, generating it if needed."""
+        return self.cached(self.number_cache, (cx, cy), self.make_numbers)
+
+    def chunk_state(self, cx, cy):
+        state = self.state.get((cx, cy))
+        if state is None:
+            state = (BitGrid(CHUNK, CHUNK), BitGrid(CHUNK, CHUNK))
+            self.state[cx, cy] = state
+        return state
+
+    def is_revealed(self, r, c):
+        state = self.state.get((r // CHUNK, c // CHUNK))
+        return state is not None and state[0][r % CHUNK, c % CHUNK]
+
+    def is_flagged(self, r, c):
+        state = self.state.get((r // CHUNK, c // CHUNK))
+        return state is not None and state[1][r % CHUNK, c % CHUNK]
+
+    def value(self, r, c):
+        return int(self.numbers(r // CHUNK, c // CHUNK)[r % CHUNK, c % CHUNK])
+
+    def neighbors(self, r, c):
+        return [(x, y)
+                for x in range(max(r - 1, 0), min(r + 2, self.rows))
+                for y in range(max(c - 1, 0), min(c + 2, self.cols))
+                if x != r or y != c]
+
+    def cell(self, r, c):
+        if self.is_revealed(r, c):
+            if (r, c) == self.lost_cell:
+                return '9'
+            return str(self.value(r, c))
+        flagged = self.is_flagged(r, c)
+        if self.status == LOST:
+            mine = self.value(r, c) == MINE
+            if mine and not flagged:
+                return 'bomb'
+            if flagged and not mine:
+                return 'xbomb'
+        return 'flag' if flagged else 'blank'
+
+    def reveal(self, r, c):
+        if self.gameover or self.is_revealed(r, c) or self.is_flagged(r, c):
+            return []
+        if self.first:
+            # The first click is always safe: the start, which has no mines
+            # around it, moves there.  Nothing depends on the old one yet.
+            self.start = (r, c)
+            self.mine_cache.clear()
+            self.number_cache.clear()
+        value = self.value(r, c)
+        if value == MINE:
+            self.chunk_state(r // CHUNK, c // CHUNK)[0][r % CHUNK,
+                                                        c % CHUNK] = True
+            self.num_revealed += 1
+            self.status = LOST
+            self.lost_cell = (r, c)
+            return [(r, c)]
+        seeds = np.zeros((CHUNK, CHUNK), dtype=bool)
+        seeds[r % CHUNK, c % CHUNK] = True
+        changed = self.flood({(r // CHUNK, c // CHUNK): seeds})
+        self.num_revealed += len(changed)
+        return changed
+
+    def flood(self, queue):
+        """
+        Reveal the seed cells of every chunk in queue and the openings they
+        start, a whole chunk at a time.  Openings that reach a chunk's edge
+        put seeds into the next chunk.
+        """
+        from scipy import ndimage
+        changed = []
+        while queue:
+            (cx, cy), seeds = queue.popitem()
+            numbers = self.numbers(cx, cy)
+            revealed, flagged = self.chunk_state(cx, cy)
+            covered = ~revealed & ~flagged
+            seeds &= covered
+            if not seeds.any():
+                continue
+            # Like a click, the cascade only goes on through covered zeros.
+            labels, _ = ndimage.label((numbers == 0) & covered,
+                                      structure=np.ones((3, 3)))
+            hit = np.unique(labels[seeds])
+            grown = np.zeros((CHUNK + 2, CHUNK + 2), dtype=bool)
+            grown[1:-1, 1:-1] = np.isin(labels, hit[hit > 0])
+            grown = dilate(grown)
+            opened = (grown[1:-1, 1:-1] | seeds) & covered
+            revealed[:, :] = np.asarray(revealed) | opened
+            xs, ys = np.nonzero(opened)
+            changed += list(zip((xs + cx * CHUNK).tolist(),
+                                (ys + cy * CHUNK).tolist()))
+
+            # Spill the ring around the chunk into its neighbours.
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    key = (cx + dx, cy + dy)
+                    if (dx == 0 and dy == 0) or not (
+                            0 <= key[0] < self.chunks and
+                            0 <= key[1] < self.chunks):
+                        continue
+                    rs = {-1: slice(0, 1), 0: slice(1, -1),
+                          1: slice(-1, None)}[dx]
+                    cs = {-1: slice(0, 1), 0: slice(1, -1),
+                          1: slice(-1, None)}[dy]
+                    spill = grown[rs, cs]
+                    if not spill.any():
+                        continue
+                    into = queue.get(key)
+                    if into is None:
+                        into = queue[key] = np.zeros((CHUNK, CHUNK),
+                                                     dtype=bool)
+                    into[{-1: slice(-1, None), 0: slice(None),
+                          1: slice(0, 1)}[dx],
+                         {-1: slice(-1, None), 0: slice(None),
+                          1: slice(0, 1)}[dy]] |= spill
+        return changed
+
+    def flag(self, r, c):
+        if self.is_revealed(r, c) or self.first or self.gameover:
+            return []
+        flagged = self.chunk_state(r // CHUNK, c // CHUNK)[1]
+        on = not flagged[r % CHUNK, c % CHUNK]
+        flagged[r % CHUNK, c % CHUNK] = on
+        self.num_flagged += 1 if on else -1
+        return [(r, c)]
+
+    def chord(self, r, c):
+        if not self.is_revealed(r, c) or self.gameover:
+            return []
+        around = self.neighbors(r, c)
+        if sum(self.is_flagged(x, y) for x, y in around) != self.value(r, c):
+            return []
+        changed = []
+        for x, y in around:
+            changed += self.reveal(x, y)
+        return changed
@@ -0,0 +1,287 @@
+"""
+Headless minesweeper rules.
+
+Game holds the state of a single game and applies the player's actions to
+it.  Every action returns the list of (row, col) cells whose appearance
+changed, so a view only has to redraw those.  Nothing in here imports
+tkinter, which makes it usable for bots, servers and analysis.
+"""
+import numpy as np
+
+from bits import BitGrid
+from minefield import MINE, generate_minefield
+from topology import get_topology
+
+PLAYING = 'playing'
+WON = 'won'
+LOST = 'lost'
+
+# Name, rows, columns and mines of the standard levels.
+LEVELS = [('Beginner', 9, 9, 10),
+          ('Intermediate', 16, 16, 40),
+          ('Expert', 16, 30, 99)]
+
+
+
+class Game:
+    """
+    One game of minesweeper.
+
+    The minefield is generated on the first reveal so the first click is
+    always safe.  seed makes the sequence of boards reproducible; the seed
+    used for the current board is kept in board_seed.  generator is called
+    as generator(rows, cols, num_mines, r, c, seed=board_seed) to make the
+    board and defaults to minefield.generate_minefield; it may also return
+    a (minefield, openings) pair as taken by .load().  .load() plays on a
+    ready-made board instead.  topology is one of topology.KINDS and
+    decides which cells neighbour which; the generator is also passed
+    topology=self.topology when it is not 'square'.
+
+    Call .reveal(), .flag() and .chord() to play and .cell() to find out
+    what a cell looks like.  Every change is also written to a journal of
+    deltas, so .snapshot() is free and .rollback() to a snapshot costs as
+    much as the changes it undoes.  Cell appearances are '0' to '8' for revealed
+    numbers, 'blank' and 'flag' for covered cells and, once the game is
+    lost, '9' for the mine that was hit, 'bomb' for the other mines and
+    'xbomb' for wrong flags.
+    """
+    def __init__(self, rows=9, cols=9, num_mines=10, seed=None,
+                 generator=generate_minefield, topology='square'):
+        self.rows = rows
+        self.cols = cols
+        self.num_mines = num_mines
+        self.generator = generator
+        self.topology = get_topology(topology, rows, cols)
+        self.rng = np.random.default_rng(seed)
+        self.restart()
+
+    def restart(self):
+        self.minefield = None
+        self.openings = None
+        self.opening_cells = None
+        self.opening_starts = None
+        self.board_seed = int(self.rng.integers(2**63))
+        # Packed eight cells to a byte so huge boards stay small.
+        self.revealed = BitGrid(self.rows, self.cols)
+        self.flagged = BitGrid(self.rows, self.cols)
+        # Running counts so no action has to rescan the board.
+        self.num_revealed = 0
+        self.num_flagged = 0
+        # Flat, with a spare entry for the topology's padding sentinel.
+        self.neighbor_flags = np.zeros(self.rows * self.cols + 1,
+                                       dtype=np.int8)
+        self.status = PLAYING
+        self.lost_cell = None
+        # What each change did, newest last; see rollback().
+        self.journal = []
+
+    def load(self, minefield, openings=None):
+        """
+        Play on the given minefield.  openings is what
+        self.topology.openings(minefield) returns, if already known.
+        """
+        self.minefield = minefield
+        self.num_mines = int(np.count_nonzero(minefield == MINE))
+        if openings is None:
+            openings = self.topology.openings(minefield)
+        self.openings, self.opening_cells, self.opening_starts = openings
+
+    def restore(self, revealed, flagged):
+        """
+        Set the revealed and flagged cells of a game in progress from bool
+        arrays, recomputing the running counts.
+        """
+        self.revealed[:, :] = revealed
+        self.flagged[:, :] = flagged
+        self.num_revealed = self.revealed.count()
+        self.num_flagged = self.flagged.count()
+        self.neighbor_flags = np.append(
+            self.topology.count(flagged).ravel(), 0).astype(np.int8)
+        self.status = PLAYING
+        self.lost_cell = None
+        self.journal = []
+
+    @property
+    def first(self):
+        return self.minefield is None
+
+    @property
+    def gameover(self):
+        return self.status != PLAYING
+
+    @property
+    def mines_left(self):
+        return self.num_mines - self.num_flagged
+
+    def neighbors(self, r, c):
+        """The cells around (r, c) that are on the board."""
+        return self.topology.neighbors(r, c)
+
+    def cell(self, r, c):
+        if self.revealed[r, c]:
+            if (r, c) == self.lost_cell:
+                return '9'
+            return str(self.minefield[r, c])
+        if self.status == LOST:
+            mine = self.minefield[r, c] == MINE
+            if mine and not self.flagged[r, c]:
+                return 'bomb'
+            if self.flagged[r, c] and not mine:
+                return 'xbomb'
+        if self.flagged[r, c]:
+            return 'flag'
+        return 'blank'
+
+    def reveal(self, r, c):
+        """
+        Left click on (r, c).  Clicking a zero opens its precomputed
+        opening in one masked update instead of cell by cell; see open().
+        """
+        if self.gameover:
+            return []
+        if self.first:
+            extra = {}
+            if self.topology.kind != 'square':
+                extra['topology'] = self.topology
+            board = self.generator(self.rows, self.cols, self.num_mines,
+                                   r, c, seed=self.board_seed, **extra)
+            if isinstance(board, tuple):
+                self.load(*board)
+            else:
+                self.load(board)
+            self.journal.append(('load',))
+        if self.revealed[r, c] or self.flagged[r, c]:
+            return []
+        if self.minefield[r, c] == MINE:
+            self.revealed[r, c] = True
+            self.num_revealed += 1
+            self.journal.append(('cell', r, c))
+            return [(r, c)] + self.lose(r, c)
+        if self.minefield[r, c] == 0:
+            changed = self.open(self.openings[r, c], r, c)
+        else:
+            self.revealed[r, c] = True
+            self.journal.append(('cell', r, c))
+            changed = [(r, c)]
+        self.num_revealed += len(changed)
+        if self.num_revealed >= self.rows * self.cols - self.num_mines:
+            self.journal.append(('status', self.status, self.lost_cell))
+            self.status = WON
+        return changed
+
+    def open(self, label, r, c):
+        """
+        Reveal the opening with the given label, clicked at (r, c), and the
+        numbers around it.  The cascade stops at flags and at cells already
+        revealed: if the opening holds any, only the part of it reachable
+        from (r, c) without crossing them opens.
+        """
+        start = self.opening_starts[label - 1]
+        cells = self.opening_cells[start:self.opening_starts[label]]
+        xs, ys = np.divmod(self.topology.around(cells), self.cols)
+        covered = ~self.revealed[xs, ys] & ~self.flagged[xs, ys]
+        if not covered[self.minefield[xs, ys] == 0].all():
+            xs, ys = np.divmod(self.topology.around(
+                self.reachable(cells, r, c)), self.cols)
+            covered = ~self.revealed[xs, ys] & ~self.flagged[xs, ys]
+        xs, ys = xs[covered], ys[covered]
+        self.revealed[xs, ys] = True
+        self.journal.append(('open', xs, ys))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def reachable(self, cells, r, c):
+        """
+        The covered, unflagged cells of the opening cells that connect to
+        (r, c) through each other.
+        """
+        xs, ys = np.divmod(cells, self.cols)
+        free = ~self.revealed[xs, ys] & ~self.flagged[xs, ys]
+        mask = np.zeros(self.rows * self.cols, dtype=bool)
+        mask[cells[free]] = True
+        labels, _ = self.topology.label(mask.reshape(self.rows, self.cols))
+        return np.flatnonzero(labels.ravel() == labels[r, c])
+
+    def flag(self, r, c):
+        """Right click on (r, c)."""
+        if self.revealed[r, c] or self.first or self.gameover:
+            return []
+        self.toggle_flag(r, c)
+        self.journal.append(('flag', r, c))
+        return [(r, c)]
+
+    def toggle_flag(self, r, c):
+        step = -1 if self.flagged[r, c] else 1
+        self.flagged[r, c] = step > 0
+        self.num_flagged += step
+        self.neighbor_flags[
+            self.topology.cell_neighbors(r * self.cols + c)] += step
+
+    def chord(self, r, c):
+        """
+        Both-button click on (r, c).  Reveals the covered neighbours of a
+        revealed number once the right number of flags is around it.
+        """
+        if not self.revealed[r, c] or self.gameover:
+            return []
+        i = r * self.cols + c
+        if self.neighbor_flags[i] != self.minefield[r, c]:
+            return []
+        xs, ys = np.divmod(self.topology.cell_neighbors(i), self.cols)
+        covered = ~self.revealed[xs, ys] & ~self.flagged[xs, ys]
+        changed = []
+        for x, y in zip(xs[covered].tolist(), ys[covered].tolist()):
+            changed += self.reveal(x, y)
+        return changed
+
+    def lose(self, r, c):
+        self.journal.append(('status', self.status, self.lost_cell))
+        self.status = LOST
+        self.lost_cell = (r, c)
+        return self.shown_mines()
+
+    def shown_mines(self):
+        """The cells other than the lost cell that a lost game uncovers."""
+        mines = self.minefield == MINE
+        shown = (mines & ~self.flagged) | (self.flagged & ~mines)
+        shown[self.lost_cell] = False
+        xs, ys = np.nonzero(shown)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def snapshot(self):
+        """A mark to roll back to, valid until rolled back past."""
+        return len(self.journal)
+
+    def rollback(self, snapshot):
+        """
+        Undo every change made since snapshot, newest first.  Returns the
+        cells whose appearance changed, like an action does.
+        """
+        changed = []
+        while len(self.journal) > snapshot:
+            entry = self.journal.pop()
+            kind = entry[0]
+            if kind == 'cell':
+                _, r, c = entry
+                self.revealed[r, c] = False
+                self.num_revealed -= 1
+                changed.append((r, c))
+            elif kind == 'open':
+                _, xs, ys = entry
+                self.revealed[xs, ys] = False
+                self.num_revealed -= len(xs)
+                changed += zip(xs.tolist(), ys.tolist())
+            elif kind == 'flag':
+                _, r, c = entry
+                self.toggle_flag(r, c)
+                changed.append((r, c))
+            elif kind == 'status':
+                if self.status == LOST:
+                    changed += self.shown_mines()
+                _, self.status, self.lost_cell = entry
+            else:
+                # Back before the first click: the next one makes a new board.
+                self.minefield = None
+                self.openings = None
+                self.opening_cells = None
+                self.opening_starts = None
+        return changed
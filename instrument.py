@@ -0,0 +1,147 @@
+"""
+Latency instrumentation for the GUI's hot paths.
+
+A Profiler wraps methods of the live objects (the Tk window, its minefield
+view, each game) with timers, so nothing is patched and nothing costs
+anything unless profiling was asked for:
+
+    python minesweeper.py --profile session.json [--cprofile]
+
+It keeps, per event name,
+    a histogram of latencies in power-of-two microsecond buckets,
+    a histogram of the number of cells each action touched, and
+    the event-loop lag of root.after() callbacks: how late each one ran
+    compared to when it was scheduled.
+At exit they are written as JSON, or as CSV if the path ends in .csv.
+With cprofile the whole session also runs under cProfile and the stats
+go next to it with a .prof suffix.
+"""
+import atexit
+import csv
+import functools
+import json
+import os
+import time
+
+
+class Histogram:
+    """Counts of values in power-of-two buckets, plus exact count/sum/max."""
+    def __init__(self):
+        self.buckets = {}   # upper bound -> count
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        bound = 1
+        while bound < value:
+            bound *= 2
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile."""
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= p / 100 * self.count:
+                return min(bound, self.max)
+        return 0
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0
+        return {'count': self.count, 'mean': round(mean, 1),
+                'p50': round(self.percentile(50), 1),
+                'p90': round(self.percentile(90), 1),
+                'p99': round(self.percentile(99), 1),
+                'max': round(self.max, 1),
+                'buckets': {str(k): v for k, v in sorted(self.buckets.items())}}
+
+
+class Profiler:
+    """
+    Collects latencies (in microseconds) and cell counts per event name.
+    Call .wrap() on each hot method, .watch_after() on the Tk root and
+    .start() to have everything written at exit.
+    """
+    def __init__(self):
+        self.latency = {}   # event -> Histogram of microseconds
+        self.cells = {}     # event -> Histogram of cells touched
+        self.lag = Histogram()
+        self.cprofile = None
+
+    def record(self, name, seconds, cells=None):
+        hist = self.latency.get(name)
+        if hist is None:
+            hist = self.latency[name] = Histogram()
+        hist.add(seconds * 1e6)
+        if cells is not None:
+            hist = self.cells.get(name)
+            if hist is None:
+                hist = self.cells[name] = Histogram()
+            hist.add(cells)
+
+    def wrap(self, obj, attr, name=None, cells=False):
+        """
+        Time every call of obj.attr under name.  With cells, the call
+        returns the changed cells and their number is recorded too.
+        """
+        func = getattr(obj, attr)
+        name = name or attr
+
+        @functools.wraps(func)
+        def timed(*args, **kw):
+            start = time.perf_counter()
+            result = func(*args, **kw)
+            self.record(name, time.perf_counter() - start,
+                        len(result) if cells else None)
+            return result
+        setattr(obj, attr, timed)
+
+    def watch_after(self, root):
+        """Measure how late root.after() callbacks fire."""
+        after = root.after
+
+        def late_after(ms, func=None, *args):
+            if func is None:
+                return after(ms)
+            due = time.perf_counter() + ms / 1000
+
+            def fire(*args):
+                self.lag.add(max(time.perf_counter() - due, 0) * 1e6)
+                return func(*args)
+            return after(ms, fire, *args)
+        root.after = late_after
+
+    def start(self, path, cprofile=False):
+        """Write the results to path when the program exits."""
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        atexit.register(self.dump, path)
+
+    def dump(self, path):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(os.path.splitext(path)[0] + '.prof')
+        tables = {'latency_us': self.latency, 'cells': self.cells,
+                  'lag_us': {'after': self.lag}}
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                out = csv.writer(f)
+                out.writerow(['kind', 'event', 'count', 'mean', 'p50', 'p90',
+                              'p99', 'max'])
+                for kind, hists in tables.items():
+                    for event, hist in sorted(hists.items()):
+                        s = hist.summary()
+                        out.writerow([kind, event] +
+                                     [s[k] for k in ['count', 'mean', 'p50',
+                                                     'p90', 'p99', 'max']])
+        else:
+            with open(path, 'w') as f:
+                json.dump({kind: {event: hist.summary()
+                                  for event, hist in sorted(hists.items())}
+                           for kind, hists in tables.items()}, f, indent=1)
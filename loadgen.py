@@ -0,0 +1,197 @@
+"""
+Load generator for the bot server.
+
+    python loadgen.py --serve --connections 20 --sessions 100 --batch 8
+
+Opens connections to server.py, each running many sessions at once.  A
+session plays random covered cells, batch moves per request, and starts
+a new game whenever one ends.  Requests are pipelined on each connection.
+After the given number of seconds it prints moves and requests per
+second and request latencies.  --procs runs several client processes so
+the client is not the bottleneck; --serve starts a server for the run.
+"""
+import argparse
+import asyncio
+import collections
+import multiprocessing
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from cli import add_board_arguments, board_size
+from server import PORT
+
+# A response lists every changed cell, so one reveal can make a long line.
+RESPONSE_LIMIT = 1 << 24
+
+
+class Connection:
+    """A client connection; .request() sends a line and awaits its answer."""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = collections.deque()
+        self.task = asyncio.ensure_future(self.read())
+
+    @classmethod
+    async def open(cls, host, port, unix):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(
+                unix, limit=RESPONSE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=RESPONSE_LIMIT)
+        return cls(reader, writer)
+
+    async def read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            self.waiting.popleft().set_result(line.decode('ascii').split())
+
+    async def request(self, line):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.writer.write(line.encode('ascii') + b'\n')
+        words = await future
+        if words[0] == 'err':
+            raise RuntimeError(' '.join(words))
+        return words
+
+    def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+async def session(conn, rows, cols, num_mines, batch, until, stats, rng):
+    while time.perf_counter() < until:
+        session_id = (await conn.request(' '.join(
+            ('new', str(rows), str(cols), str(num_mines)))))[0]
+        cells = [(r, c) for r in range(rows) for c in range(cols)]
+        rng.shuffle(cells)
+        covered = set(cells)
+        status = 'P'
+        while status == 'P' and time.perf_counter() < until:
+            moves = []
+            while cells and len(moves) < batch:
+                r, c = cells.pop()
+                if (r, c) in covered:
+                    moves.append(''.join(('r', str(r), ',', str(c))))
+            if not moves:
+                break
+            start = time.perf_counter()
+            words = await conn.request(' '.join([session_id] + moves))
+            stats['latency'].append(time.perf_counter() - start)
+            stats['moves'] += len(moves)
+            stats['requests'] += 1
+            status = words[1]
+            for cell in words[3:]:
+                r, c, key = cell.split(',')
+                if key not in '.F':
+                    covered.discard((int(r), int(c)))
+        stats['games'] += 1
+        await conn.request(' '.join(('end', session_id)))
+
+
+async def run(host, port, unix, connections, sessions, rows, cols, num_mines,
+              batch, seconds, seed):
+    stats = {'moves': 0, 'requests': 0, 'games': 0, 'latency': []}
+    conns = [await Connection.open(host, port, unix)
+             for _ in range(connections)]
+    rng = random.Random(seed)
+    until = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        session(conn, rows, cols, num_mines, batch, until, stats,
+                random.Random(rng.random()))
+        for conn in conns for _ in range(sessions)])
+    stats['seconds'] = time.perf_counter() - start
+    for conn in conns:
+        conn.close()
+    return stats
+
+
+def run_process(args):
+    """One client process's share of the load.  Runs in a worker process."""
+    return asyncio.run(run(*args))
+
+
+def wait_for_port(host, port, timeout=10):
+    until = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > until:
+                raise
+            time.sleep(0.05)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', metavar='PATH')
+    parser.add_argument('--serve', action='store_true',
+                        help='start a server for the run')
+    add_board_arguments(parser, 'expert')
+    parser.add_argument('--connections', type=int, default=10,
+                        help='connections per process')
+    parser.add_argument('--sessions', type=int, default=100,
+                        help='concurrent sessions per connection')
+    parser.add_argument('--batch', type=int, default=8,
+                        help='moves per request')
+    parser.add_argument('--procs', type=int, default=1,
+                        help='client processes')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rows, cols, num_mines = board_size(args)
+
+    server = None
+    if args.serve:
+        command = [sys.executable, 'server.py', '--host', args.host,
+                   '--port', str(args.port)]
+        if args.unix:
+            command += ['--unix', args.unix]
+        server = subprocess.Popen(command)
+    try:
+        if server is not None and not args.unix:
+            wait_for_port(args.host, args.port)
+        elif server is not None:
+            time.sleep(1)
+        tasks = [(args.host, args.port, args.unix, args.connections,
+                  args.sessions, rows, cols, num_mines, args.batch,
+                  args.seconds, args.seed + i) for i in range(args.procs)]
+        if args.procs == 1:
+            results = [run_process(tasks[0])]
+        else:
+            with multiprocessing.Pool(args.procs) as pool:
+                results = pool.map(run_process, tasks)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    seconds = max(r['seconds'] for r in results)
+    latency = sorted(t for r in results for t in r['latency'])
+    moves = sum(r['moves'] for r in results)
+    requests = sum(r['requests'] for r in results)
+    print(''.join((str(args.procs * args.connections * args.sessions),
+                   ' sessions, ', str(args.batch), ' moves per request')))
+    print('moves/sec     {:.0f}'.format(moves / seconds))
+    print('requests/sec  {:.0f}'.format(requests / seconds))
+    print('games         {}'.format(sum(r['games'] for r in results)))
+    if latency:
+        print('latency ms    p50 {:.2f}  p99 {:.2f}'.format(
+            latency[len(latency) // 2] * 1e3,
+            latency[int(len(latency) * 0.99)] * 1e3))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
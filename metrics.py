@@ -0,0 +1,222 @@
+"""
+Board difficulty metrics.
+
+    openings  the 8-connected regions of zeros, each opened by one click
+    3BV       the fewest clicks that clear the board without flags: one per
+              opening plus one per number that no opening borders
+    islands   the 8-connected groups of those lone numbers
+
+Everything works on one minefield or a whole (n, rows, cols) stack from
+minefield.generate_minefields at once.  Each board row is packed into one
+machine word, bit c + 1 for column c inside an empty frame, so the boards
+of a stack sit side by side in (rows + 2, n) word arrays and every step is
+a few whole-array bit operations:
+
+    - the Euler number (regions minus holes) of a mask comes from counting
+      its 2 x 2 bit quads (Gray's method) with popcounts
+    - a flood fill from the frame finds the cells outside the mask that
+      it encloses, whose regions are the holes; they are counted the same
+      way with the other connectivity, and regions = Euler number + holes
+
+A few boards, or boards too wide for a 64-bit word, are labelled with
+scipy.ndimage instead, zeros and lone numbers in the same call: no lone
+number touches a zero, so every region is one or the other.
+"""
+import sys
+
+import numpy as np
+
+from bits import POPCOUNT
+from minefield import MINE, dilate
+
+# 8-connected within a board, never across the stacking axis.
+STRUCTURE = np.zeros((3, 3, 3), dtype=bool)
+STRUCTURE[1] = True
+# Times eight bool bytes, puts their bits together in the top byte.
+GATHER = np.uint64(0x0102040810204080)
+TOP = 7 if sys.byteorder == 'little' else 0
+# Boards per pass, small enough for the word arrays to stay in cache.
+CHUNK = 4096
+# Fewer boards than this are quicker to label than to pack.
+FEW = 200
+
+
+def pack(minefields, dtype):
+    """
+    The zeros and the mines of a stack as two (rows + 2, n) word arrays,
+    column c of a board in bit c + 1, with empty frame rows and bits.
+    """
+    n, rows, cols = minefields.shape
+    bits = np.zeros((2, n, rows, dtype.itemsize * 8), dtype=bool)
+    np.equal(minefields, 0, out=bits[0, :, :, 1:cols + 1])
+    np.equal(minefields, MINE, out=bits[1, :, :, 1:cols + 1])
+    packed = (bits.view(np.uint64) * GATHER).view(np.uint8)[..., TOP::8]
+    words = np.ascontiguousarray(packed).view(dtype)[..., 0]
+    out = np.zeros((2, rows + 2, n), dtype=dtype)
+    out[:, 1:-1] = words.transpose(0, 2, 1)
+    return out
+
+
+def popcount(words):
+    """The set bits of each column of a word array."""
+    if hasattr(np, 'bitwise_count'):
+        counts = np.bitwise_count(words)
+    else:
+        counts = POPCOUNT[words.view(np.uint8)].reshape(
+            words.shape + (-1,)).sum(axis=-1)
+    return counts.sum(axis=0, dtype=np.int64)
+
+
+def euler(words, cols, conn):
+    """Regions minus holes of every board, with 4 or 8 connectivity."""
+    one = words.dtype.type(1)
+    quads = words.dtype.type((1 << (cols + 1)) - 1)
+    a, c = words[:-1], words[1:]
+    b, d = a >> one, c >> one
+    odd = (a ^ b ^ c ^ d) & quads
+    two = (a & b) | (c & d) | ((a | b) & (c | d))
+    diagonal = ((a & d & ~b & ~c) | (b & c & ~a & ~d)) & quads
+    n1 = popcount(odd & ~two)
+    n3 = popcount(odd & two)
+    nd = popcount(diagonal)
+    if conn == 8:
+        return (n1 - n3 - 2 * nd) // 4
+    return (n1 - n3 + 2 * nd) // 4
+
+
+def reach(free, cols, conn):
+    """
+    The cells of free that connect to the frame through free.  A round
+    sweeps down and up the rows and then fills sideways along each row;
+    boards drop out as soon as a round changes nothing, and the rest go
+    on.  free must hold the whole frame.
+    """
+    t = free.dtype.type
+    one = t(1)
+    found = free.copy()
+    found[1:-1] &= t(1 | 1 << (cols + 1))
+    # Sideways fill towards bit 0, doubling the distance per shift.
+    shifts = [t(1 << i) for i in range((cols + 1).bit_length())]
+    runs = [free]
+    for k in shifts[:-1]:
+        runs.append(runs[-1] & (runs[-1] >> k))
+    out = found
+    boards = None
+    while True:
+        before = found.copy()
+        for i in range(1, len(found)):
+            near = found[i - 1]
+            if conn == 8:
+                near = near | (near << one) | (near >> one)
+            found[i] |= near & free[i]
+        for i in range(len(found) - 2, -1, -1):
+            near = found[i + 1]
+            if conn == 8:
+                near = near | (near << one) | (near >> one)
+            found[i] |= near & free[i]
+        # Adding carries each found bit up its run of free bits.
+        found |= ((free + found) ^ free) & free
+        for run, k in zip(runs, shifts):
+            found |= run & (found >> k)
+        going = (found != before).any(axis=0)
+        left = np.count_nonzero(going)
+        # Dropping finished boards copies the rest, so wait for most.
+        if left * 2 < len(going):
+            if boards is None:
+                boards = np.flatnonzero(going)
+            else:
+                out[:, boards] = found
+                boards = boards[going]
+            if not left:
+                return out
+            # compress() keeps the rows contiguous, unlike [:, going].
+            found, free, *runs = (np.compress(going, a, axis=1)
+                                  for a in [found, free] + runs)
+
+
+def count_regions(words, cols, conn=8):
+    """Number of regions on each board of a packed stack."""
+    regions = euler(words, cols, conn)
+    # Enclosing a hole takes 4 cells 8-connected or 8 cells 4-connected.
+    ringed = np.flatnonzero(popcount(words) >= (4 if conn == 8 else 8))
+    if not ringed.size:
+        return regions
+    words = words.take(ringed, axis=1)
+    free = ~words & words.dtype.type((1 << (cols + 2)) - 1)
+    holes = free & ~reach(free, cols, 12 - conn)
+    has = np.flatnonzero(holes.any(axis=0))
+    if has.size:
+        regions[ringed[has]] += count_regions(holes.take(has, axis=1), cols,
+                                              12 - conn)
+    return regions
+
+
+def packed_metrics(minefields, dtype):
+    """openings, 3BV and islands of a stack through packed words."""
+    n, _, cols = minefields.shape
+    one = dtype.type(1)
+    inside = dtype.type(((1 << cols) - 1) << 1)
+    result = np.empty((3, n), dtype=np.int64)
+    for start in range(0, n, CHUNK):
+        zeros, mines = pack(minefields[start:start + CHUNK], dtype)
+        near = zeros | (zeros << one) | (zeros >> one)
+        lone = np.zeros_like(zeros)
+        lone[1:-1] = ~(near[:-2] | near[1:-1] | near[2:]) & \
+            ~mines[1:-1] & inside
+        openings = count_regions(zeros, cols)
+        result[:, start:start + CHUNK] = (openings, openings + popcount(lone),
+                                          count_regions(lone, cols))
+    return result
+
+
+def labelled_metrics(minefields):
+    """openings, 3BV and islands of a stack through one ndimage.label."""
+    from scipy import ndimage
+    zeros = minefields == 0
+    lone = (minefields != MINE) & ~dilate(zeros)
+    labels, num = ndimage.label(zeros | lone, structure=STRUCTURE)
+    # Highest label so far, so boards without regions count zero.
+    last = np.maximum.accumulate(labels.reshape(len(labels), -1).max(axis=1))
+    opening = np.zeros(num + 1, dtype=np.int64)
+    opening[labels[zeros]] = 1
+    openings = np.diff(np.cumsum(opening)[last], prepend=0)
+    islands = np.diff(last, prepend=0) - openings
+    return np.array([openings,
+                     openings + np.count_nonzero(lone, axis=(1, 2)), islands])
+
+
+def board_metrics(minefields):
+    """
+    A dict of 'openings', '3bv' and 'islands' for a minefield (as ints) or
+    a stack of minefields (as arrays with one entry per board).
+    """
+    minefields = np.asarray(minefields)
+    single = minefields.ndim == 2
+    if single:
+        minefields = minefields[None]
+    n, _, cols = minefields.shape
+    if n < FEW or cols + 2 > 64:
+        values = labelled_metrics(minefields)
+    elif cols + 2 <= 32:
+        values = packed_metrics(minefields, np.dtype('<u4'))
+    else:
+        values = packed_metrics(minefields, np.dtype('<u8'))
+    result = dict(zip(('openings', '3bv', 'islands'), values))
+    if single:
+        result = {k: int(v[0]) for k, v in result.items()}
+    return result
+
+
+def three_bv(minefield):
+    """The 3BV of a board or (as an array) of each board of a stack."""
+    return board_metrics(minefield)['3bv']
+
+
+def efficiency(minefield, clicks):
+    """
+    3BV per click of a finished game, where clicks counts only the
+    reveals and chords that uncovered something (Recorder.num_clicks), so
+    flags and wasted clicks cost nothing and 1.0 is a perfect game.
+    Chords can take it above 1.
+    """
+    return three_bv(minefield) / clicks if clicks else 0.0
@@ -0,0 +1,116 @@
+"""
+Minefield generation.
+
+A minefield is a uint8 array holding the number of neighbouring mines for
+every cell, with MINE (9) marking the mines themselves.  Batches of boards
+are stacked along a leading axis as (n, rows, cols) arrays.
+"""
+import numpy as np
+
+MINE = 9
+
+
+def count_neighbors(mines):
+    """
+    Count the mines around every cell of a (..., rows, cols) mine mask.
+    Works on a single board or a whole stack of boards in one pass.
+    """
+    mines = np.asarray(mines, dtype=np.uint8)
+    rows, cols = mines.shape[-2:]
+    padded = np.zeros(mines.shape[:-2] + (rows + 2, cols + 2), dtype=np.uint8)
+    padded[..., 1:-1, 1:-1] = mines
+    counts = np.zeros(mines.shape, dtype=np.uint8)
+    for dr in range(3):
+        for dc in range(3):
+            if dr != 1 or dc != 1:
+                counts += padded[..., dr:dr + rows, dc:dc + cols]
+    return counts
+
+
+def mines_to_minefield(mines):
+    """Turn a boolean mine mask (single or stacked) into a minefield."""
+    mines = np.asarray(mines, dtype=bool)
+    minefield = count_neighbors(mines)
+    minefield[mines] = MINE
+    return minefield
+
+
+def dilate(mask):
+    """Grow a (..., rows, cols) mask by one cell in every direction."""
+    rows, cols = mask.shape[-2:]
+    padded = np.zeros(mask.shape[:-2] + (rows + 2, cols + 2), dtype=bool)
+    padded[..., 1:-1, 1:-1] = mask
+    # Along the rows, then down the columns: four ORs instead of eight adds.
+    wide = padded[..., :-2] | padded[..., 1:-1] | padded[..., 2:]
+    return wide[..., :-2, :] | wide[..., 1:-1, :] | wide[..., 2:, :]
+
+
+def mine_candidates(rows, cols, num_mines, r=None, c=None, topology=None):
+    """
+    Flat indices of the cells that may hold a mine when the first click is
+    at (r, c).  The clicked cell and its neighbours (in topology, if given,
+    else the square ones) are kept clear when the board is roomy enough,
+    otherwise only the clicked cell is.
+    """
+    safe = np.zeros((rows, cols), dtype=bool)
+    if r is not None and c is not None:
+        if topology is None:
+            safe[max(r - 1, 0):r + 2, max(c - 1, 0):c + 2] = True
+        else:
+            safe[r, c] = True
+            for x, y in topology.neighbors(r, c):
+                safe[x, y] = True
+        if rows * cols - np.count_nonzero(safe) < num_mines:
+            safe[:] = False
+            safe[r, c] = True
+    candidates = np.flatnonzero(~safe)
+    if num_mines < 0 or num_mines > candidates.size:
+        raise ValueError(''.join((
+            'Cannot place ', str(num_mines), ' mines on a ', str(rows), ' x ',
+            str(cols), ' board with ', str(candidates.size), ' free cells.')))
+    return candidates
+
+
+def generate_minefields(n, rows, cols, num_mines, r=None, c=None, seed=None,
+                        topology=None):
+    """
+    Generate n boards at once as an (n, rows, cols) uint8 array.
+
+    Mines are sampled without replacement from the cells outside the first
+    click's neighbourhood by taking the num_mines smallest of a block of
+    random keys per board.  seed may be None, an int or a
+    np.random.Generator; equal seeds give equal boards.  topology (see
+    topology.py) numbers boards that are not square.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = mine_candidates(rows, cols, num_mines, r, c, topology)
+    mines = np.zeros((n, rows * cols), dtype=bool)
+    if num_mines == candidates.size:
+        mines[:, candidates] = True
+    elif num_mines > 0:
+        keys = rng.random((n, candidates.size), dtype=np.float32)
+        picks = np.argpartition(keys, num_mines - 1, axis=1)[:, :num_mines]
+        np.put_along_axis(mines, candidates[picks], True, axis=1)
+    mines = mines.reshape(n, rows, cols)
+    if topology is not None:
+        return topology.minefield(mines)
+    return mines_to_minefield(mines)
+
+
+def generate_minefield(rows, cols, num_mines, r=None, c=None, seed=None,
+                       topology=None):
+    """
+    Generate one board with the first click at (r, c).  This is the first
+    board of generate_minefields for the same seed.
+    """
+    return generate_minefields(1, rows, cols, num_mines, r, c, seed,
+                               topology)[0]
+
+
+def game_seed(seed, index):
+    """
+    The seed of board or game number index in a run started from seed, so
+    a run's boards do not depend on how it is split up.
+    """
+    return int(np.random.SeedSequence([seed, index]).generate_state(
+        1, np.uint64)[0])
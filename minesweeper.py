@@ -1,30 +1,37 @@
-import random
+import time
+START = time.perf_counter()
+
+import argparse
+import importlib
 import sys
-import os
 import string
+import threading
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
+
 import numpy as np
-from scipy.signal import convolve2d
-from scipy.misc import imsave, imread
-
-
-def generate_minefield(rows, cols, num_mines, r, c):
-    # generate mines
-    mines = np.zeros((rows,cols), dtype=bool)
-    count = 0
-    while count < num_mines:
-        x,y = random.randint(0,rows-1), random.randint(0,cols-1)
-        if r!=x and c!=y:
-            if not mines[x,y]:
-                mines[x,y] = 1
-                count += 1
-    # count the number of mine neighbors.
-    neighbors = convolve2d(mines, np.ones((3,3)), mode='same', boundary='fill')
-    neighbors[mines] = 9 # Locations with mines are set to 9.
-    return neighbors.astype(np.uint8)
-        
+
+from engine import Game, LEVELS, LOST, WON
+from sprites import load_sprites
+# Everything else (the solver, no-guess pools, board maker, score store,
+# endless mode, metrics, profiler and replays) is imported where it is
+# first used, so none of it delays the first frame.
+
+IMPORTED = time.perf_counter()
+# Seconds from starting to import this module to the first frame on screen.
+STARTUP_TARGET = 0.3
+# Milliseconds between checks for a finished analysis, about a frame.
+FRAME_MS = 16
+# Boards with at least this many cells are made on a thread before the
+# first click, with a progress bar; smaller ones are quicker to just make.
+AHEAD_CELLS = 250000
+# Tints for mine probabilities 0, 0.1, ..., 1, green through yellow to red.
+HEAT = [''.join(('#', format(int(255 * min(2 * i / 10, 1)), '02x'),
+                 format(int(255 * min(2 - 2 * i / 10, 1)), '02x'), '00'))
+        for i in range(11)]
+
+
 def user_input_good(input_string, input_type='int', boxName=''):
     if len(input_string) == 0:
         messagebox.showwarning(
@@ -91,11 +98,237 @@ class LabelAndEntry(tk.Frame):
     def get(self):
         return self.input_string.get()
 
+class MinefieldView(tk.Frame):
+    """
+    A scrollable window onto the minefield.
+    Only the visible cells exist as image items on one canvas; scrolling
+    reuses the items for the cells that come into view, so the number of
+    items is bounded however big the board is.  Items only get a new image
+    when the one they show changes.
+    Call .reset() at the start of a game and .draw() with the changed cells.
+    Mouse events go to .canvas.
+    .set_overlay() tints the visible cells with stippled rectangles kept in
+    step with the images the same way, and .mark() outlines one cell.
+    """
+    def __init__(self, parent, images, tile=24, max_rows=30, max_cols=50):
+        tk.Frame.__init__(self, parent)
+        self.images = images
+        self.tile = tile
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self.rows = 0
+        self.cols = 0
+        self.view_rows = 0
+        self.view_cols = 0
+        self.top = 0
+        self.left = 0
+        self.appearance = None
+        self.items = []   # canvas item per visible cell, row major
+        self.shown = []   # image key shown by each item
+        self.overlay = None
+        self.tints = []   # tint rectangle per visible cell
+        self.tinted = []  # fill colour of each tint, None when hidden
+        self.marked = None
+
+        self.canvas = tk.Canvas(self, bd=0, highlightthickness=0,
+                                width=0, height=0)
+        self.ybar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.xbar = tk.Scrollbar(self, orient=tk.HORIZONTAL,
+                                 command=self.xview)
+        self.canvas.grid(row=0, column=0)
+        self.ybar.grid(row=0, column=1, sticky='ns')
+        self.xbar.grid(row=1, column=0, sticky='ew')
+        self.marker = self.canvas.create_rectangle(
+            0, 0, 0, 0, outline='#00c000', width=3, state='hidden')
+        self.canvas.bind('<MouseWheel>', self.wheel)
+        self.canvas.bind('<Shift-MouseWheel>', self.wheel)
+        self.canvas.bind('<Button-4>', self.wheel)
+        self.canvas.bind('<Button-5>', self.wheel)
+        self.canvas.bind('<Shift-Button-4>', self.wheel)
+        self.canvas.bind('<Shift-Button-5>', self.wheel)
+
+    def reset(self, rows, cols, appearance):
+        """
+        Show a new rows x cols board, looking up each cell's image key with
+        appearance(r, c).
+        """
+        self.rows = rows
+        self.cols = cols
+        self.appearance = appearance
+        self.top = 0
+        self.left = 0
+        view_rows = min(rows, self.max_rows)
+        view_cols = min(cols, self.max_cols)
+        if (view_rows, view_cols) != (self.view_rows, self.view_cols):
+            self.view_rows = view_rows
+            self.view_cols = view_cols
+            n = view_rows * view_cols
+            for item in self.items[n:] + self.tints[n:]:
+                self.canvas.delete(item)
+            del self.items[n:]
+            del self.tints[n:]
+            while len(self.items) < n:
+                self.items.append(self.canvas.create_image(
+                    0, 0, anchor='nw', image=self.images['blank']))
+                self.tints.append(self.canvas.create_rectangle(
+                    0, 0, 0, 0, width=0, stipple='gray50', state='hidden',
+                    tags='tint'))
+            for i, item in enumerate(self.items):
+                r, c = divmod(i, view_cols)
+                self.canvas.coords(item, c * self.tile, r * self.tile)
+                self.canvas.itemconfig(item, image=self.images['blank'])
+                self.canvas.coords(self.tints[i], c * self.tile + 2,
+                                   r * self.tile + 2, (c + 1) * self.tile - 2,
+                                   (r + 1) * self.tile - 2)
+                self.canvas.itemconfig(self.tints[i], state='hidden')
+            self.canvas.tag_raise('tint')
+            self.canvas.tag_raise(self.marker)
+            self.shown = ['blank'] * n
+            self.tinted = [None] * n
+            self.canvas.config(width=view_cols * self.tile,
+                               height=view_rows * self.tile)
+        self.redraw()
+        self.update_scrollbars()
+
+    def show(self, i, key):
+        if self.shown[i] != key:
+            self.canvas.itemconfig(self.items[i], image=self.images[key])
+            self.shown[i] = key
+
+    def tint(self, i, colour):
+        if self.tinted[i] != colour:
+            if colour is None:
+                self.canvas.itemconfig(self.tints[i], state='hidden')
+            else:
+                self.canvas.itemconfig(self.tints[i], fill=colour,
+                                       state='normal')
+            self.tinted[i] = colour
+
+    def set_overlay(self, overlay):
+        """
+        Tint each visible cell with the fill colour overlay(r, c) returns,
+        or not at all where it returns None.  set_overlay(None) clears it.
+        """
+        self.overlay = overlay
+        for i in range(len(self.tints)):
+            r, c = divmod(i, self.view_cols)
+            self.tint(i, overlay and overlay(self.top + r, self.left + c))
+
+    def mark(self, cell):
+        """Outline cell, scrolling it into view, or nothing if cell is None."""
+        self.marked = cell
+        if cell is not None:
+            r, c = cell
+            self.scroll_to(min(self.top, r), min(self.left, c))
+            self.scroll_to(max(self.top, r - self.view_rows + 1),
+                           max(self.left, c - self.view_cols + 1))
+        self.place_marker()
+
+    def place_marker(self):
+        if self.marked is None:
+            self.canvas.itemconfig(self.marker, state='hidden')
+            return
+        r, c = self.marked[0] - self.top, self.marked[1] - self.left
+        if 0 <= r < self.view_rows and 0 <= c < self.view_cols:
+            self.canvas.coords(self.marker, c * self.tile + 1,
+                               r * self.tile + 1, (c + 1) * self.tile - 1,
+                               (r + 1) * self.tile - 1)
+            self.canvas.itemconfig(self.marker, state='normal')
+        else:
+            self.canvas.itemconfig(self.marker, state='hidden')
+
+    def redraw(self):
+        """Redraw every visible cell."""
+        self.place_marker()
+        for i in range(len(self.items)):
+            r, c = divmod(i, self.view_cols)
+            self.show(i, self.appearance(self.top + r, self.left + c))
+            if self.overlay is not None:
+                self.tint(i, self.overlay(self.top + r, self.left + c))
+
+    def draw(self, cells):
+        """Redraw the cells that changed, skipping those out of view."""
+        if len(cells) > len(self.items):
+            self.redraw()
+            return
+        for r, c in cells:
+            r -= self.top
+            c -= self.left
+            if 0 <= r < self.view_rows and 0 <= c < self.view_cols:
+                self.show(r * self.view_cols + c,
+                          self.appearance(r + self.top, c + self.left))
+                if self.overlay is not None:
+                    self.tint(r * self.view_cols + c,
+                              self.overlay(r + self.top, c + self.left))
+
+    def cell_at(self, x, y):
+        """The (row, col) under canvas coordinates x, y, or None."""
+        if x < 0 or y < 0:
+            return None
+        r, c = int(y) // self.tile, int(x) // self.tile
+        if r < self.view_rows and c < self.view_cols:
+            return r + self.top, c + self.left
+        return None
+
+    def scroll_to(self, top, left):
+        top = min(max(top, 0), self.rows - self.view_rows)
+        left = min(max(left, 0), self.cols - self.view_cols)
+        if (top, left) != (self.top, self.left):
+            self.top = top
+            self.left = left
+            self.redraw()
+            self.update_scrollbars()
+
+    def update_scrollbars(self):
+        for bar, first, shown, total in [
+                (self.ybar, self.top, self.view_rows, self.rows),
+                (self.xbar, self.left, self.view_cols, self.cols)]:
+            if shown < total:
+                bar.set(first / total, (first + shown) / total)
+                bar.grid()
+            else:
+                bar.grid_remove()
+
+    def scrolled(self, args, first, shown, total):
+        """Where a scrollbar command moves the first visible row or column."""
+        if args[0] == 'moveto':
+            return int(round(float(args[1]) * total))
+        step = shown - 1 if args[2] == 'pages' else 1
+        return first + int(args[1]) * max(step, 1)
+
+    def yview(self, *args):
+        self.scroll_to(self.scrolled(args, self.top, self.view_rows,
+                                     self.rows), self.left)
+
+    def xview(self, *args):
+        self.scroll_to(self.top, self.scrolled(args, self.left,
+                                               self.view_cols, self.cols))
+
+    def wheel(self, event):
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        if event.state & 1:  # Shift scrolls sideways
+            self.scroll_to(self.top, self.left + step)
+        else:
+            self.scroll_to(self.top + step, self.left)
+
 class Minesweeper(tk.Frame):
 
-    def __init__(self):
+    def __init__(self, report_startup=False, profile=None, cprofile=False):
         self.root = tk.Tk()
         self.root.title('Minesweeper')
+        # Timers are only attached when profiling; otherwise nothing is wrapped.
+        self.profiler = None
+        if profile:
+            from instrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.watch_after(self.root)
+            self.profiler.wrap(self, 'restart')
+            self.profiler.start(profile, cprofile)
         tk.Frame.__init__(self, self.root)
         self.pack()
 
@@ -106,41 +339,38 @@ class Minesweeper(tk.Frame):
         self.rows = 9
         self.cols = 9
         self.num_mines = 10
-
-        # Images
-        self.im = {'1' : tk.PhotoImage(file='assets/1.gif'),
-                   '2' : tk.PhotoImage(file='assets/2.gif'),
-                   '3' : tk.PhotoImage(file='assets/3.gif'),
-                   '4' : tk.PhotoImage(file='assets/4.gif'),
-                   '5' : tk.PhotoImage(file='assets/5.gif'),
-                   '6' : tk.PhotoImage(file='assets/6.gif'),
-                   '7' : tk.PhotoImage(file='assets/7.gif'),
-                   '8' : tk.PhotoImage(file='assets/8.gif'),
-                   '9' : tk.PhotoImage(file='assets/rbomb.gif'),
-                   '0' : tk.PhotoImage(file='assets/0.gif'),
-                   'c1' : tk.PhotoImage(file='assets/c1.gif'),
-                   'c2' : tk.PhotoImage(file='assets/c2.gif'),
-                   'c3' : tk.PhotoImage(file='assets/c3.gif'),
-                   'c4' : tk.PhotoImage(file='assets/c4.gif'),
-                   'c5' : tk.PhotoImage(file='assets/c5.gif'),
-                   'c6' : tk.PhotoImage(file='assets/c6.gif'),
-                   'c7' : tk.PhotoImage(file='assets/c7.gif'),
-                   'c8' : tk.PhotoImage(file='assets/c8.gif'),
-                   'c9' : tk.PhotoImage(file='assets/c9.gif'),
-                   'c0' : tk.PhotoImage(file='assets/c0.gif'),
-                   'flag' : tk.PhotoImage(file='assets/flag.gif'),
-                   'bomb' : tk.PhotoImage(file='assets/bomb.gif'),
-                   'xbomb' : tk.PhotoImage(file='assets/xbomb.gif'),
-                   'blank' : tk.PhotoImage(file='assets/blank.gif'),
-                   'smile' : tk.PhotoImage(file='assets/smile_smile.gif'),
-                   'o' : tk.PhotoImage(file='assets/smile_o.gif'),
-                   'cool' : tk.PhotoImage(file='assets/smile_cool.gif'),
-                   'dead' : tk.PhotoImage(file='assets/smile_dead.gif')
-                    }
+        self.clock_job = None
+
+        # No-guess boards come from a pool that is filled in the background.
+        self.noguess = tk.BooleanVar(value=False)
+        self.pool = None
+        self.pooled = False
+        self.pool_job = None
+        self.endless = tk.BooleanVar(value=False)
+        # Practice games can be undone with Ctrl+Z but never score.
+        self.practice = tk.BooleanVar(value=False)
+        self.history = []
+
+        # Mine probabilities are worked out on a background thread.
+        self.heatmap = tk.BooleanVar(value=False)
+        self.live = None
+        self.analysis = None
+        self.analysis_job = None
+        self.hint_wanted = False
+
+        # Huge boards are made in the background; see make_board().
+        self.maker = None
+        self.maker_job = None
+        self.pending_click = None
+
+        # Images, sliced from one sprite sheet shared by every window.
+        self.im = load_sprites(self.root)
 
         # Top frame
         self.top_frame = tk.Frame(self, relief = tk.SUNKEN, bd=3)
         self.top_frame.pack(fill=tk.X, expand=1, padx=3, pady=3)
+        # Shown only while a board is being made.
+        self.lab_status = tk.Label(self, anchor='w')
 
         # Smile button
         self.but_smile = tk.Button(self.top_frame, image=self.im['smile'],
@@ -167,15 +397,15 @@ class Minesweeper(tk.Frame):
             
                                       
         
-        # keep track of mouse clicks
-        self.was_both_click = False
-        self.was_left_click = False
-        self.was_right_click = False
-        self.both_click_timer = 0
-        
-        # Frame that holds mine buttons.
+        # Frame that holds the minefield.
         self.minefield_frame = tk.Frame(self, relief=tk.SUNKEN, bd=3)
         self.minefield_frame.pack(fill=tk.X, expand=1, padx=5, pady=5)
+        self.field = MinefieldView(self.minefield_frame, self.im)
+        self.field.pack()
+        if self.profiler is not None:
+            self.profiler.wrap(self.field, 'reset', 'grid-build')
+            self.profiler.wrap(self.field, 'draw', 'redraw')
+            self.profiler.wrap(self.field, 'redraw', 'redraw-all')
 
         self.restart()
 
@@ -187,6 +417,17 @@ class Minesweeper(tk.Frame):
         menu.add_command(label="New Game           F2", command=self.restart)
         menu.add_command(label="High Scores         F4", command=self.view_high_scores)
         menu.add_command(label="Options                F5", command=self.options)
+        menu.add_checkbutton(label="Probabilities        F6",
+                             variable=self.heatmap, command=self.analyse)
+        menu.add_command(label="Hint                       H",
+                         command=self.hint)
+        menu.add_command(label="Save Replay...", command=self.save_replay)
+        menu.add_checkbutton(label="No guessing", variable=self.noguess,
+                             command=self.restart)
+        menu.add_checkbutton(label="Endless", variable=self.endless,
+                             command=self.restart)
+        menu.add_checkbutton(label="Practice (Ctrl+Z undoes)",
+                             variable=self.practice, command=self.restart)
         menu.add_command(label="Exit")
 
         menu = tk.Menu(self.menubar, tearoff=0)
@@ -197,199 +438,387 @@ class Minesweeper(tk.Frame):
         self.root.config(menu=self.menubar)
         
         # Keep track of clicking
-        self.left_click = False
-        self.right_click = False
-        self.root.bind('<Button-1>', self.lefttclick)
-        self.root.bind('<Button-3>', self.rightclick)
-        self.root.bind('<ButtonRelease-1>', self.nolefttclick)
-        self.root.bind('<ButtonRelease-3>', self.norightclick)
+        self.buttons_down = set()
+        self.chording = False
+        self.field.canvas.bind('<ButtonPress-1>', self.press)
+        self.field.canvas.bind('<ButtonPress-3>', self.press)
+        self.field.canvas.bind('<ButtonRelease-1>', self.release)
+        self.field.canvas.bind('<ButtonRelease-3>', self.release)
         self.root.bind('<F5>', self.f5_options)
         self.root.bind('<F4>', self.f4_hs)
+        self.root.bind('<Control-z>', self.undo)
+        self.root.bind('<F6>', self.f6_heatmap)
+        self.root.bind('<h>', self.hint)
+        self.root.bind('<Escape>', self.cancel_board)
+
+        if report_startup:
+            self.root.update()
+            self.report_startup()
+        # SciPy is only needed for the first board; load it in the
+        # background instead of delaying the window.
+        threading.Thread(target=importlib.import_module,
+                         args=('scipy.ndimage',), daemon=True).start()
 
-        self.root.after(50, self.check_clicked)
-
-        self.root.after(1000, self.update_clock)
         self.root.mainloop()
 
+    def report_startup(self):
+        shown = time.perf_counter()
+        print(''.join(('imports:     ', format((IMPORTED - START) * 1e3, '.1f'),
+                       ' ms')))
+        print(''.join(('first frame: ', format((shown - START) * 1e3, '.1f'),
+                       ' ms (target ', format(STARTUP_TARGET * 1e3, '.0f'),
+                       ' ms)')))
+
     def restart(self):
+        if self.clock_job is not None:
+            self.root.after_cancel(self.clock_job)
+            self.clock_job = None
         self.time = -1
-        self.first = True
         self.dead = False
         self.gameover = False
+        self.history = []
+        self.analysis = None
+        self.hint_wanted = False
+        if self.live is not None:
+            self.live.clear()
+        if self.maker is not None:
+            self.maker.cancel()
+            self.maker = None
+        self.pending_click = None
+        self.pooled = False
         self.but_smile.config(image=self.im['smile'])
         self.lab_clock[2].config(image=self.im['c0'])
         self.lab_clock[1].config(image=self.im['c0'])
         self.lab_clock[0].config(image=self.im['c0'])
-        self.update_counter(self.num_mines)
-        
-        # keep track of what buttons have been clicked and where the mouse is
-        self.clicked = np.zeros((self.rows, self.cols), dtype=bool)
-        self.rclicked = np.zeros((self.rows, self.cols), dtype=bool)
-        self.entered = np.zeros((self.rows, self.cols), dtype=bool)
-        # Make buttons.
-        self.btn =  [[0 for c in range(self.cols)] for r in range(self.rows)] 
-        for r in range(self.rows):
-            for c in range(self.cols):
-                self.btn[r][c] = tk.Label(
-                    self.minefield_frame, bd=0, image=self.im['blank'],
-                    padx=0, pady=0, relief=tk.FLAT)
-                self.btn[r][c].grid(row=r, column=c)
-                self.btn[r][c].bind('<Enter>', lambda event, x=r, y=c: self.enter(x,y))
-                self.btn[r][c].bind('<Leave>', lambda event, x=r, y=c: self.leave(x,y))
-                
-    def enter(self, r, c):
-        self.entered[r, c] = 1
-
-    def leave(self, r, c):
-        self.entered[r,c] = 0
-        
-    def check_clicked(self):
-        if not self.right_click and not self.left_click: # no click
-            self.both_click_timer = 0
-            if np.count_nonzero(self.entered) > 1:
-                print("Program thinks the mouse is on more than one thing.")
-            elif np.count_nonzero(self.entered) == 0:
-                pass # No worries, the mouse is outside the minefield.
-            else:
-                mouse_loc = np.argwhere(self.entered) 
-                r = mouse_loc[0,0]
-                c = mouse_loc[0,1]
-                if self.was_left_click:
-                    self.click(r,c)
-                if self.was_right_click:
-                    self.rclick(r,c)
-                if self.was_both_click:
-                    self.bclick(r,c)
-            self.was_both_click = False
-            self.was_left_click = False
-            self.was_right_click = False
-        elif self.left_click and self.right_click: # both click
-            self.was_both_click = True
-            self.was_left_click = False
-            self.was_right_click = False
-        elif  self.right_click: # right click
-            if self.was_both_click and self.both_click_timer < 5:
-                self.both_click_timer += 1
-            else:
-                self.both_click_timer = 0
-                self.was_both_click = False
-                self.was_left_click = False
-                self.was_right_click = True
-        elif  self.left_click: # left click
-            if self.was_both_click and self.both_click_timer < 5:
-                self.both_click_timer += 1
-            else:
-                self.both_click_timer = 0
-                self.was_both_click = False
-                self.was_left_click = True
-                self.was_right_click = False
-
-        self.root.after(30, self.check_clicked)
         
-        
-    def rightclick(self, event):
-        self.right_click = True
-
-    def lefttclick(self, event):
+        from replay import Recorder
+        # The rules live in the headless game; this frame only draws it.
+        if self.endless.get():
+            from endless import EndlessGame
+            self.game = EndlessGame()
+        elif self.noguess.get():
+            if self.pool is None:
+                from noguess import BoardPool
+                self.pool = BoardPool()
+            self.pool.select(self.rows, self.cols, self.num_mines)
+            self.game = Game(self.rows, self.cols, self.num_mines,
+                             generator=self.pool.minefield)
+            self.pooled = True
+        else:
+            self.game = Game(self.rows, self.cols, self.num_mines)
+            if self.rows * self.cols >= AHEAD_CELLS:
+                self.make_board()
+        if not self.endless.get():
+            # Every game is recorded so it can be saved as a replay.
+            self.game = Recorder(self.game)
+        if self.profiler is not None:
+            self.profile_game()
+        self.update_counter(self.game.mines_left)
+        self.field.set_overlay(None)
+        self.field.mark(None)
+        self.field.reset(self.game.rows, self.game.cols, self.game.cell)
+        if self.endless.get():
+            self.field.scroll_to(self.game.start[0] - self.field.view_rows // 2,
+                                 self.game.start[1] - self.field.view_cols // 2)
+
+    def make_board(self):
+        """
+        Start making the board of the new game on a thread, so neither
+        this restart nor the first click has to wait for it.
+        """
+        from pregen import BoardMaker
+        from replay import Recorder
+        game = self.game.game if isinstance(self.game, Recorder) \
+            else self.game
+        self.maker = BoardMaker(self.rows, self.cols, self.num_mines,
+                                seed=game.board_seed)
+        game.generator = self.maker.minefield
+        if self.maker_job is None:
+            self.poll_board()
+
+    def poll_board(self):
+        """
+        Show how far the board has got and make the first click once it
+        is ready.  Runs on the Tk loop; the thread never touches Tk.
+        """
+        self.maker_job = None
+        maker = self.maker
+        if maker is None:
+            self.lab_status.pack_forget()
+            return
+        if not maker.done.is_set():
+            self.lab_status.config(text=''.join((
+                'Making the board... ', format(maker.progress, '.0%'),
+                '  (Esc cancels)')))
+        elif maker.ready:
+            self.lab_status.pack_forget()
+            if self.pending_click is not None:
+                self.click(*self.pending_click)
+            return
+        elif maker.error is not None:
+            self.lab_status.config(text=''.join(('Could not make the board: ',
+                                                 str(maker.error))))
+            return
+        else:
+            self.lab_status.config(
+                text='Cancelled.  Click the board to make it after all.')
+            return
+        if not self.lab_status.winfo_manager():
+            self.lab_status.pack(fill=tk.X, padx=5, before=self.minefield_frame)
+        self.maker_job = self.root.after(FRAME_MS * 4, self.poll_board)
+
+    def poll_pool(self):
+        """
+        Make the first click once the no-guess pool has a board for it,
+        showing that one is being made until then.
+        """
+        self.pool_job = None
+        if self.pending_click is None or not self.pooled:
+            self.lab_status.pack_forget()
+            return
+        r, c = self.pending_click
+        if self.pool.ready(self.game.rows, self.game.cols,
+                           self.game.num_mines, r, c):
+            self.lab_status.pack_forget()
+            self.pending_click = None
+            self.click(r, c)
+            return
+        self.lab_status.config(text='Making a no-guess board...')
+        if not self.lab_status.winfo_manager():
+            self.lab_status.pack(fill=tk.X, padx=5, before=self.minefield_frame)
+        self.pool_job = self.root.after(FRAME_MS * 4, self.poll_pool)
+
+    def cancel_board(self, _=None):
+        if self.maker is not None and not self.maker.done.is_set():
+            self.maker.cancel()
+            self.pending_click = None
+
+    def profile_game(self):
+        """Time the new game's actions and its board generation."""
+        for attr, name in [('reveal', 'click'), ('chord', 'bclick'),
+                           ('flag', 'rclick')]:
+            self.profiler.wrap(self.game, attr, name, cells=True)
+        if self.endless.get():
+            self.profiler.wrap(self.game, 'make_numbers', 'generate-chunk')
+        else:
+            self.profiler.wrap(self.game.game, 'generator', 'generate')
+
+    def press(self, event):
+        """
+        A mouse button went down on the minefield.  Pressing the second
+        button while the first is held starts a chord.
+        """
+        self.buttons_down.add(event.num)
+        if len(self.buttons_down) == 2:
+            self.chording = True
         if not self.dead:
-            self.but_smile.config(image=self.im['o'])
-        self.left_click = True
-
-    def norightclick(self, event):
-        
-        self.right_click = False
-
-    def nolefttclick(self, event):
+            if event.num == 1 or self.chording:
+                self.but_smile.config(image=self.im['o'])
+
+    def release(self, event):
+        """
+        A mouse button came up.  Single clicks act on release; a chord acts
+        once both buttons are up, wherever the mouse is at that point.
+        """
+        self.buttons_down.discard(event.num)
         if not self.dead:
             self.but_smile.config(image=self.im['smile'])
-        self.left_click = False
+        if self.buttons_down:
+            return
+        cell = self.field.cell_at(event.x, event.y)
+        chording = self.chording
+        self.chording = False
+        if cell is None:
+            return
+        if chording:
+            self.bclick(*cell)
+        elif event.num == 1:
+            self.click(*cell)
+        elif event.num == 3:
+            self.rclick(*cell)
 
     def bclick(self, r, c):
-        if self.clicked[r,c] and not self.gameover:
-            neighboring_flags = convolve2d(
-                self.rclicked, np.ones((3,3)), mode='same', boundary='fill')
-            if neighboring_flags[r,c] == self.minefield[r,c]:
-                for x in range(r-1, r+2):
-                    for y in range(c-1, c+2):
-                        if x>=0 and x < self.rows and y>=0 and y < self.cols:
-                            if not self.clicked[x,y]:
-                                self.click(x,y)
-        
+        self.update_view(self.play(self.game.chord, r, c))
             
     def rclick(self,r,c):
-        if not self.clicked[r,c] and not self.first and not self.gameover:
-            if self.rclicked[r,c]:
-                self.rclicked[r,c] = False
-                self.btn[r][c].config(image=self.im['blank'])
-            else:
-                self.rclicked[r,c] = True
-                self.btn[r][c].config(image=self.im['flag'])
-        
-        self.update_counter(self.num_mines - np.count_nonzero(self.rclicked))
+        self.update_view(self.play(self.game.flag, r, c))
         
     def click(self,r, c):
-        if self.first and not self.gameover:
-            # Generate minefield.
-            self.minefield = generate_minefield(self.rows, self.cols,
-                                                self.num_mines,
-                                                r, c)
-            self.first = False
-        if not self.clicked[r,c] and not self.rclicked[r,c] and not self.gameover:
-            #if self.minefield[r,c]:
-            self.btn[r][c].config(image=self.im[str(self.minefield[r,c])])
-            self.clicked[r,c] = True
-            if self.minefield[r,c] == 9:
-                self.lose(r,c)
-            elif self.minefield[r,c] == 0: # Click all the other butons
-                for x in range(r-1, r+2):
-                    for y in range(c-1, c+2):
-                        if x>=0 and x < self.rows and y>=0 and y < self.cols:
-                            if not self.clicked[x,y]:
-                                self.click(x,y)
-
-            if np.count_nonzero(self.clicked) >= self.rows* self.cols - self.num_mines:
-                    self.win()
-
-                
+        if self.game.first and self.maker is not None and \
+                not self.maker.ready:
+            # Played as soon as the board is made; see poll_board().
+            self.pending_click = (r, c)
+            if self.maker.done.is_set():
+                self.make_board()
+            return
+        if self.game.first and self.pooled and \
+                not self.pool.ready(self.game.rows, self.game.cols,
+                                    self.game.num_mines, r, c):
+            # Played once the pool has the board; see poll_pool().
+            self.pending_click = (r, c)
+            if self.pool_job is None:
+                self.poll_pool()
+            return
+        first = self.game.first
+        self.update_view(self.play(self.game.reveal, r, c))
+        if first and not self.game.first and not self.gameover:
+            self.update_clock()
+
+    def play(self, action, r, c):
+        """Make a move, keeping a snapshot from before it in practice games."""
+        from replay import Recorder
+        if not self.practice.get() or not isinstance(self.game, Recorder):
+            return action(r, c)
+        snapshot = self.game.snapshot()
+        changed = action(r, c)
+        if changed:
+            self.history.append(snapshot)
+        return changed
+
+    def undo(self, _=None):
+        """Take back the last move of a practice game, even a losing one."""
+        if not self.history or self.game.status == WON:
+            return
+        # The overlay is of the position being taken back: clear it before
+        # the re-covered cells are drawn, and work out the new one after.
+        self.analysis = None
+        self.field.set_overlay(None)
+        self.field.draw(self.game.rollback(self.history.pop()))
+        self.update_counter(self.game.mines_left)
+        self.analyse()
+        if self.dead:
+            self.dead = False
+            self.gameover = False
+            self.but_smile.config(image=self.im['smile'])
+            if self.clock_job is None:
+                self.update_clock()
+
+    def update_view(self, changed):
+        """Redraw the cells an action changed and react to the game ending."""
+        self.field.draw(changed)
+        self.update_counter(self.game.mines_left)
+        if changed:
+            self.analyse()
+        if self.game.gameover and not self.gameover:
+            if self.game.status == LOST:
+                # Mines can be anywhere in view, not only in changed cells.
+                self.field.redraw()
+                self.lose()
+            else:
+                self.win()
+
+    def analyse(self):
+        """
+        Hand the position to the background analysis if the probabilities
+        or a hint are wanted.  Only the constraint components the last move
+        touched are enumerated again, and a newer position cancels an
+        analysis still running.
+        """
+        from replay import Recorder
+        self.field.mark(None)
+        wanted = self.heatmap.get() or self.hint_wanted
+        if not wanted or not isinstance(self.game, Recorder) or \
+                self.game.first or self.game.gameover:
+            self.analysis = None
+            self.field.set_overlay(None)
+            return
+        if self.live is None:
+            from solver import LiveAnalysis
+            self.live = LiveAnalysis()
+        self.live.update(self.game.minefield, np.asarray(self.game.revealed),
+                         np.asarray(self.game.flagged), self.game.num_mines)
+        if self.analysis_job is None:
+            self.analysis_job = self.root.after(FRAME_MS, self.poll_analysis)
+
+    def poll_analysis(self):
+        """Show the analysis once it has caught up with the game."""
+        self.analysis_job = None
+        if self.live.position != self.live.requested:
+            self.analysis_job = self.root.after(FRAME_MS, self.poll_analysis)
+            return
+        self.analysis = self.live.result
+        if self.analysis is None or not self.heatmap.get():
+            self.field.set_overlay(None)
+        else:
+            self.field.set_overlay(self.heat)
+        if self.hint_wanted:
+            self.hint_wanted = False
+            self.show_hint()
+
+    def heat(self, r, c):
+        """The tint of a covered cell, from green when safe to red."""
+        if self.game.revealed[r, c] or self.game.flagged[r, c]:
+            return None
+        p = self.analysis.probabilities[r, c]
+        if not np.isfinite(p):
+            return None   # not a covered cell of the analysed position
+        return HEAT[int(p * 10 + 0.5)]
+
+    def f6_heatmap(self, _):
+        self.heatmap.set(not self.heatmap.get())
+        self.analyse()
+
+    def hint(self, _=None):
+        """Outline a cell that is certainly safe."""
+        if self.analysis is not None and \
+                self.live.position == self.live.requested:
+            self.show_hint()
+        else:
+            self.hint_wanted = True
+            self.analyse()
+
+    def show_hint(self):
+        if self.analysis is not None:
+            for r, c in self.analysis.safe:
+                if not self.game.revealed[r, c]:
+                    self.field.mark((r, c))
+                    return
+        self.root.bell()
+
+    def save_replay(self):
+        from replay import Recorder
+        if not isinstance(self.game, Recorder):
+            messagebox.showinfo("Replay", "Endless games are not recorded.")
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self, title='Save Replay', defaultextension='.msrp',
+            filetypes=[('Minesweeper replays', '*.msrp')])
+        if path:
+            self.game.save(path)
+
     def exit_program(self):
         self.root.destroy()
         sys.exit(0)
 
-    def lose(self, x, y):
+    def lose(self):
         self.gameover=True
+        self.dead = True
         self.but_smile.config(image=self.im['dead'])
-        bombs = self.minefield == 9
-        bombs = np.argwhere(bombs)
-        for r, c in bombs:
-            if not self.rclicked[r,c]:
-                self.btn[r][c].config(image=self.im['bomb'])
-        flags = np.argwhere(self.rclicked)
-        for r, c in flags:
-            if self.minefield[r,c] != 9:                
-                self.btn[r][c].config(image=self.im['xbomb'])
-                
-        self.btn[x][y].config(image=self.im['9'])
+        if self.practice.get():
+            return
         if tk.messagebox.askyesno("Good game", "You lost.  Play again?"):
             self.restart()
         else:
             self.exit_program()
 
     def win(self):
+        from metrics import efficiency
         self.gameover = True
         self.but_smile.config(image=self.im['cool'])
-        if self.level == 0:
-            hs = int(self.highscores['Beginner'].split()[1])
-        elif self.level == 1:
-            hs = int(self.highscores['Intermediate'].split()[1])
-        elif self.level == 2:
-            hs = int(self.highscores['Expert'].split()[1])
-        else:
-            hs = -1
-
-        if self.time < hs:
+        if self.practice.get():
+            return
+        # Every win is recorded; a time in the top ten asks for a name.
+        self.newhs_game = (self.game.rows, self.game.cols,
+                           self.game.num_mines, self.time,
+                           self.game.board_seed,
+                           efficiency(self.game.minefield,
+                                      self.game.num_clicks)) #Prevents exploit
+        if self.scores.rank(*self.newhs_game[:4]) < 10:
             self.new_highscore()
         else:
-            
+            self.scores.add(*self.newhs_game[:4], name=self.player_name,
+                            seed=self.newhs_game[4],
+                            efficiency=self.newhs_game[5])
             if tk.messagebox.askyesno("Good game", "You won!  Play again?"):
                 self.restart()
             else:
@@ -453,33 +882,27 @@ class Minesweeper(tk.Frame):
 
     def options_ok(self):
         good = False
-        if self.var_options.get() == 0:
-            self.rows = 9
-            self.cols = 9
-            self.num_mines = 10
-            self.level = 0
-            good = True
-        elif self.var_options.get() == 1:
-            self.rows = 16
-            self.cols = 16
-            self.num_mines = 40
-            self.level=1
-            good = True
-        elif self.var_options.get() == 2:
-            self.rows = 16
-            self.cols = 30
-            self.num_mines = 99
-            self.level=2
+        if self.var_options.get() < len(LEVELS):
+            self.level = self.var_options.get()
+            _, self.rows, self.cols, self.num_mines = LEVELS[self.level]
             good = True
         elif self.var_options.get() == 3:
             if self.op_rows.check():
                 if self.op_mines.check():
                     if self.op_cols.check():
-                        self.rows = int(self.op_rows.get())
-                        self.cols = int(self.op_cols.get())
-                        self.num_mines = int(self.op_mines.get())
-                        self.level=3
-                        good = True
+                        rows = int(self.op_rows.get())
+                        cols = int(self.op_cols.get())
+                        num_mines = int(self.op_mines.get())
+                        if rows < 1 or cols < 1 or num_mines >= rows * cols:
+                            messagebox.showwarning(
+                                "Input error",
+                                'Mines should be fewer than rows x columns.')
+                        else:
+                            self.rows = rows
+                            self.cols = cols
+                            self.num_mines = num_mines
+                            self.level=3
+                            good = True
         if good:
             self.restart()
             self.optionsTL.destroy()
@@ -510,7 +933,7 @@ class Minesweeper(tk.Frame):
         self.lab_count[2].config(image=self.im[''.join(('c',v[2]))])
 
     def update_clock(self):
-        if not self.first and self.time < 999 and not self.gameover:
+        if not self.game.first and self.time < 999 and not self.gameover:
             self.time += 1
             time = str(int(self.time))
             if self.time < 10:
@@ -520,63 +943,55 @@ class Minesweeper(tk.Frame):
             self.lab_clock[0].config(image=self.im[''.join(('c',time[0]))])
             self.lab_clock[1].config(image=self.im[''.join(('c',time[1]))])
             self.lab_clock[2].config(image=self.im[''.join(('c',time[2]))])
-
-        self.root.after(1000, self.update_clock)
+            # The clock only ticks while a game is being played.
+            self.clock_job = self.root.after(1000, self.update_clock)
+        else:
+            self.clock_job = None
 
     def manage_high_scores(self):
-        self.fhsfile = 'assets/high_scores.txt'
-        self.rhsfile = 'bitio'
-        self.highscores = {}
-        self.levels = ['Beginner', 'Intermediate', 'Expert']
-
-        if not os.path.exists(self.fhsfile):
-            with open(self.fhsfile, 'w') as f:
-                string = 'Anonymous 999\nAnonymous 999\nAnonymous 999'
-                f.write(string)
-
-        if not os.path.exists(self.rhsfile):
-            with open(self.rhsfile, 'w') as f:
-                string = ''.join((toHex('Anonymous 999'), '\n',
-                                  toHex('Anonymous 999'), '\n',
-                                  toHex('Anonymous 999')))
-                f.write(string)
-
-        with open(self.rhsfile, 'r') as f:
-            for i, line in enumerate(f):
-                self.highscores[self.levels[i]] = toStr(line.strip())
-
+        from scores import ScoreStore
+        self.scores = ScoreStore('scores.db')
+        self.scores.import_bitio('bitio')
+        self.player_name = 'Anonymous'
 
     def reset_highscores(self):
-        with open(self.rhsfile, 'w') as f:
-            string = ''.join((toHex('Anonymous 999'), '\n',
-                              toHex('Anonymous 999'), '\n',
-                              toHex('Anonymous 999')))
-            f.write(string)
-        self.highscores['Beginner'] = 'Anonymous 999'
-        self.highscores['Intermediate'] = 'Anonymous 999'
-        self.highscores['Expert'] = 'Anonymous 999'
-        self.hslab_time.config(text='999 seconds\n999 seconds\n999 seconds')
-        self.hslab_name.config(text='Anonymous\nAnonymous\nAnonymous')
+        if tk.messagebox.askyesno("Reset high scores",
+                                  "Delete every recorded score?"):
+            self.scores.clear()
+            self.highscoresTL.destroy()
+            self.view_high_scores()
 
     def f4_hs(self, _):
         self.view_high_scores()
         
     def view_high_scores(self):
+        from scores import level_name
         self.highscoresTL = tk.Toplevel(self)
         self.highscoresTL.title('Fastest Mine Sweepers')
         self.pack()
+
+        sizes = [(r, c, m) for _, r, c, m in LEVELS]
+        sizes += sorted(set(self.scores.levels()) - set(sizes))
+        levels, times, names = [], [], []
+        for rows, cols, mines in sizes:
+            top = self.scores.top(rows, cols, mines, 1)
+            levels.append(''.join((level_name(rows, cols, mines), ':')))
+            if top:
+                _, seconds, _, _, eff = top[0]
+                times.append(''.join((str(int(seconds)), ' seconds')))
+                if eff is not None:
+                    # 3BV per click, so times on easy boards stand out.
+                    times[-1] += ''.join((' (', format(eff, '.0%'), ')'))
+                names.append(top[0][0])
+            else:
+                times.append('999 seconds')
+                names.append('Anonymous')
         self.hslab_level = tk.Label(self.highscoresTL, justify='left',
-                                    text='Begginer:\nIntermediate:\nExpert:')
+                                    text='\n'.join(levels))
         self.hslab_time = tk.Label(self.highscoresTL, justify='left',
-            text = ''.join((self.highscores['Beginner'].split()[1], ' seconds\n',
-                            self.highscores['Intermediate'].split()[1], ' seconds\n',
-                            self.highscores['Expert'].split()[1], ' seconds'
-                            )))
+                                   text='\n'.join(times))
         self.hslab_name = tk.Label(self.highscoresTL, justify='left',
-            text = ''.join((self.highscores['Beginner'].split()[0], '\n',
-                            self.highscores['Intermediate'].split()[0], '\n',
-                            self.highscores['Expert'].split()[0]
-                            )))
+                                   text='\n'.join(names))
 
         self.hsbut_ok = tk.Button(self.highscoresTL, width = 5,
                                   text='Ok', command=self.highscoresTL.destroy)
@@ -592,16 +1007,16 @@ class Minesweeper(tk.Frame):
 
         
     def new_highscore(self):
+        from scores import level_name
         self.newhs = tk.Toplevel(self)
         self.newhs.title('New High Score!')
         self.pack()
 
-        self.newhs_level = self.level #Prevents exploit
-        text = ''.join(("Wow!  You just beat the fastest time on ",
-                        self.levels[self.newhs_level],
+        text = ''.join(("Wow!  That is one of the ten fastest times on ",
+                        level_name(*self.newhs_game[:3]),
                         "\nWhat is your name?"))
         
-        self.newhs_name = tk.StringVar()
+        self.newhs_name = tk.StringVar(value=self.player_name)
         self.newhs_label = tk.Label(self.newhs, text=text)
         self.newhs_entry = tk.Entry(self.newhs, width = 15,
                                     textvariable = self.newhs_name)
@@ -614,13 +1029,10 @@ class Minesweeper(tk.Frame):
         
 
     def ok_newhs(self):
-        self.highscores[self.levels[self.newhs_level]] = ''.join((
-            self.newhs_name.get(), ' ', str(self.time)))
-        with open(self.rhsfile, 'w') as f:
-            string = ''.join((toHex(self.highscores['Beginner']), '\n',
-                              toHex(self.highscores['Intermediate']), '\n',
-                              toHex(self.highscores['Expert'])))
-            f.write(string)
+        self.player_name = self.newhs_name.get().strip() or 'Anonymous'
+        self.scores.add(*self.newhs_game[:4], name=self.player_name,
+                        seed=self.newhs_game[4],
+                        efficiency=self.newhs_game[5])
         self.newhs.destroy()
 
         if tk.messagebox.askyesno("Good game", "Play again?"):
@@ -628,30 +1040,17 @@ class Minesweeper(tk.Frame):
         else:
             self.root.destroy()
             sys.exit(0)
-        
-    
-                
-                            
-
-#convert string to hex
-def toHex(s):
-    from functools import reduce
-    lst = []
-    for ch in s:
-        hv = hex(ord(ch)).replace('0x', '')
-        if len(hv) == 1:
-            hv = '0'+hv
-        lst.append(hv)
-    
-    return reduce(lambda x,y:x+y, lst)
-
-#convert hex repr to string
-def toStr(s):
-    import binascii
-    return str(binascii.unhexlify(s), 'utf-8')
 
 
 if __name__ == '__main__':
-    myapp = Minesweeper()
-    myapp.master.title('Minesweeper')
-    myapp.mainloop() 
+    parser = argparse.ArgumentParser(description='Minesweeper')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print import and first-frame times')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write latency histograms to PATH at exit '
+                        '(JSON, or CSV if PATH ends in .csv)')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, also run under cProfile')
+    args = parser.parse_args()
+    myapp = Minesweeper(report_startup=args.startup_time,
+                        profile=args.profile, cprofile=args.cprofile)
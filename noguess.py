@@ -0,0 +1,193 @@
+"""
+Boards that can be solved without guessing.
+
+generate_noguess() keeps drawing boards until one can be cleared from the
+first click by deduction alone.  That costs real CPU, so BoardPool keeps a
+few ready boards per board size on a background thread.  Its pools are
+keyed by the position class of the first click: the click's cell folded
+into one corner of the board by the board's mirror symmetries.  A board
+made for one cell of a class serves every cell of that class by mirroring
+it, so a first click is usually answered from the pool without waiting.
+When the pool for a click is empty it is made next, and the caller waits
+for the background thread rather than generating the board itself: a
+GUI can check .ready() first and show that it is busy in the meantime.
+"""
+import collections
+import threading
+
+import numpy as np
+
+from engine import Game, WON
+from minefield import generate_minefields
+from solver import analyse_game
+
+# Seconds between checks that the pool is still running while waiting.
+WAIT = 0.1
+
+
+def is_solvable(minefield, r, c):
+    """True if the board can be cleared from a first click at (r, c)
+    without ever having to guess."""
+    game = Game(*minefield.shape)
+    game.load(minefield)
+    game.reveal(r, c)
+    while not game.gameover:
+        analysis = analyse_game(game)
+        if not analysis.safe:
+            return False
+        for cell in analysis.safe:
+            game.reveal(*cell)
+    return game.status == WON
+
+
+def generate_noguess(rows, cols, num_mines, r, c, seed=None, batch=16):
+    """
+    A board with the first click at (r, c) that needs no guessing.
+    Candidates are drawn batch at a time from generate_minefields.
+    """
+    rng = np.random.default_rng(seed)
+    while True:
+        for minefield in generate_minefields(batch, rows, cols, num_mines,
+                                             r, c, seed=rng):
+            if is_solvable(minefield, r, c):
+                return minefield
+
+
+def position_class(rows, cols, r, c):
+    """
+    Fold (r, c) into the top-left corner of the board.  Returns the folded
+    cell and the (flip rows, flip columns, transpose) steps that map the
+    folded cell back to (r, c).
+    """
+    flip_rows = r > rows - 1 - r
+    flip_cols = c > cols - 1 - c
+    if flip_rows:
+        r = rows - 1 - r
+    if flip_cols:
+        c = cols - 1 - c
+    transpose = rows == cols and r > c
+    if transpose:
+        r, c = c, r
+    return (r, c), (flip_rows, flip_cols, transpose)
+
+
+def unfold(minefield, steps):
+    """Mirror a board made for a folded cell back onto the clicked cell."""
+    flip_rows, flip_cols, transpose = steps
+    if transpose:
+        minefield = minefield.T
+    if flip_cols:
+        minefield = minefield[:, ::-1]
+    if flip_rows:
+        minefield = minefield[::-1, :]
+    return np.ascontiguousarray(minefield)
+
+
+class BoardPool:
+    """
+    Ready no-guess boards, filled by a background thread.
+    Call .select() with the board size being played and use .minefield
+    as an engine.Game generator.  size is the number of boards kept per
+    position class.
+    """
+    def __init__(self, size=1, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.boards = {}   # (rows, cols, mines, cell) -> deque of boards
+        self.preset = None
+        self.urgent = None
+        self.lock = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    def select(self, rows, cols, num_mines):
+        """
+        Keep boards of this size ready, dropping the pools of the size
+        selected before.
+        """
+        with self.lock:
+            if self.preset == (rows, cols, num_mines):
+                return
+            self.preset = (rows, cols, num_mines)
+            self.urgent = None
+            self.boards = {}
+            for r in range((rows + 1) // 2):
+                for c in range((cols + 1) // 2):
+                    cell, _ = position_class(rows, cols, r, c)
+                    self.boards.setdefault((rows, cols, num_mines, cell),
+                                           collections.deque())
+            self.lock.notify()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.lock.notify_all()
+
+    def ready(self, rows, cols, num_mines, r, c):
+        """
+        True if a board for a first click at (r, c) is waiting.  If not,
+        it is made next.
+        """
+        cell, _ = position_class(rows, cols, r, c)
+        key = (rows, cols, num_mines, cell)
+        with self.lock:
+            if self.boards.get(key):
+                return True
+            if key in self.boards:
+                self.urgent = key
+                self.lock.notify_all()
+            return False
+
+    def minefield(self, rows, cols, num_mines, r, c, seed=None):
+        """
+        A no-guess board for a first click at (r, c).  Waits for the
+        background thread when none is ready; only a stopped pool, or one
+        that was never asked for this size, makes the board on the spot.
+        """
+        cell, steps = position_class(rows, cols, r, c)
+        key = (rows, cols, num_mines, cell)
+        board = None
+        with self.lock:
+            while self.running and key in self.boards and \
+                    not self.boards[key]:
+                self.urgent = key
+                self.lock.notify_all()
+                self.lock.wait(WAIT)
+            if self.boards.get(key):
+                board = self.boards[key].popleft()
+                self.lock.notify_all()
+        if board is None:
+            board = generate_noguess(rows, cols, num_mines, *cell, seed=seed)
+        return unfold(board, steps)
+
+    def wanted(self):
+        """
+        The pool a click is waiting on, else the emptiest pool that is not
+        full, else None.
+        """
+        if self.urgent in self.boards and not self.boards[self.urgent]:
+            return self.urgent
+        key = min(self.boards, key=lambda k: len(self.boards[k]), default=None)
+        if key is None or len(self.boards[key]) >= self.size:
+            return None
+        return key
+
+    def fill(self):
+        while True:
+            with self.lock:
+                key = self.wanted()
+                while self.running and key is None:
+                    self.lock.wait()
+                    key = self.wanted()
+                if not self.running:
+                    return
+                seed = int(self.rng.integers(2**63))
+            rows, cols, num_mines, cell = key
+            board = generate_noguess(rows, cols, num_mines, *cell, seed=seed)
+            with self.lock:
+                if key in self.boards:
+                    self.boards[key].append(board)
+                    if key == self.urgent:
+                        self.urgent = None
+                    self.lock.notify_all()
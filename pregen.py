@@ -0,0 +1,247 @@
+"""
+Boards made ahead of the first click.
+
+Generating a huge board, counting its numbers and labelling its openings
+takes long enough to freeze a GUI.  BoardMaker does all of it on a
+background thread as soon as a game starts, before anyone has clicked,
+with progress and cancellation.  The first click then only has to move
+the few mines in its neighbourhood elsewhere, to cells picked uniformly
+from the free ones, which changes the board near the click and near the
+new mine positions.  Only the openings there can grow, merge or split,
+so the precomputed openings are patched around those cells instead of
+being worked out again.
+
+A thread, not a process: the work is a handful of large NumPy and SciPy
+calls that release the GIL, so the GUI stays responsive, and the arrays
+are handed over without copying them between processes.
+"""
+import threading
+
+import numpy as np
+
+from minefield import MINE, count_neighbors
+from topology import get_topology
+
+# Cells of the board placed or counted per step, between progress updates.
+CHUNK = 1 << 18
+# Share of the progress bar for placing mines, counting and labelling.
+PHASES = (0.4, 0.3, 0.3)
+# Random cells tried for a moved mine before picking from a list of all
+# the free cells, which is only worth making on crowded boards.
+TRIES = 1000
+
+
+class Cancelled(Exception):
+    """The board was cancelled before it was finished."""
+
+
+class BoardMaker:
+    """
+    Makes one rows x cols board with num_mines mines on a background
+    thread.  .progress goes from 0 to 1, .done is set once the board is
+    ready (or failed, or was cancelled) and .cancel() stops it.  Once
+    done, .minefield works as an engine.Game generator.
+    """
+    def __init__(self, rows, cols, num_mines, seed=None, topology='square'):
+        self.rows = rows
+        self.cols = cols
+        self.num_mines = num_mines
+        self.topology = get_topology(topology, rows, cols)
+        self.rng = np.random.default_rng(seed)
+        self.progress = 0.0
+        self.cancelled = False
+        self.error = None
+        self.board = None
+        self.openings = None
+        self.done = threading.Event()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    @property
+    def ready(self):
+        return self.board is not None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def step(self, phase, fraction):
+        if self.cancelled:
+            raise Cancelled()
+        self.progress = sum(PHASES[:phase]) + PHASES[phase] * fraction
+
+    def run(self):
+        try:
+            mines = self.place_mines()
+            board = self.count(mines)
+            self.step(2, 0)
+            openings = self.topology.openings(board)
+            # The first click and the game look up neighbours in these.
+            self.topology.tables()
+            self.step(2, 1)
+            self.openings = openings
+            self.board = board
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        self.done.set()
+
+    def place_mines(self):
+        """
+        A uniformly random mine mask, a chunk of cells at a time: how many
+        mines each chunk gets is drawn from the multivariate
+        hypergeometric distribution, then they are placed in it.
+        """
+        n = self.rows * self.cols
+        if not 0 <= self.num_mines <= n:
+            raise ValueError(''.join(('Cannot place ', str(self.num_mines),
+                                      ' mines on ', str(n), ' cells.')))
+        sizes = [min(CHUNK, n - start) for start in range(0, n, CHUNK)]
+        counts = self.rng.multivariate_hypergeometric(sizes, self.num_mines)
+        mines = np.zeros(n, dtype=bool)
+        for k, (size, count) in enumerate(zip(sizes, counts)):
+            self.step(0, k / len(sizes))
+            if count:
+                keys = self.rng.random(size, dtype=np.float32)
+                picks = np.argpartition(keys, count - 1)[:count]
+                mines[k * CHUNK + picks] = True
+        return mines.reshape(self.rows, self.cols)
+
+    def count(self, mines):
+        """The minefield of a mask, counted a band of rows at a time."""
+        if self.topology.kind != 'square':
+            self.step(1, 0)
+            return self.topology.minefield(mines)
+        board = np.empty(mines.shape, dtype=np.uint8)
+        band = max(CHUNK // self.cols, 1)
+        for start in range(0, self.rows, band):
+            self.step(1, start / self.rows)
+            stop = min(start + band, self.rows)
+            # One row of overlap either side for the neighbours.
+            top = max(start - 1, 0)
+            counts = count_neighbors(mines[top:stop + 1])
+            board[start:stop] = counts[start - top:start - top + stop - start]
+        board[mines] = MINE
+        return board
+
+    def minefield(self, rows, cols, num_mines, r, c, seed=None,
+                  topology=None):
+        """
+        The board with the mines around a first click at (r, c) moved
+        away, and its openings, as a (minefield, openings) pair.  Waits
+        for the board if it is not done yet.  Every call gets a copy to
+        change, so a game rolled back past its first click can click
+        again.
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        if self.board is None:
+            raise Cancelled()
+        labels, cells, starts = self.openings
+        return self.clear(self.board.copy(), (labels.copy(), cells, starts),
+                          r, c)
+
+    def clear(self, board, openings, r, c):
+        """Move the mines off (r, c) and its neighbours; see the module."""
+        topology = self.topology
+        flat = board.ravel()
+        i = r * self.cols + c
+        area = [i] + topology.neighbor_list(i)
+        if flat.size - len(area) < self.num_mines:
+            # No room: only the clicked cell is kept clear, as usual.
+            area = [i]
+        moved = [j for j in area if flat[j] == MINE]
+        if not moved:
+            return board, openings
+        keep_out = set(area)
+        targets = self.targets(flat, keep_out, len(moved))
+        for j in moved:
+            flat[j] = 0
+        for j in targets:
+            flat[j] = MINE
+        touched = set(moved + targets)
+        for j in moved + targets:
+            touched.update(topology.neighbor_list(j))
+        for j in touched:
+            if flat[j] != MINE:
+                flat[j] = sum(flat[k] == MINE
+                              for k in topology.neighbor_list(j))
+        return board, self.merge(flat, openings, touched)
+
+    def targets(self, flat, keep_out, n):
+        """n new cells for moved mines, uniformly among the free cells
+        outside keep_out."""
+        targets = []
+        for _ in range(TRIES):
+            if len(targets) == n:
+                return targets
+            j = int(self.rng.integers(flat.size))
+            if flat[j] != MINE and j not in keep_out and j not in targets:
+                targets.append(j)
+        free = np.flatnonzero(flat != MINE)
+        free = np.setdiff1d(free, list(keep_out) + targets)
+        extra = self.rng.choice(free, n - len(targets), replace=False)
+        return targets + extra.tolist()
+
+    def merge(self, flat, openings, touched):
+        """
+        Patch the openings after the mines moved.  The zero cells in
+        touched that are new join up with each other and with the
+        openings next to them; the ones that are no longer zero leave
+        their openings, which may split.  Every opening changed gets a new
+        label appended to the cell lists; the labels it replaces are left
+        unused.
+        """
+        labels, cells, starts = openings
+        flat_labels = labels.ravel()
+        lost = [j for j in touched if flat[j] != 0 and flat_labels[j]]
+        new = [j for j in touched if flat[j] == 0 and not flat_labels[j]]
+        old = {int(flat_labels[j]) for j in lost}
+        for j in new:
+            old.update(int(flat_labels[k])
+                       for k in self.topology.neighbor_list(j)
+                       if flat[k] == 0 and flat_labels[k])
+        flat_labels[lost] = 0
+        region = np.concatenate(
+            [np.array(new, dtype=np.int64)] +
+            [cells[starts[k - 1]:starts[k]] for k in sorted(old)])
+        region = region[flat[region] == 0]
+        groups = self.components(region)
+        if not groups:
+            return openings
+        top = len(starts) - 1 + len(groups)
+        if top > np.iinfo(labels.dtype).max:
+            labels = labels.astype(np.min_scalar_type(top))
+            flat_labels = labels.ravel()
+        sizes = [len(g) for g in groups]
+        for k, group in enumerate(groups):
+            flat_labels[group] = len(starts) + k
+        cells = np.concatenate([cells] + groups).astype(cells.dtype)
+        starts = np.concatenate([starts, starts[-1] + np.cumsum(sizes)])
+        return labels, cells, starts
+
+    def components(self, cells):
+        """
+        The connected groups of the given cells, as a list of arrays.
+        Square boards label just the box around the cells.
+        """
+        if not len(cells):
+            return []
+        if self.topology.kind == 'square':
+            from scipy import ndimage  # slow to import
+            r, c = np.divmod(cells, self.cols)
+            top, left = r.min(), c.min()
+            box = np.zeros((r.max() - top + 1, c.max() - left + 1),
+                           dtype=bool)
+            box[r - top, c - left] = True
+            labels, n = ndimage.label(box, structure=np.ones((3, 3)))
+            parts = labels[r - top, c - left]
+        else:
+            mask = np.zeros(self.topology.size, dtype=bool)
+            mask[cells] = True
+            labels, n = self.topology.label(mask.reshape(self.rows,
+                                                         self.cols))
+            parts = labels.ravel()[cells]
+        order = np.argsort(parts, kind='stable')
+        sizes = np.bincount(parts, minlength=n + 1)[1:]
+        return np.split(cells[order], np.cumsum(sizes)[:-1])
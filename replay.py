@@ -0,0 +1,297 @@
+"""
+Compact binary game replays.
+
+A replay is the magic bytes b'MSRP' and a version byte, then a header of
+unsigned LEB128 varints:
+
+    flags, rows, cols, mines, board seed, checkpoint interval,
+    final status (0 playing, 1 won, 2 lost), number of moves
+
+If flags has bit 0 set the board could not be rebuilt from its seed (a
+no-guess board, say) and the mine layout follows as np.packbits bytes.
+The rest of flags, flags >> 1, is the board's index in topology.KINDS.
+The rest of the file is a stream of entries, each starting with a varint
+code.  Code 0 is a checkpoint: a varint length and that many bytes of
+zlib-compressed packed revealed and flagged bits.  Any other code is a
+move: code - 1 == cell * 3 + action (0 reveal, 1 flag, 2 chord), followed
+by the varint milliseconds since the previous move.
+
+Playback runs the moves through engine.Game, so it is deterministic.
+Checkpoints every `interval` moves let Replay.game_at() jump to any move
+by replaying at most interval moves.
+"""
+import time
+import zlib
+
+import numpy as np
+
+from engine import Game, PLAYING, WON, LOST
+from minefield import MINE, generate_minefield
+from topology import KINDS
+
+MAGIC = b'MSRP'
+VERSION = 1
+REVEAL, FLAG, CHORD = 0, 1, 2
+STATUS = [PLAYING, WON, LOST]
+
+
+def write_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data, pos):
+    """The varint at pos and the position after it.  Raises ValueError if
+    the data ends first."""
+    n = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Truncated replay.')
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+class Recorder:
+    """
+    Wraps an engine.Game and records the moves made through it.
+    Use it in place of the game; call .save() or .to_bytes() at any time.
+    .num_clicks counts the reveals and chords that uncovered a cell.
+    """
+    def __init__(self, game, interval=64):
+        self.game = game
+        self.interval = interval
+        self.moves = bytearray()
+        self.num_moves = 0
+        self.num_clicks = 0
+        self.last = None
+
+    def __getattr__(self, name):
+        return getattr(self.game, name)
+
+    def record(self, action, r, c):
+        now = time.monotonic()
+        ms = 0 if self.last is None else int((now - self.last) * 1000)
+        self.last = now
+        if self.num_moves and self.interval and \
+                self.num_moves % self.interval == 0:
+            write_varint(self.moves, 0)
+            state = zlib.compress(
+                np.packbits(np.asarray(self.game.revealed)).tobytes() +
+                np.packbits(np.asarray(self.game.flagged)).tobytes())
+            write_varint(self.moves, len(state))
+            self.moves += state
+        write_varint(self.moves, (r * self.game.cols + c) * 3 + action + 1)
+        write_varint(self.moves, ms)
+        self.num_moves += 1
+
+    def reveal(self, r, c):
+        if not self.game.gameover:
+            self.record(REVEAL, r, c)
+        return self.clicked(self.game.reveal(r, c))
+
+    def flag(self, r, c):
+        if not self.game.gameover:
+            self.record(FLAG, r, c)
+        return self.game.flag(r, c)
+
+    def chord(self, r, c):
+        if not self.game.gameover:
+            self.record(CHORD, r, c)
+        return self.clicked(self.game.chord(r, c))
+
+    def clicked(self, changed):
+        if changed:
+            self.num_clicks += 1
+        return changed
+
+    def snapshot(self):
+        return (self.game.snapshot(), len(self.moves), self.num_moves,
+                self.num_clicks)
+
+    def rollback(self, snapshot):
+        """Undo the game back to snapshot and forget the moves since."""
+        token, size, self.num_moves, self.num_clicks = snapshot
+        del self.moves[size:]
+        return self.game.rollback(token)
+
+    def to_bytes(self):
+        game = self.game
+        # Boards made some other way than from the seed carry their mines.
+        stored = game.minefield is not None and \
+            game.generator is not generate_minefield
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        flags = int(stored) | KINDS.index(game.topology.kind) << 1
+        for n in [flags, game.rows, game.cols, game.num_mines,
+                  game.board_seed, self.interval,
+                  STATUS.index(game.status), self.num_moves]:
+            write_varint(out, n)
+        if stored:
+            out += np.packbits(game.minefield == MINE).tobytes()
+        return bytes(out + self.moves)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+class Replay:
+    """
+    A parsed replay.  moves is a list of (milliseconds since the start,
+    action, row, col).  Call .game_at(i) for the game after i moves,
+    .play() to step through it and .validate() to check it.
+    """
+    def __init__(self, data):
+        if data[:4] != MAGIC:
+            raise ValueError('Not a minesweeper replay.')
+        if len(data) < 5:
+            raise ValueError('Truncated replay.')
+        if data[4] != VERSION:
+            raise ValueError(''.join(('Unknown replay version ',
+                                      str(data[4]), '.')))
+        pos = 5
+        header = []
+        for _ in range(8):
+            n, pos = read_varint(data, pos)
+            header.append(n)
+        (flags, self.rows, self.cols, self.num_mines, self.board_seed,
+         self.interval, status, self.num_moves) = header
+        if flags >> 1 >= len(KINDS):
+            raise ValueError('Unknown board topology.')
+        if self.rows < 1 or self.cols < 1 or \
+                self.num_mines >= self.rows * self.cols:
+            raise ValueError('Bad board size in the header.')
+        if status >= len(STATUS):
+            raise ValueError('Unknown final status.')
+        self.topology = KINDS[flags >> 1]
+        self.status = STATUS[status]
+        self.mines = None
+        if flags & 1:
+            size = (self.rows * self.cols + 7) // 8
+            if pos + size > len(data):
+                raise ValueError('Truncated replay.')
+            bits = np.frombuffer(data[pos:pos + size], dtype=np.uint8)
+            self.mines = np.unpackbits(bits, count=self.rows * self.cols)
+            self.mines = self.mines.reshape(self.rows, self.cols).view(bool)
+            pos += size
+
+        self.moves = []
+        self.checkpoints = {}   # move number -> (revealed, flagged) bits
+        ms = 0
+        while pos < len(data):
+            code, pos = read_varint(data, pos)
+            if code == 0:
+                size, pos = read_varint(data, pos)
+                if pos + size > len(data):
+                    raise ValueError('Truncated replay.')
+                self.checkpoints[len(self.moves)] = data[pos:pos + size]
+                pos += size
+                continue
+            dt, pos = read_varint(data, pos)
+            ms += dt
+            cell, action = divmod(code - 1, 3)
+            r, c = divmod(cell, self.cols)
+            self.moves.append((ms, action, r, c))
+        # Flags and chords before the first reveal are recorded but do
+        # nothing, which a game started on the rebuilt board must not see.
+        self.opening = next((i for i, move in enumerate(self.moves)
+                             if move[1] == REVEAL), len(self.moves))
+        self.minefield = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def new_game(self):
+        game = Game(self.rows, self.cols, self.num_mines,
+                    topology=self.topology)
+        game.board_seed = self.board_seed
+        if self.minefield is not None:
+            game.load(self.minefield)
+        return game
+
+    def apply(self, game, i):
+        """Make move i on game; returns the changed cells."""
+        _, action, r, c = self.moves[i]
+        if i < self.opening:
+            return []
+        if action == REVEAL:
+            if game.first and self.mines is not None:
+                game.load(game.topology.minefield(self.mines))
+            changed = game.reveal(r, c)
+            if self.minefield is None:
+                self.minefield = game.minefield
+            return changed
+        if action == FLAG:
+            return game.flag(r, c)
+        return game.chord(r, c)
+
+    def game_at(self, i):
+        """
+        The game after the first i moves, starting from the last
+        checkpoint at or before move i.
+        """
+        start = max([k for k in self.checkpoints if k <= i] or [0])
+        if start and self.minefield is None and \
+                self.opening < len(self.moves):
+            # The board comes from the first reveal; rebuild it once.
+            self.apply(self.new_game(), self.opening)
+        game = self.new_game()
+        if start:
+            bits = np.frombuffer(zlib.decompress(self.checkpoints[start]),
+                                 dtype=np.uint8)
+            cells = self.rows * self.cols
+            half = (cells + 7) // 8
+            revealed = np.unpackbits(bits[:half], count=cells)
+            flagged = np.unpackbits(bits[half:], count=cells)
+            game.restore(revealed.reshape(self.rows, self.cols).view(bool),
+                         flagged.reshape(self.rows, self.cols).view(bool))
+        for k in range(start, i):
+            self.apply(game, k)
+        return game
+
+    def play(self):
+        """Yield (milliseconds, action, row, col, changed cells) per move."""
+        game = self.new_game()
+        for i, (ms, action, r, c) in enumerate(self.moves):
+            yield ms, action, r, c, self.apply(game, i)
+
+    def validate(self):
+        """
+        Replay every move and check the moves are on the board with known
+        actions, and that the checkpoints and final status agree with the
+        header.  Raises ValueError if not.
+        """
+        if len(self.moves) != self.num_moves:
+            raise ValueError('Move count does not match the header.')
+        game = self.new_game()
+        for i in range(len(self.moves)):
+            _, action, r, c = self.moves[i]
+            if not (0 <= r < self.rows and 0 <= c < self.cols):
+                raise ValueError(''.join(('Move ', str(i),
+                                          ' is off the board.')))
+            if action not in (REVEAL, FLAG, CHORD):
+                raise ValueError(''.join(('Move ', str(i),
+                                          ' has an unknown action.')))
+            if i in self.checkpoints:
+                bits = np.packbits(np.asarray(game.revealed)).tobytes() + \
+                    np.packbits(np.asarray(game.flagged)).tobytes()
+                try:
+                    state = zlib.decompress(self.checkpoints[i])
+                except zlib.error:
+                    state = None
+                if state != bits:
+                    raise ValueError(''.join(('Checkpoint at move ', str(i),
+                                              ' does not match.')))
+            self.apply(game, i)
+        if game.status != self.status:
+            raise ValueError('Final status does not match the header.')
+        return game
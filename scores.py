@@ -0,0 +1,110 @@
+"""
+High scores kept in a local SQLite database.
+
+Every win is a row holding the board size, name, time, date, board seed
+and efficiency.  An index on (rows, cols, mines, seconds) makes the best
+times of any board size an index range scan.  Writes are transactions on
+a write-ahead log with full syncs, so a crash loses at most the write in
+flight and never corrupts the table.
+"""
+import binascii
+import datetime
+import os
+import sqlite3
+
+from engine import LEVELS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    mines INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    played TEXT NOT NULL,
+    seed INTEGER,
+    efficiency REAL
+);
+CREATE INDEX IF NOT EXISTS scores_by_level
+    ON scores (rows, cols, mines, seconds);
+"""
+
+
+def level_name(rows, cols, mines):
+    """'Beginner', 'Intermediate', 'Expert' or a custom size."""
+    for name, r, c, m in LEVELS:
+        if (r, c, m) == (rows, cols, mines):
+            return name
+    return ''.join(('Custom ', str(rows), 'x', str(cols), ' ', str(mines)))
+
+
+class ScoreStore:
+    """
+    The score database at path.
+    Call .add() after a win, .top() or .best() for the leaderboard.
+    """
+    def __init__(self, path='scores.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=FULL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add(self, rows, cols, mines, name, seconds, seed=None,
+            efficiency=None, played=None):
+        if played is None:
+            played = datetime.datetime.now().isoformat(timespec='seconds')
+        with self.db:
+            self.db.execute(
+                'INSERT INTO scores (rows, cols, mines, name, seconds, played,'
+                ' seed, efficiency) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (rows, cols, mines, name, seconds, played, seed, efficiency))
+
+    def top(self, rows, cols, mines, n=10):
+        """The n fastest (name, seconds, played, seed, efficiency) rows."""
+        return self.db.execute(
+            'SELECT name, seconds, played, seed, efficiency FROM scores'
+            ' WHERE rows = ? AND cols = ? AND mines = ?'
+            ' ORDER BY seconds LIMIT ?', (rows, cols, mines, n)).fetchall()
+
+    def best(self, rows, cols, mines):
+        """The fastest time on a board size, or None if it was never won."""
+        top = self.top(rows, cols, mines, 1)
+        return top[0][1] if top else None
+
+    def rank(self, rows, cols, mines, seconds):
+        """How many recorded times on this board size beat seconds."""
+        return self.db.execute(
+            'SELECT COUNT(*) FROM scores WHERE rows = ? AND cols = ?'
+            ' AND mines = ? AND seconds < ?',
+            (rows, cols, mines, seconds)).fetchone()[0]
+
+    def levels(self):
+        """Every (rows, cols, mines) with at least one score."""
+        return self.db.execute(
+            'SELECT DISTINCT rows, cols, mines FROM scores').fetchall()
+
+    def clear(self):
+        with self.db:
+            self.db.execute('DELETE FROM scores')
+
+    def import_bitio(self, path='bitio'):
+        """
+        Bring in the scores of the old hex-encoded 'bitio' file, one
+        'name seconds' line per standard level, skipping the 999 s
+        placeholders.  The file is renamed once it has been read.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        for (_, rows, cols, mines), line in zip(LEVELS, lines):
+            name, seconds = str(binascii.unhexlify(line), 'utf-8').rsplit(' ', 1)
+            if int(seconds) < 999:
+                self.add(rows, cols, mines, name, int(seconds))
+        os.replace(path, path + '.imported')
@@ -0,0 +1,172 @@
+"""
+A game server for bots.
+
+    python server.py [--host 127.0.0.1] [--port 8642] [--unix PATH]
+
+One asyncio process hosts any number of headless engine.Game sessions
+over TCP on localhost or a Unix socket.  The protocol is one line of
+ASCII per request and one line per response, answered in order, so a
+client may pipeline as many requests as it likes:
+
+    new ROWS COLS MINES [SEED] [TOPOLOGY]  ->  ID P MINES_LEFT
+    ID MOVE [MOVE ...]          ->  ID STATUS MINES_LEFT [R,C,K ...]
+    end ID                      ->  ok ID
+
+A move is 'r', 'f' or 'c' (reveal, flag, chord: the GUI's click, rclick
+and bclick) followed by ROW,COL, e.g. 'r3,4'.  All moves on a line run
+in order and the response lists every cell they changed, once, as
+row,col,appearance.  Appearances are '0' to '8', '9' for the mine that
+was hit, '.' covered, 'F' flag, '*' mine and 'x' wrong flag.  STATUS is
+P (playing), W (won) or L (lost).  TOPOLOGY is one of topology.KINDS
+and defaults to square.  Malformed requests get 'err MESSAGE'; a line
+with a bad move is refused before any of its moves run.  A line longer
+than LINE_LIMIT gets 'err line too long' and the connection is closed.
+Sessions belong to the connection that made them and end with it.
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+
+from engine import Game, PLAYING, WON, LOST
+from topology import KINDS
+
+PORT = 8642
+KEYS = {'blank': '.', 'flag': 'F', 'bomb': '*', 'xbomb': 'x'}
+STATUS = {PLAYING: 'P', WON: 'W', LOST: 'L'}
+ACTIONS = {'r': Game.reveal, 'f': Game.flag, 'c': Game.chord}
+# Largest board a client may ask for.
+MAX_CELLS = 1 << 20
+# Longest request line; a batch of moves is a few bytes per move.
+LINE_LIMIT = 1 << 20
+
+
+class Server:
+    """The sessions of every connection and the request handler."""
+    def __init__(self, max_sessions=100000):
+        self.ids = itertools.count(1)
+        self.max_sessions = max_sessions
+        self.sessions = 0
+        self.moves = 0
+
+    def new(self, games, args):
+        kind = 'square'
+        if args and args[-1] in KINDS:
+            kind = args.pop()
+        if not 3 <= len(args) <= 4:
+            raise ValueError('usage: new ROWS COLS MINES [SEED] [TOPOLOGY]')
+        rows, cols, num_mines = (int(a) for a in args[:3])
+        seed = int(args[3]) if len(args) == 4 else None
+        if not (0 < rows and 0 < cols and rows * cols <= MAX_CELLS):
+            raise ValueError('bad board size')
+        if not 0 <= num_mines < rows * cols:
+            raise ValueError('bad number of mines')
+        if self.sessions >= self.max_sessions:
+            raise ValueError('too many sessions')
+        game = Game(rows, cols, num_mines, seed=seed, topology=kind)
+        session = str(next(self.ids))
+        games[session] = game
+        self.sessions += 1
+        return ' '.join((session, 'P', str(game.mines_left)))
+
+    def move(self, game, session, moves):
+        # Check the whole line first: a bad move must not leave the ones
+        # before it played with their changes unreported.
+        parsed = [self.parse(game, move) for move in moves]
+        changed = {}
+        for action, r, c in parsed:
+            changed.update(dict.fromkeys(action(game, r, c)))
+        self.moves += len(moves)
+        out = [session, STATUS[game.status], str(game.mines_left)]
+        for r, c in changed:
+            key = game.cell(r, c)
+            out.append(''.join((str(r), ',', str(c), ',', KEYS.get(key, key))))
+        return ' '.join(out)
+
+    def parse(self, game, move):
+        """The (action, row, col) of a move such as 'r3,4' on game."""
+        action = ACTIONS.get(move[:1])
+        r, _, c = move[1:].partition(',')
+        try:
+            r, c = int(r), int(c)
+        except ValueError:
+            action = None
+        if action is None or not (0 <= r < game.rows and 0 <= c < game.cols):
+            raise ValueError(''.join(('bad move ', move)))
+        return action, r, c
+
+    def handle(self, games, line):
+        """The response to one request line."""
+        words = line.split()
+        if not words:
+            raise ValueError('empty request')
+        if words[0] == 'new':
+            return self.new(games, words[1:])
+        if words[0] == 'end':
+            if len(words) != 2 or games.pop(words[1], None) is None:
+                raise ValueError('usage: end ID')
+            self.sessions -= 1
+            return ' '.join(('ok', words[1]))
+        game = games.get(words[0])
+        if game is None:
+            raise ValueError(''.join(('no session ', words[0])))
+        return self.move(game, words[0], words[1:])
+
+    async def serve_client(self, reader, writer):
+        games = {}   # this connection's sessions
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than LINE_LIMIT: the rest of the stream can
+                    # not be split into requests any more.
+                    writer.write(b'err line too long\n')
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    response = self.handle(games, line.decode('ascii'))
+                except (ValueError, UnicodeDecodeError) as e:
+                    response = ' '.join(('err', str(e)))
+                writer.write(response.encode('ascii') + b'\n')
+                # Only wait for the socket when the client is not reading.
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= len(games)
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=PORT, unix=None, max_sessions=100000):
+    server = Server(max_sessions)
+    if unix:
+        listener = await asyncio.start_unix_server(server.serve_client, unix,
+                                                   limit=LINE_LIMIT)
+    else:
+        listener = await asyncio.start_server(server.serve_client, host, port,
+                                              limit=LINE_LIMIT)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--max-sessions', type=int, default=100000)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Play many headless games with the solver and collect statistics.
+
+    python simulate.py --level expert -n 100000 --jobs 8 -o expert.csv.gz
+
+Games are split into chunks that a process pool plays in parallel.  Every
+game's seed is derived from the base seed and the game's number, so the
+results do not depend on the number of workers.  One line per game
+(seed, outcome, moves, time) is streamed to the output file, which is
+gzipped when its name ends in .gz.
+"""
+import argparse
+import gzip
+import math
+import multiprocessing
+import sys
+import time
+
+from cli import add_board_arguments, board_size
+from engine import Game, WON
+from minefield import game_seed
+from solver import analyse_game
+
+
+def play(game, first=None, flags=True):
+    """
+    Play a game to the end with the solver: flag the known mines, reveal
+    every safe cell, and when there is none take the safest guess.
+    first is the opening click, the middle of the board by default.
+    Returns the number of moves made.
+    """
+    if first is None:
+        first = (game.rows // 2, game.cols // 2)
+    game.reveal(*first)
+    moves = 1
+    while not game.gameover:
+        analysis = analyse_game(game)
+        if flags:
+            for cell in analysis.mines:
+                game.flag(*cell)
+                moves += 1
+        if analysis.safe:
+            for cell in analysis.safe:
+                game.reveal(*cell)
+                moves += 1
+        else:
+            game.reveal(*analysis.best())
+            moves += 1
+    return moves
+
+
+def play_chunk(args):
+    """Play games start .. start + count - 1.  Runs in a worker process."""
+    rows, cols, num_mines, seed, start, count, flags = args
+    results = []
+    for index in range(start, start + count):
+        s = game_seed(seed, index)
+        t = time.perf_counter()
+        game = Game(rows, cols, num_mines, seed=s)
+        moves = play(game, flags=flags)
+        results.append((s, game.status == WON, moves,
+                        time.perf_counter() - t))
+    return results
+
+
+def simulate(rows, cols, num_mines, n, seed=0, jobs=None, chunk=200,
+             flags=True, out=None):
+    """
+    Play n games on a process pool, writing a line per game to the open
+    text file out if given.  Returns a summary dict.
+    """
+    tasks = [(rows, cols, num_mines, seed, start, min(chunk, n - start), flags)
+             for start in range(0, n, chunk)]
+    wins = 0
+    moves = 0
+    play_time = 0.0
+    t = time.perf_counter()
+    if out is not None:
+        out.write('seed,won,moves,seconds\n')
+    with multiprocessing.Pool(jobs) as pool:
+        for results in pool.imap_unordered(play_chunk, tasks):
+            for s, won, m, seconds in results:
+                wins += won
+                moves += m
+                play_time += seconds
+                if out is not None:
+                    out.write(''.join((str(s), ',', str(int(won)), ',', str(m),
+                                       ',', format(seconds, '.6f'), '\n')))
+    elapsed = time.perf_counter() - t
+    rate = wins / n if n else 0.0
+    return {'games': n,
+            'wins': wins,
+            'win_rate': rate,
+            # 95% normal-approximation interval on the win rate
+            'win_rate_error': (1.96 * math.sqrt(rate * (1 - rate) / n)
+                               if n else 0.0),
+            'mean_moves': moves / n if n else 0.0,
+            'mean_game_seconds': play_time / n if n else 0.0,
+            'elapsed_seconds': elapsed,
+            'games_per_second': n / elapsed if elapsed else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_board_arguments(parser)
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--chunk', type=int, default=200,
+                        help='games handed to a worker at a time')
+    parser.add_argument('--no-flags', action='store_true',
+                        help='never flag, only reveal')
+    parser.add_argument('-o', '--output', help='per-game results file')
+    args = parser.parse_args(argv)
+
+    rows, cols, num_mines = board_size(args)
+
+    out = None
+    if args.output:
+        if args.output.endswith('.gz'):
+            out = gzip.open(args.output, 'wt')
+        else:
+            out = open(args.output, 'w')
+    try:
+        summary = simulate(rows, cols, num_mines, args.games, args.seed,
+                           args.jobs, args.chunk, not args.no_flags, out)
+    finally:
+        if out is not None:
+            out.close()
+
+    print(''.join((str(rows), ' x ', str(cols), ', ', str(num_mines),
+                   ' mines, ', str(summary['games']), ' games')))
+    print('win rate     {:.4f} +/- {:.4f}'.format(summary['win_rate'],
+                                                  summary['win_rate_error']))
+    print('mean moves   {:.1f}'.format(summary['mean_moves']))
+    print('ms per game  {:.2f}'.format(summary['mean_game_seconds'] * 1e3))
+    print('games/sec    {:.1f}'.format(summary['games_per_second']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+"""
+Minesweeper solver.
+
+Works only from what a player can see: the revealed numbers, the flags and
+the total number of mines.  Deduction runs in three stages:
+
+1. single-cell rules (a number with all its mines found makes the rest of
+   its neighbours safe, a number with as many covered neighbours as
+   missing mines makes them all mines), vectorized over the whole board;
+2. subset reasoning between pairs of constraints on the frontier;
+3. exact enumeration of the remaining frontier, split into independent
+   components, with cells that share the same constraints lumped together
+   and the global mine count used to weight every component's solutions.
+
+analyse() returns an Analysis with a mine probability for every cell and
+the moves ranked from safest to riskiest.  Given a cache, it remembers
+the enumeration of every component and only enumerates the components
+that changed since the last call; LiveAnalysis uses that to keep a game
+in play analysed on a background thread.
+"""
+import threading
+from math import comb
+
+import numpy as np
+
+from topology import get_topology
+
+
+class Contradiction(Exception):
+    """The numbers, flags and mine count cannot all be true at once."""
+
+
+class Cancelled(Exception):
+    """The analysis was stopped by its cancel callback."""
+
+
+class Analysis:
+    """
+    The result of analysing a position.
+    probabilities holds the chance of a mine under every cell (NaN for
+    revealed cells, 1 for flags), safe and mines list the covered cells
+    that are certainly safe or certainly mines.
+    """
+    def __init__(self, probabilities, revealed, flagged, exact=True):
+        self.probabilities = probabilities
+        self.exact = exact
+        self.covered = ~revealed & ~flagged
+        self.safe = _cells(self.covered & (probabilities == 0))
+        self.mines = _cells(self.covered & (probabilities == 1))
+
+    def ranked(self, n=None):
+        """The covered, unflagged cells ordered from safest to riskiest."""
+        idx = np.flatnonzero(self.covered)
+        p = self.probabilities.ravel()[idx]
+        order = np.argsort(p, kind='stable')
+        if n is not None:
+            order = order[:n]
+        rows, cols = np.unravel_index(idx[order], self.probabilities.shape)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def best(self):
+        """The safest move, or None when there is nothing left to click."""
+        moves = self.ranked(1)
+        return moves[0] if moves else None
+
+
+def _cells(mask):
+    rows, cols = np.nonzero(mask)
+    return list(zip(rows.tolist(), cols.tolist()))
+
+
+def analyse_game(game, **kwargs):
+    """Analyse an engine.Game as its player sees it."""
+    numbers = game.minefield
+    if numbers is None:
+        numbers = np.zeros((game.rows, game.cols), dtype=np.uint8)
+    return analyse(numbers, game.revealed, game.flagged, game.num_mines,
+                   topology=game.topology, **kwargs)
+
+
+def analyse(numbers, revealed, flagged, num_mines, node_limit=200000,
+            cache=None, cancel=None, topology=None):
+    """
+    Mine probabilities for a position.  numbers is only read where
+    revealed is set.  Flags are taken to be mines; if that contradicts
+    the numbers they are ignored instead.  topology is the board's
+    topology.Topology, square by default.
+
+    cache is a dict to pass to every call on the same game: it ends up
+    holding the enumerated components of the position, so the next call
+    only enumerates components a move changed.  cancel is called every so
+    often during enumeration; once it returns True, Cancelled is raised.
+    """
+    revealed = np.asarray(revealed, dtype=bool)
+    flagged = np.asarray(flagged, dtype=bool) & ~revealed
+    if topology is None:
+        topology = get_topology('square', *revealed.shape)
+    try:
+        p, exact = _probabilities(numbers, revealed, flagged, num_mines,
+                                  node_limit, cache, cancel, topology)
+    except Contradiction:
+        p, exact = _probabilities(numbers, revealed,
+                                  np.zeros_like(flagged), num_mines,
+                                  node_limit, cache, cancel, topology)
+        p[flagged & ~revealed] = 1.0
+    return Analysis(p, revealed, flagged, exact)
+
+
+def _probabilities(numbers, revealed, flagged, num_mines, node_limit,
+                   cache, cancel, topology):
+    mines = flagged.copy()
+    safe = np.zeros_like(revealed)
+    need = np.where(revealed, numbers, 0).astype(np.int16)
+    _deduce(need, revealed, mines, safe, topology.count)
+
+    constraints = _constraints(need, revealed, mines, safe, topology)
+    _reduce(constraints, mines, safe)
+
+    p = np.full(revealed.shape, np.nan)
+    unknown = ~revealed & ~mines & ~safe
+    frontier = np.zeros_like(revealed)
+    cells = set().union(*constraints)
+    if cells:
+        frontier[tuple(np.transpose(list(cells)))] = True
+    outside = int(np.count_nonzero(unknown & ~frontier))
+    left = num_mines - int(np.count_nonzero(mines))
+
+    if cache is None:
+        cache = {}
+    components = []
+    used = {}
+    for part in _components(constraints):
+        key = frozenset(part)
+        if key not in cache:
+            cache[key] = _enumerate(part, node_limit, cancel)
+        used[key] = cache[key]
+        components.append(used[key])
+    # Forget the components the position no longer has.
+    cache.clear()
+    cache.update(used)
+    exact = all(c is not None for c in components)
+    if not exact:
+        _approximate(constraints, p)
+        components = [c for c in components if c is not None]
+
+    # Weight every component's solutions by the number of ways of placing
+    # the remaining mines on the cells no number says anything about.
+    totals = [dict((k, w) for k, (w, _) in c['solutions'].items())
+              for c in components]
+    everything = _convolve_all(totals)
+    z = sum(w * comb(outside, left - k) for k, w in everything.items()
+            if 0 <= left - k <= outside)
+    if z == 0:
+        raise Contradiction('No arrangement of the mines fits the numbers.')
+    for i, c in enumerate(components):
+        others = _convolve_all(totals[:i] + totals[i + 1:])
+        weight = {}
+        for k in c['solutions']:
+            weight[k] = sum(w * comb(outside, left - k - j)
+                            for j, w in others.items()
+                            if 0 <= left - k - j <= outside)
+        for g, group in enumerate(c['groups']):
+            m = sum(weight[k] * mines_in[g]
+                    for k, (_, mines_in) in c['solutions'].items())
+            p[tuple(np.transpose(group))] = m / (z * len(group))
+    if outside:
+        m = sum(w * comb(outside, left - k) * (left - k)
+                for k, w in everything.items() if 0 <= left - k <= outside)
+        p[unknown & ~frontier] = m / (z * outside)
+    p[mines] = 1.0
+    p[safe] = 0.0
+    return p, exact
+
+
+def _deduce(need, revealed, mines, safe, count_neighbors):
+    """
+    Single-cell rules over the whole board at once, repeated until they
+    find nothing new.  mines and safe are updated in place.
+    """
+    while True:
+        unknown = ~revealed & ~mines & ~safe
+        missing = need - count_neighbors(mines)
+        free = count_neighbors(unknown).astype(np.int16)
+        active = revealed & (free > 0)
+        if np.any(revealed & ((missing < 0) | (missing > free))):
+            raise Contradiction('A number has too many or too few mines.')
+        new_safe = unknown & (count_neighbors(active & (missing == 0)) > 0)
+        new_mines = unknown & (count_neighbors(active & (missing == free)) > 0)
+        if np.any(new_safe & new_mines):
+            raise Contradiction('A cell is both safe and a mine.')
+        if not new_safe.any() and not new_mines.any():
+            return
+        safe |= new_safe
+        mines |= new_mines
+
+
+def _constraints(need, revealed, mines, safe, topology):
+    """
+    The frontier constraints left after the single-cell rules, as a dict
+    mapping each frozenset of covered cells to the number of mines in it.
+    """
+    cols = revealed.shape[1]
+    unknown = ~revealed & ~mines & ~safe
+    missing = (need - topology.count(mines)).ravel()
+    active = np.flatnonzero(revealed & (topology.count(unknown) > 0))
+    # One gather for every neighbour of every active number, the padding
+    # landing on the False appended to the end.
+    around = topology.adjacent(active)
+    hit = np.append(unknown.ravel(), False)[around]
+    constraints = {}
+    for i, near, ok in zip(active.tolist(), around.tolist(), hit.tolist()):
+        cells = frozenset(divmod(j, cols) for j, h in zip(near, ok) if h)
+        if constraints.setdefault(cells, int(missing[i])) != missing[i]:
+            raise Contradiction('Two numbers disagree about the same cells.')
+    return constraints
+
+
+def _reduce(constraints, mines, safe):
+    """
+    Subset reasoning: when the cells of one constraint all belong to
+    another, the difference holds the difference of their mines.  Anything
+    this settles goes into mines and safe and out of the constraints.
+    """
+    changed = True
+    while changed:
+        changed = False
+        settled_safe = set()
+        settled_mines = set()
+        for cells, n in constraints.items():
+            if n == 0:
+                settled_safe |= cells
+            elif n == len(cells):
+                settled_mines |= cells
+        if settled_safe & settled_mines:
+            raise Contradiction('A cell is both safe and a mine.')
+        if settled_safe or settled_mines:
+            for cell in settled_safe:
+                safe[cell] = True
+            for cell in settled_mines:
+                mines[cell] = True
+            old = list(constraints.items())
+            constraints.clear()
+            for cells, n in old:
+                n -= len(cells & settled_mines)
+                cells = cells - settled_safe - settled_mines
+                if cells:
+                    if constraints.get(cells, n) != n or n < 0 or n > len(cells):
+                        raise Contradiction('Constraints disagree.')
+                    constraints[cells] = n
+            changed = True
+            continue
+
+        by_cell = {}
+        for cells in constraints:
+            for cell in cells:
+                by_cell.setdefault(cell, []).append(cells)
+        for a in list(constraints):
+            if a not in constraints:
+                continue
+            for b in {b for cell in a for b in by_cell[cell]}:
+                if b is a or b not in constraints or not a < b:
+                    continue
+                rest = b - a
+                n = constraints.pop(b) - constraints[a]
+                if n < 0 or n > len(rest):
+                    raise Contradiction('Constraints disagree.')
+                if constraints.get(rest, n) != n:
+                    raise Contradiction('Constraints disagree.')
+                constraints[rest] = n
+                changed = True
+            if changed:
+                break
+
+
+def _components(constraints):
+    """Split the constraints into groups that share no cells."""
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for cells in constraints:
+        first = next(iter(cells))
+        parent.setdefault(first, first)
+        for cell in cells:
+            parent.setdefault(cell, cell)
+            parent[find(cell)] = find(first)
+    parts = {}
+    for cells, n in constraints.items():
+        parts.setdefault(find(next(iter(cells))), []).append((cells, n))
+    return list(parts.values())
+
+
+def _enumerate(part, node_limit, cancel=None):
+    """
+    Every way of placing mines in one component.  Cells that appear in the
+    same constraints are interchangeable, so they are enumerated as groups
+    by how many mines each group holds.
+    Returns {'groups': [[cell, ...], ...], 'solutions': {mines: (ways,
+    [ways weighted by mines in each group])}}, or None if the search gave
+    up after node_limit steps.  Raises Cancelled once cancel() is true.
+    """
+    membership = {}
+    for i, (cells, _) in enumerate(part):
+        for cell in cells:
+            membership.setdefault(cell, []).append(i)
+    grouped = {}
+    for cell, ids in membership.items():
+        grouped.setdefault(tuple(ids), []).append(cell)
+    keys = list(grouped)
+    groups = [sorted(grouped[k]) for k in keys]
+
+    # Visit groups constraint by constraint so that constraints complete
+    # early and prune the search.
+    order = []
+    seen = set()
+    for i in range(len(part)):
+        for g, k in enumerate(keys):
+            if i in k and g not in seen:
+                seen.add(g)
+                order.append(g)
+    sizes = [len(groups[g]) for g in order]
+    touches = [keys[g] for g in order]
+    need = [n for _, n in part]
+    room = [0] * len(part)
+    for g in order:
+        for i in keys[g]:
+            room[i] += len(groups[g])
+
+    solutions = {}
+    counts = [0] * len(order)
+    steps = [0]
+
+    def place(depth, total, ways):
+        steps[0] += 1
+        if steps[0] > node_limit:
+            return False
+        if cancel is not None and steps[0] & 1023 == 0 and cancel():
+            raise Cancelled()
+        if depth == len(order):
+            w, per_group = solutions.setdefault(total, (0, [0] * len(order)))
+            for j in range(len(order)):
+                per_group[j] += ways * counts[j]
+            solutions[total] = (w + ways, per_group)
+            return True
+        size = sizes[depth]
+        ids = touches[depth]
+        for i in ids:
+            room[i] -= size
+        low = max(max(need[i] - room[i] for i in ids), 0)
+        high = min(min(need[i] for i in ids), size)
+        for m in range(low, high + 1):
+            for i in ids:
+                need[i] -= m
+            counts[depth] = m
+            ok = place(depth + 1, total + m, ways * comb(size, m))
+            for i in ids:
+                need[i] += m
+            if not ok:
+                break
+        else:
+            ok = True
+        for i in ids:
+            room[i] += size
+        return ok
+
+    if not place(0, 0, 1):
+        return None
+    # Put the per-group tallies back in the order of groups.
+    for k, (w, per_group) in solutions.items():
+        tally = [0] * len(groups)
+        for j, g in enumerate(order):
+            tally[g] = per_group[j]
+        solutions[k] = (w, tally)
+    return {'groups': groups, 'solutions': solutions}
+
+
+def _approximate(constraints, p):
+    """
+    Fallback for components too big to enumerate: each cell gets the
+    average density of the constraints it is in.
+    """
+    total = {}
+    for cells, n in constraints.items():
+        for cell in cells:
+            s, k = total.get(cell, (0.0, 0))
+            total[cell] = (s + n / len(cells), k + 1)
+    for cell, (s, k) in total.items():
+        p[cell] = s / k
+
+
+def _convolve_all(distributions):
+    """Distribution of the total mines over several independent components."""
+    result = {0: 1}
+    for d in distributions:
+        step = {}
+        for a, wa in result.items():
+            for b, wb in d.items():
+                step[a + b] = step.get(a + b, 0) + wa * wb
+        result = step
+    return result
+
+
+class LiveAnalysis:
+    """
+    Keeps the analysis of a game in play up to date on a daemon thread.
+    Call .update() with each new position: any analysis still running is
+    cancelled and the new position analysed, reusing the components the
+    move did not touch.  .result is the latest finished Analysis (None
+    if the position was impossible) and .position the number of the
+    .update() it belongs to; it is up to date once .position equals
+    .requested.
+    """
+    def __init__(self, node_limit=200000):
+        self.node_limit = node_limit
+        self.cache = {}   # only used on the thread
+        self.pending = None
+        self.requested = 0
+        self.position = 0
+        self.result = None
+        self.lock = threading.Condition()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def update(self, numbers, revealed, flagged, num_mines):
+        """Analyse a position; the arrays must not change afterwards."""
+        with self.lock:
+            self.requested += 1
+            self.pending = (numbers, revealed, flagged, num_mines)
+            self.lock.notify()
+
+    def clear(self):
+        """Drop the current analysis, e.g. for a new game."""
+        with self.lock:
+            self.requested += 1
+            self.pending = None
+            self.result = None
+            self.position = self.requested
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.pending is None:
+                    self.lock.wait()
+                position = self.pending
+                number = self.requested
+                self.pending = None
+            try:
+                result = analyse(*position, node_limit=self.node_limit,
+                                 cache=self.cache,
+                                 cancel=lambda: self.requested != number)
+            except Cancelled:
+                continue
+            except Contradiction:
+                result = None
+            with self.lock:
+                if number == self.requested:
+                    self.result = result
+                    self.position = number
@@ -0,0 +1,58 @@
+"""
+All of the game's images in one sprite sheet.
+
+assets/sprites.png holds the cell tiles, the counter digits and the smiley
+faces side by side.  load_sprites() reads the sheet once per Tk
+interpreter and slices it into PhotoImages in memory, so restarts and
+every window share the same images.
+
+The sheet is built from the single GIFs in assets/ with
+    python sprites.py
+which needs Pillow; playing the game does not.
+"""
+SHEET = 'assets/sprites.png'
+
+# key: (source file, x, y, width, height) on the sheet
+LAYOUT = {}
+for i, key in enumerate(['0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+                         'flag', 'bomb', 'xbomb', 'blank']):
+    LAYOUT[key] = ('rbomb' if key == '9' else key, 24 * i, 0, 24, 24)
+for i in range(10):
+    LAYOUT['c' + str(i)] = ('c' + str(i), 22 * i, 24, 22, 36)
+for i, (key, name) in enumerate([('smile', 'smile_smile'), ('o', 'smile_o'),
+                                 ('cool', 'smile_cool'),
+                                 ('dead', 'smile_dead')]):
+    LAYOUT[key] = (name, 36 * i, 60, 36, 36)
+
+_images = {}   # Tk interpreter -> {key: PhotoImage}
+
+
+def load_sprites(master):
+    """The game's images as a dict of PhotoImages for master's interpreter."""
+    import tkinter as tk
+    images = _images.get(master.tk)
+    if images is None:
+        sheet = tk.PhotoImage(master=master, file=SHEET)
+        images = {}
+        for key, (_, x, y, w, h) in LAYOUT.items():
+            images[key] = tk.PhotoImage(master=master, width=w, height=h)
+            images[key].tk.call(images[key], 'copy', sheet,
+                                '-from', x, y, x + w, y + h)
+        _images[master.tk] = images
+    return images
+
+
+def build_sheet(path=SHEET):
+    """Paste the single GIFs in assets/ into the sprite sheet."""
+    from PIL import Image
+    width = max(x + w for _, x, _, w, _ in LAYOUT.values())
+    height = max(y + h for _, _, y, _, h in LAYOUT.values())
+    sheet = Image.new('RGB', (width, height))
+    for name, x, y, _, _ in LAYOUT.values():
+        sheet.paste(Image.open(''.join(('assets/', name, '.gif'))).convert('RGB'),
+                    (x, y))
+    sheet.save(path, optimize=True)
+
+
+if __name__ == '__main__':
+    build_sheet()
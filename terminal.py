@@ -0,0 +1,306 @@
+"""
+Minesweeper in a terminal.
+
+    python terminal.py [--level expert] [--size ROWS COLS MINES] [--bot]
+
+A curses front end to engine.Game for playing, or watching the solver
+play with --bot, over SSH.  Arrow keys or hjkl move the cursor, space
+reveals, f flags, c chords and F2 or n starts a new game; the mouse
+works too (left reveals, right flags, middle chords).  q quits.
+
+Boards bigger than the terminal scroll with the cursor.  Only what a
+move changed is redrawn: the changed cells in view are compared with
+what is already on screen, and all the moves read since the last frame
+(a held key, a run of bot moves, a cascade) go out in one flush.
+"""
+import time
+START = time.perf_counter()
+
+import argparse
+import curses
+import importlib
+import sys
+import threading
+
+from cli import add_board_arguments, board_size
+from engine import Game, LOST, WON, PLAYING
+from topology import KINDS
+
+IMPORTED = time.perf_counter()
+# Milliseconds to wait for input when nothing is going on.
+IDLE_MS = 1000
+# How each appearance is drawn, and the colour pair of each number.
+GLYPHS = {'0': ' ', 'blank': '.', 'flag': 'F', 'bomb': '*', '9': '@',
+          'xbomb': 'x'}
+COLOURS = {'1': curses.COLOR_BLUE, '2': curses.COLOR_GREEN,
+           '3': curses.COLOR_RED, '4': curses.COLOR_MAGENTA,
+           '5': curses.COLOR_YELLOW, '6': curses.COLOR_CYAN,
+           '7': curses.COLOR_WHITE, '8': curses.COLOR_WHITE,
+           '9': curses.COLOR_RED, 'flag': curses.COLOR_RED}
+FACES = {PLAYING: ':)', WON: 'B)', LOST: 'X('}
+ACTIONS = {ord(' '): 'reveal', ord('\n'): 'reveal', ord('f'): 'flag',
+           ord('c'): 'chord'}
+MOVES = {curses.KEY_UP: (-1, 0), curses.KEY_DOWN: (1, 0),
+         curses.KEY_LEFT: (0, -1), curses.KEY_RIGHT: (0, 1),
+         ord('k'): (-1, 0), ord('j'): (1, 0), ord('h'): (0, -1),
+         ord('l'): (0, 1)}
+
+
+class Terminal:
+    """
+    The game on a curses screen.  Cells are two columns wide; odd rows of
+    a hex board are shifted right by one column.
+    """
+    def __init__(self, screen, rows, cols, num_mines, seed=None,
+                 topology='square', bot=False, delay=50):
+        self.screen = screen
+        self.rows = rows
+        self.cols = cols
+        self.num_mines = num_mines
+        self.topology = topology
+        self.bot = bot
+        self.delay = delay
+        self.attrs = {}
+        if curses.has_colors():
+            curses.start_color()
+            try:
+                curses.use_default_colors()
+                background = -1
+            except curses.error:
+                background = curses.COLOR_BLACK
+            for i, (key, colour) in enumerate(COLOURS.items(), 1):
+                curses.init_pair(i, colour, background)
+                self.attrs[key] = curses.color_pair(i) | curses.A_BOLD
+        curses.curs_set(1)
+        curses.mousemask(curses.BUTTON1_CLICKED | curses.BUTTON2_CLICKED |
+                         curses.BUTTON3_CLICKED)
+        self.screen.keypad(True)
+        self.game = Game(rows, cols, num_mines, seed=seed, topology=topology)
+        self.cursor = (rows // 2, cols // 2)
+        self.top = self.left = 0
+        self.resize()
+        self.restart()
+
+    def restart(self):
+        self.game.restart()
+        self.started = None
+        self.finished = None
+        self.cursor = (self.rows // 2, self.cols // 2)
+        self.follow()
+        # Only the cells that were uncovered actually get rewritten.
+        self.dirty_view()
+
+    def resize(self):
+        """Fit the view to the terminal and mark all of it for drawing."""
+        height, width = self.screen.getmaxyx()
+        # A status line above the board and a help line below it.
+        self.view_rows = max(min(self.rows, height - 2), 1)
+        self.view_cols = max(min(self.cols, (width - 2) // 2), 1)
+        self.drawn = {}   # screen (y, x) -> what was last put there
+        self.dirty = set()
+        self.screen.erase()
+        self.follow()
+        self.dirty_view()
+
+    def dirty_view(self):
+        self.dirty.update((r, c)
+                          for r in range(self.top, self.top + self.view_rows)
+                          for c in range(self.left,
+                                         self.left + self.view_cols))
+
+    def follow(self):
+        """
+        Scroll so the cursor is in view, by half a screen at a time so
+        that a slow link redraws the board rarely.
+        """
+        r, c = self.cursor
+        top, left = self.top, self.left
+        if not top <= r < top + self.view_rows:
+            top = r - self.view_rows // 2
+        if not left <= c < left + self.view_cols:
+            left = c - self.view_cols // 2
+        top = min(max(top, 0), self.rows - self.view_rows)
+        left = min(max(left, 0), self.cols - self.view_cols)
+        if (top, left) != (self.top, self.left):
+            self.top, self.left = top, left
+            self.dirty_view()
+
+    def position(self, r, c):
+        """The screen (y, x) of a cell, which must be in view."""
+        x = 2 * (c - self.left)
+        if self.topology == 'hex' and r % 2:
+            x += 1
+        return r - self.top + 1, x
+
+    def cell_at(self, y, x):
+        """The cell at a screen position, or None."""
+        r = y - 1 + self.top
+        if self.topology == 'hex' and r % 2:
+            x -= 1
+        c = x // 2 + self.left
+        if 0 <= y - 1 < self.view_rows and 0 <= x // 2 < self.view_cols:
+            return r, c
+        return None
+
+    def play(self, action, r, c):
+        """Make a move and remember what it changed for the next frame."""
+        if self.game.gameover:
+            return
+        changed = getattr(self.game, action)(r, c)
+        if self.started is None and not self.game.first:
+            self.started = time.monotonic()
+        self.dirty.update(changed)
+        if self.game.gameover:
+            self.finished = time.monotonic()
+        if self.game.status == LOST:
+            # The mines can be anywhere in view, not only in changed cells.
+            self.dirty_view()
+
+    def bot_move(self):
+        from solver import analyse_game  # only bots need it
+        if self.game.gameover:
+            # Leave the finished board up for a moment.
+            if time.monotonic() - self.finished > 1:
+                self.restart()
+            return
+        if self.game.first:
+            move = (self.rows // 2, self.cols // 2)
+        else:
+            move = analyse_game(self.game).best()
+        self.cursor = move
+        self.follow()
+        self.play('reveal', *move)
+
+    def handle(self, key):
+        """Act on one key.  Returns False to quit."""
+        if key == ord('q'):
+            return False
+        if key in (curses.KEY_F2, ord('n')):
+            self.restart()
+        elif key == curses.KEY_RESIZE:
+            self.resize()
+        elif key in MOVES:
+            dr, dc = MOVES[key]
+            self.cursor = (min(max(self.cursor[0] + dr, 0), self.rows - 1),
+                           min(max(self.cursor[1] + dc, 0), self.cols - 1))
+            self.follow()
+        elif key in ACTIONS:
+            self.play(ACTIONS[key], *self.cursor)
+        elif key == curses.KEY_MOUSE:
+            try:
+                _, x, y, _, buttons = curses.getmouse()
+            except curses.error:
+                return True
+            cell = self.cell_at(y, x)
+            if cell is None:
+                return True
+            self.cursor = cell
+            if buttons & curses.BUTTON1_CLICKED:
+                self.play('reveal', *cell)
+            elif buttons & curses.BUTTON3_CLICKED:
+                self.play('flag', *cell)
+            elif buttons & curses.BUTTON2_CLICKED:
+                self.play('chord', *cell)
+        return True
+
+    def put(self, y, x, text, attr=0):
+        """Write text unless the screen already shows exactly that."""
+        if self.drawn.get((y, x)) == (text, attr):
+            return
+        self.drawn[(y, x)] = (text, attr)
+        try:
+            self.screen.addstr(y, x, text, attr)
+        except curses.error:
+            pass   # the bottom right corner of the screen
+
+    def flush(self):
+        """Draw everything that changed since the last frame in one go."""
+        bottom = self.top + self.view_rows
+        right = self.left + self.view_cols
+        for r, c in self.dirty:
+            if self.top <= r < bottom and self.left <= c < right:
+                key = self.game.cell(r, c)
+                self.put(*self.position(r, c), GLYPHS.get(key, key),
+                         self.attrs.get(key, 0))
+        self.dirty.clear()
+        game = self.game
+        seconds = 0 if self.started is None else \
+            int((self.finished or time.monotonic()) - self.started)
+        message = {PLAYING: '', WON: 'You won!', LOST: 'Boom.'}[game.status]
+        self.put(0, 0, ''.join((
+            'Mines ', format(game.mines_left, '3d'), '  ',
+            FACES[game.status], '  Time ', format(min(seconds, 999), '3d'),
+            '  ', str(self.rows), 'x', str(self.cols), ' ', self.topology,
+            '  ', message)).ljust(60))
+        help_line = 'bot playing, q quits' if self.bot else \
+            'arrows/hjkl move  space reveal  f flag  c chord  F2/n new  q quit'
+        self.put(self.view_rows + 1, 0, help_line)
+        y, x = self.position(*self.cursor)
+        self.screen.move(y, x)
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def wait_ms(self):
+        if self.bot:
+            return self.delay
+        # Tick the clock while a game is on.
+        return IDLE_MS if self.started is not None and \
+            not self.game.gameover else -1
+
+    def run(self):
+        self.flush()
+        while True:
+            self.screen.timeout(self.wait_ms())
+            key = self.screen.getch()
+            # Take every key already waiting before drawing again.
+            self.screen.timeout(0)
+            while key != -1:
+                if not self.handle(key):
+                    return
+                key = self.screen.getch()
+            if self.bot:
+                self.bot_move()
+            self.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_board_arguments(parser)
+    parser.add_argument('--topology', choices=KINDS, default='square')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--bot', action='store_true',
+                        help='watch the solver play')
+    parser.add_argument('--delay', type=int, default=50,
+                        help='milliseconds between bot moves')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print import and first-frame times on exit')
+    args = parser.parse_args(argv)
+    rows, cols, num_mines = board_size(args)
+
+    shown = []
+
+    def play(screen):
+        app = Terminal(screen, rows, cols, num_mines, args.seed,
+                       args.topology, args.bot, args.delay)
+        app.flush()
+        shown.append(time.perf_counter())
+        # SciPy is only needed for the first board; load it while the
+        # player looks at the empty one.
+        threading.Thread(target=importlib.import_module,
+                         args=('scipy.ndimage',), daemon=True).start()
+        app.run()
+
+    try:
+        curses.wrapper(play)
+    except KeyboardInterrupt:
+        pass
+    if args.startup_time and shown:
+        print(''.join(('imports:     ',
+                       format((IMPORTED - START) * 1e3, '.1f'), ' ms')))
+        print(''.join(('first frame: ',
+                       format((shown[0] - START) * 1e3, '.1f'), ' ms')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from batch import ACTIONS, STATUSES, BatchGame, random_moves
+from engine import Game
+from minefield import MINE
+from replay import CHORD, FLAG, REVEAL
+
+
+def moves_for(batch, rng):
+    """A move per game that plays deep: mostly safe reveals and chords."""
+    k, rows, cols = batch.minefields.shape
+    moves = np.zeros((3, k), dtype=np.int64)
+    for i in range(k):
+        if not batch.started[i]:
+            moves[:, i] = REVEAL, rng.integers(rows), rng.integers(cols)
+            continue
+        minefield = batch.minefields[i]
+        revealed = batch.revealed[i]
+        flagged = batch.flagged[i]
+        u = rng.random()
+        if u < 0.4:
+            action, choice = REVEAL, ~revealed & (minefield != MINE)
+        elif u < 0.55:
+            action, choice = FLAG, ~revealed & ~flagged
+        elif u < 0.6:
+            action, choice = FLAG, flagged
+        else:
+            action, choice = CHORD, revealed & (minefield < MINE)
+        cells = np.argwhere(choice)
+        if not len(cells):
+            cells = np.argwhere(~revealed)
+        moves[:, i] = (action,) + tuple(cells[rng.integers(len(cells))])
+    return moves
+
+
+@pytest.mark.parametrize('kind', ['square', 'hex', 'knight'])
+def test_matches_engine(kind):
+    rows, cols, mines, k = 16, 30, 60, 60
+    batch = BatchGame(k, rows, cols, mines, seed=1, topology=kind,
+                      refill=False)
+    games = [Game(rows, cols, mines, topology=kind) for _ in range(k)]
+    rng = np.random.default_rng(1)
+    skip = set()
+    for _ in range(80):
+        actions, rs, cs = moves_for(batch, rng)
+        batch.step(actions, rs, cs)
+        for i, game in enumerate(games):
+            if i in skip:
+                continue
+            if game.first and batch.started[i]:
+                game.load(batch.minefields[i].copy())
+            getattr(game, ACTIONS[actions[i]])(int(rs[i]), int(cs[i]))
+            status = STATUSES[batch.status[i]]
+            if status != 'playing' and actions[i] == CHORD:
+                # A chord into a mine is where the two are allowed to differ.
+                skip.add(i)
+                continue
+            assert game.status == status
+            assert (np.asarray(game.revealed) == batch.revealed[i]).all()
+            assert (np.asarray(game.flagged) == batch.flagged[i]).all()
+            assert game.num_revealed == batch.num_revealed[i]
+            if status != 'playing':
+                skip.add(i)
+
+
+def test_refill_restarts_finished_games():
+    batch = BatchGame(500, 9, 9, 10, seed=1)
+    moves = random_moves(30, 500, 9, 9, seed=1)
+    for actions, rs, cs in zip(*moves):
+        finished = batch.step(actions, rs, cs)
+        assert not batch.started[finished].any()
+        assert not batch.revealed[finished].any()
+    assert batch.lost > 0
+    assert batch.moves == 30 * 500
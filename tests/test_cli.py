@@ -0,0 +1,12 @@
+import argparse
+
+from cli import add_board_arguments, board_size
+
+
+def test_board_arguments():
+    parser = argparse.ArgumentParser()
+    add_board_arguments(parser, 'expert')
+    assert board_size(parser.parse_args([])) == (16, 30, 99)
+    assert board_size(parser.parse_args(['--level', 'beginner'])) == (9, 9, 10)
+    assert board_size(parser.parse_args(['--level', 'beginner', '--size',
+                                         '5', '6', '7'])) == (5, 6, 7)
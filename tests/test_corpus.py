@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from corpus import Corpus, build, build_columns
+from metrics import board_metrics
+from minefield import MINE, generate_minefields
+
+
+def test_build_and_read_back(tmp_path):
+    corpus = build(str(tmp_path / 'c'), 9, 9, 10, 250, seed=3, batch=100,
+                   shard_size=64)
+    assert len(corpus) == 250
+    again = Corpus(str(tmp_path / 'c'))
+    again.verify()
+    boards = generate_minefields(100, 9, 9, 10,
+                                 seed=again.column('seed')[100])
+    assert (again.minefields[100:200] == boards).all()
+    assert (again.column('3bv')[100:200] == board_metrics(boards)['3bv']).all()
+
+
+def test_big_boards_get_wide_columns(tmp_path):
+    assert dict(build_columns(16, 30))['3bv'] == '<u2'
+    assert dict(build_columns(1000, 1000))['3bv'] == '<u4'
+    boards = generate_minefields(1, 600, 600, 72000, seed=1)
+    bbbv = board_metrics(boards)['3bv']
+    assert bbbv[0] > 65535
+    corpus = Corpus.create(str(tmp_path / 'c'), 600, 600, 72000)
+    corpus.append(boards, seed=1, slot=0, **{'3bv': bbbv})
+    assert (corpus.column('3bv')[:] == bbbv).all()
+
+
+def test_append_refuses_values_that_do_not_fit(tmp_path):
+    corpus = Corpus.create(str(tmp_path / 'c'), 9, 9, 10)
+    boards = generate_minefields(2, 9, 9, 10, seed=1)
+    with pytest.raises(ValueError):
+        corpus.append(boards, **{'3bv': [1, 70000]})
+    with pytest.raises(ValueError):
+        corpus.append(boards, slot=-1)
+    with pytest.raises(ValueError):
+        corpus.append(boards, nonsense=1)
+    assert len(corpus) == 0
+
+
+def test_append_takes_only_masks_and_minefields(tmp_path):
+    corpus = Corpus.create(str(tmp_path / 'c'), 9, 9, 10)
+    boards = generate_minefields(3, 9, 9, 10, seed=1)
+    mines = boards == MINE
+    for bad in [mines.astype(np.uint8), mines.astype(np.int64), boards[0],
+                generate_minefields(3, 9, 9, 11, seed=1)]:
+        with pytest.raises(ValueError):
+            corpus.append(bad)
+    corpus.append(boards)
+    corpus.append(mines)
+    assert (corpus.minefields[:] == np.concatenate([boards, boards])).all()
+    with pytest.raises(ValueError):
+        corpus.column('mines')
@@ -0,0 +1,54 @@
+import numpy as np
+
+from endless import CHUNK, EndlessGame
+from engine import PLAYING
+from minefield import MINE
+
+
+def test_first_click_anywhere_is_safe():
+    rng = np.random.default_rng(1)
+    for seed in range(300):
+        game = EndlessGame(seed=seed, density=0.3, size=CHUNK * 8)
+        r, c = (int(x) for x in rng.integers(CHUNK * 8, size=2))
+        assert game.reveal(r, c)
+        assert game.status == PLAYING
+        assert game.cell(r, c) == '0'
+
+
+def test_same_seed_same_world():
+    a = EndlessGame(seed=5)
+    b = EndlessGame(seed=5)
+    r, c = a.start
+    assert a.reveal(r, c) == b.reveal(r, c)
+    assert [a.value(r + 40, c + x) for x in range(-40, 40)] == \
+        [b.value(r + 40, c + x) for x in range(-40, 40)]
+
+
+def test_reveal_stops_at_flags():
+    size = CHUNK * 4
+    game = EndlessGame(seed=2, density=0.13, size=size)
+    game.reveal(*game.start)
+    minefield = np.array([[game.value(r, c) for c in range(size)]
+                          for r in range(size)])
+    revealed = np.array([[game.is_revealed(r, c) for c in range(size)]
+                         for r in range(size)])
+    flagged = np.zeros((size, size), dtype=bool)
+    rng = np.random.default_rng(2)
+    covered = np.argwhere(~revealed)
+    for r, c in covered[rng.random(len(covered)) < 0.1]:
+        game.flag(int(r), int(c))
+        flagged[r, c] = True
+    safe = np.argwhere(~revealed & ~flagged & (minefield != MINE))
+    for r, c in safe[rng.permutation(len(safe))[:200]]:
+        game.reveal(int(r), int(c))
+        stack = [(r, c)]
+        while stack:
+            x, y = stack.pop()
+            if revealed[x, y] or flagged[x, y]:
+                continue
+            revealed[x, y] = True
+            if minefield[x, y] == 0:
+                stack += [(i, j) for i, j in game.neighbors(x, y)]
+    assert game.status == PLAYING
+    assert (np.array([[game.is_revealed(r, c) for c in range(size)]
+                      for r in range(size)]) == revealed).all()
@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+
+from engine import Game, LOST, PLAYING, WON
+from minefield import MINE, generate_minefield
+from topology import KINDS
+
+
+def click(minefield, revealed, flagged, r, c):
+    """The original recursive click: the cascade stops at flags."""
+    rows, cols = minefield.shape
+    stack = [(r, c)]
+    while stack:
+        r, c = stack.pop()
+        if revealed[r, c] or flagged[r, c]:
+            continue
+        revealed[r, c] = True
+        if minefield[r, c] == 0:
+            stack += [(x, y) for x in range(r - 1, r + 2)
+                      for y in range(c - 1, c + 2)
+                      if 0 <= x < rows and 0 <= y < cols]
+
+
+def started(rows=16, cols=30, num_mines=99, seed=1, r=8, c=15):
+    game = Game(rows, cols, num_mines, seed=seed)
+    game.load(generate_minefield(rows, cols, num_mines, r, c, seed=seed))
+    return game
+
+
+def grid(bits):
+    """A copy of revealed or flagged as a bool array."""
+    return np.array(bits, dtype=bool)
+
+
+def test_first_click_is_safe():
+    for kind in KINDS:
+        for seed in range(50):
+            game = Game(9, 9, 10, seed=seed, topology=kind)
+            game.reveal(seed % 9, seed // 9 % 9)
+            assert game.status == PLAYING
+            assert all(game.minefield[x, y] != MINE
+                       for x, y in game.neighbors(seed % 9, seed // 9 % 9))
+
+
+def test_reveal_matches_the_recursive_click():
+    rng = np.random.default_rng(1)
+    for seed in range(30):
+        game = started(seed=seed)
+        revealed = np.zeros((16, 30), dtype=bool)
+        flagged = np.zeros((16, 30), dtype=bool)
+        safe = np.argwhere(game.minefield != MINE)
+        # Flag some cells, zeros included, then click everything else.
+        for r, c in safe[rng.random(len(safe)) < 0.1]:
+            game.flag(int(r), int(c))
+            flagged[r, c] = True
+        for r, c in safe[rng.permutation(len(safe))]:
+            before = grid(game.revealed)
+            changed = game.reveal(int(r), int(c))
+            click(game.minefield, revealed, flagged, r, c)
+            assert (grid(game.revealed) == revealed).all()
+            assert set(changed) == {(int(x), int(y)) for x, y in
+                                    np.argwhere(revealed & ~before)}
+            assert game.num_revealed == revealed.sum()
+        assert game.status == (WON if not flagged.any() else PLAYING)
+
+
+def test_flagged_zero_stops_the_cascade():
+    # One mine in the corner: every other cell is in one opening.
+    minefield = np.zeros((5, 9), dtype=np.uint8)
+    minefield[0, 0] = MINE
+    minefield[:2, :2][minefield[:2, :2] == 0] = 1
+    # A wall of flags on column 4 cuts it in two.
+    game = Game(5, 9, 1)
+    game.load(minefield)
+    for r in range(5):
+        game.flag(r, 4)
+    game.reveal(2, 7)
+    revealed = grid(game.revealed)
+    assert revealed[:, 5:].all()
+    assert not revealed[:, :4].any()
+    # Taking a flag away and clicking there opens the rest.
+    game.flag(2, 4)
+    game.reveal(2, 4)
+    revealed = grid(game.revealed)
+    assert revealed[:, :4].sum() == 5 * 4 - 1
+    assert not revealed[0, 0]
+    assert game.status == PLAYING
+
+
+def test_lose_and_win():
+    game = started()
+    r, c = np.argwhere(game.minefield == MINE)[0]
+    changed = game.reveal(int(r), int(c))
+    assert game.status == LOST and game.cell(r, c) == '9'
+    assert (int(r), int(c)) in changed
+    assert game.reveal(8, 15) == []
+
+    game = started()
+    for r, c in np.argwhere(game.minefield != MINE):
+        game.reveal(int(r), int(c))
+    assert game.status == WON
+
+
+def test_flags_and_counts():
+    game = Game(9, 9, 10, seed=1)
+    assert game.flag(0, 0) == []   # no board yet
+    game.reveal(4, 4)
+    covered = [(r, c) for r in range(9) for c in range(9)
+               if not game.revealed[r, c]]
+    r, c = covered[0]
+    assert game.flag(r, c) == [(r, c)]
+    assert game.cell(r, c) == 'flag' and game.mines_left == 9
+    assert game.reveal(r, c) == []
+    assert game.flag(r, c) == [(r, c)]
+    assert game.cell(r, c) == 'blank' and game.mines_left == 10
+    assert game.flag(4, 4) == []
+
+
+def test_chord():
+    game = started()
+    number = next((int(r), int(c)) for r, c in
+                  np.argwhere((game.minefield > 0) & (game.minefield < MINE)))
+    game.reveal(*number)
+    around = game.neighbors(*number)
+    mines = [cell for cell in around if game.minefield[cell] == MINE]
+    # Too few flags: nothing happens.
+    for cell in mines[1:]:
+        game.flag(*cell)
+    assert game.chord(*number) == []
+    game.flag(*mines[0])
+    changed = game.chord(*number)
+    for cell in around:
+        if cell not in mines:
+            assert game.revealed[cell] and cell in changed
+    assert game.status in (PLAYING, WON)
+
+    # A wrong flag makes the chord hit the mine it left out.
+    game = started()
+    game.reveal(*number)
+    safe = [cell for cell in around if cell not in mines]
+    if safe and len(mines) > 0:
+        for cell in mines[1:] + safe[:1]:
+            game.flag(*cell)
+        game.chord(*number)
+        assert game.status == LOST
+        assert game.cell(*safe[0]) == 'xbomb'
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_rollback_restores_every_state(kind):
+    game = Game(16, 30, 99, seed=2, topology=kind)
+    rng = np.random.default_rng(2)
+    states = []
+    marks = []
+    game.reveal(8, 15)
+    for _ in range(60):
+        marks.append(game.snapshot())
+        states.append((grid(game.revealed), grid(game.flagged),
+                       game.num_revealed, game.num_flagged, game.status,
+                       game.neighbor_flags.copy()))
+        r, c = int(rng.integers(16)), int(rng.integers(30))
+        action = rng.choice(['reveal', 'flag', 'flag', 'chord'])
+        getattr(game, action)(r, c)
+        if game.gameover:
+            break
+    for mark, state in zip(reversed(marks), reversed(states)):
+        changed = game.rollback(mark)
+        revealed, flagged, num_revealed, num_flagged, status, near = state
+        assert (grid(game.revealed) == revealed).all()
+        assert (grid(game.flagged) == flagged).all()
+        assert (game.num_revealed, game.num_flagged, game.status) == \
+            (num_revealed, num_flagged, status)
+        assert (game.neighbor_flags == near).all()
+        assert isinstance(changed, list)
+    # Back before the first click: the next click makes a board again.
+    game.rollback(0)
+    assert game.first
+
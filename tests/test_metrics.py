@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+import metrics
+from metrics import board_metrics
+from minefield import MINE, dilate, generate_minefields, mines_to_minefield
+
+
+def reference(minefield):
+    """The metrics of one board, labelled on its own."""
+    zeros = minefield == 0
+    lone = (minefield != MINE) & ~dilate(zeros)
+    eight = np.ones((3, 3), dtype=bool)
+    openings = ndimage.label(zeros, structure=eight)[1]
+    return {'openings': openings,
+            '3bv': openings + int(np.count_nonzero(lone)),
+            'islands': ndimage.label(lone, structure=eight)[1]}
+
+
+def check(boards):
+    result = board_metrics(boards)
+    for i, board in enumerate(boards):
+        assert {k: int(v[i]) for k, v in result.items()} == reference(board)
+
+
+@pytest.mark.parametrize('size', [(9, 9, 10), (16, 30, 99), (20, 20, 300),
+                                  (5, 5, 24), (12, 40, 100), (8, 62, 150)])
+def test_packed_boards_match_labelling(size):
+    boards = generate_minefields(metrics.FEW, *size, seed=7)
+    check(boards)
+
+
+def test_few_and_wide_boards_are_labelled():
+    check(generate_minefields(10, 16, 30, 99, seed=1))
+    check(generate_minefields(metrics.FEW, 6, 70, 80, seed=1))
+
+
+def test_holes_inside_regions():
+    # A ring of mines around a mine: one opening outside it and one
+    # island of numbers inside it, each with a hole.
+    mines = np.zeros((13, 13), dtype=bool)
+    mines[3:10, 3:10] = True
+    mines[4:9, 4:9] = False
+    mines[6, 6] = True
+    board = mines_to_minefield(mines)
+    assert board_metrics(board) == {'openings': 1, '3bv': 25, 'islands': 1}
+    result = board_metrics(np.repeat(board[None], metrics.FEW, axis=0))
+    assert (result['openings'] == 1).all() and (result['islands'] == 1).all()
+
+
+def test_popcount_without_bitwise_count(monkeypatch):
+    monkeypatch.delattr(np, 'bitwise_count', raising=False)
+    check(generate_minefields(metrics.FEW, 16, 30, 99, seed=2))
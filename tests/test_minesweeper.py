@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+
+tk = pytest.importorskip('tkinter')
+import minesweeper
+import scores
+from engine import Game
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """A Minesweeper window whose main loop returns straight away."""
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        pytest.skip('no display')
+    monkeypatch.chdir(ROOT)   # for the sprite sheet
+    monkeypatch.setattr(tk.Misc, 'mainloop', lambda self, n=0: None)
+    store = scores.ScoreStore
+    monkeypatch.setattr(scores, 'ScoreStore',
+                        lambda path: store(str(tmp_path / path)))
+    app = minesweeper.Minesweeper()
+    yield app
+    app.root.destroy()
+
+
+def test_import_leaves_the_extras_for_later():
+    lazy = ['solver', 'noguess', 'pregen', 'scores', 'sqlite3', 'endless',
+            'metrics', 'instrument', 'replay', 'scipy']
+    code = ''.join(('import sys, minesweeper; print(*[name for name in ',
+                    repr(lazy), ' if name in sys.modules])'))
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    assert out.split() == []
+
+
+def wait_for_analysis(app, timeout=10):
+    end = time.monotonic() + timeout
+    while app.analysis is None or app.analysis_job is not None:
+        assert time.monotonic() < end, 'no analysis'
+        app.root.update()
+        time.sleep(0.01)
+
+
+def test_heat_skips_cells_without_a_probability():
+    app = minesweeper.Minesweeper.__new__(minesweeper.Minesweeper)
+    app.game = Game(9, 9, 10, seed=1)
+    app.game.reveal(4, 4)
+    covered = [(r, c) for r in range(9) for c in range(9)
+               if not app.game.revealed[r, c]]
+    probabilities = np.full((9, 9), 0.25)
+    probabilities[covered[0]] = np.nan
+    app.analysis = types.SimpleNamespace(probabilities=probabilities)
+    assert app.heat(*covered[0]) is None
+    assert app.heat(*covered[-1]) == minesweeper.HEAT[3]
+
+
+def test_undo_reveal_with_probabilities_on(app):
+    app.practice.set(True)
+    app.restart()
+    app.heatmap.set(True)
+    app.click(4, 4)
+    wait_for_analysis(app)
+    game = app.game
+    r, c = next((r, c) for r in range(game.rows) for c in range(game.cols)
+                if not game.revealed[r, c] and game.minefield[r, c] != 9)
+    app.click(r, c)
+    wait_for_analysis(app)
+    moves = app.game.num_moves
+    app.undo()
+    assert app.game.num_moves == moves - 1
+    assert not app.game.revealed[r, c]
+    assert not app.dead and not app.gameover
+    wait_for_analysis(app)
+    assert np.isfinite(app.analysis.probabilities[r, c])
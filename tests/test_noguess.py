@@ -0,0 +1,30 @@
+import threading
+
+import noguess
+from noguess import BoardPool, is_solvable
+
+
+def test_pool_board_is_made_in_the_background(monkeypatch):
+    pool = BoardPool(seed=1)
+    pool.select(9, 9, 10)
+    made = []
+    generate = noguess.generate_noguess
+
+    def record(*args, **kwargs):
+        made.append(threading.current_thread())
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(noguess, 'generate_noguess', record)
+    minefield = pool.minefield(9, 9, 10, 7, 2)
+    pool.stop()
+    assert is_solvable(minefield, 7, 2)
+    assert threading.current_thread() not in made
+
+
+def test_select_drops_other_sizes():
+    pool = BoardPool(seed=1)
+    pool.select(9, 9, 10)
+    pool.select(8, 8, 10)
+    pool.stop()
+    assert {key[:3] for key in pool.boards} == {(8, 8, 10)}
+    assert not pool.ready(9, 9, 10, 0, 0)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from minefield import MINE
+from pregen import BoardMaker
+from topology import KINDS
+
+
+def partition(openings):
+    labels, cells, starts = openings
+    groups = set()
+    for k in np.unique(labels[labels > 0]):
+        group = cells[starts[k - 1]:starts[k]]
+        assert (labels.ravel()[group] == k).all()
+        groups.add(frozenset(group.tolist()))
+    return groups
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_patched_openings_match_a_fresh_labelling(kind):
+    rng = np.random.default_rng(3)
+    for seed in range(20):
+        maker = BoardMaker(20, 24, 60, seed=seed, topology=kind)
+        maker.done.wait()
+        r, c = (int(x) for x in rng.integers(20, size=2))
+        board, openings = maker.minefield(20, 24, 60, r, c)
+        topology = maker.topology
+        around = [r * 24 + c] + topology.neighbor_list(r * 24 + c)
+        assert (board.ravel()[around] != MINE).all()
+        assert (board == MINE).sum() == 60
+        assert (board == topology.minefield(board == MINE)).all()
+        assert partition(openings) == partition(topology.openings(board))
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from engine import Game
+from minefield import MINE
+from replay import CHORD, FLAG, REVEAL, Recorder, Replay
+
+
+def record(seed=1, interval=4, flag_first=True):
+    """
+    Play a recorded expert game with a few moves of each kind, and return
+    the replay bytes and the revealed/flagged state after every move.
+    """
+    recorder = Recorder(Game(16, 30, 99, seed=seed), interval=interval)
+    rng = np.random.default_rng(seed)
+    states = [(np.asarray(recorder.revealed), np.asarray(recorder.flagged))]
+
+    def move(action, r, c):
+        getattr(recorder, action)(r, c)
+        states.append((np.asarray(recorder.revealed),
+                       np.asarray(recorder.flagged)))
+
+    if flag_first:
+        # Right clicks before the board exists are recorded but do nothing.
+        move('flag', 0, 0)
+        move('chord', 1, 1)
+    move('reveal', 8, 15)
+    minefield = recorder.minefield
+    for _ in range(40):
+        if recorder.gameover:
+            break
+        r, c = rng.integers(16), rng.integers(30)
+        if recorder.revealed[r, c]:
+            move('chord', r, c)
+        elif minefield[r, c] == MINE:
+            move('flag', r, c)
+        else:
+            move('reveal', r, c)
+    return recorder.to_bytes(), states, recorder
+
+
+@pytest.mark.parametrize('flag_first', [False, True])
+def test_round_trip(flag_first):
+    data, states, recorder = record(flag_first=flag_first)
+    replay = Replay(data)
+    assert replay.num_moves == len(states) - 1
+    assert replay.checkpoints
+    game = replay.validate()
+    assert game.status == recorder.status
+    assert (game.minefield == recorder.minefield).all()
+    actions = [action for _, action, _, _ in replay.moves]
+    assert {REVEAL, FLAG, CHORD} <= set(actions)
+
+
+@pytest.mark.parametrize('flag_first', [False, True])
+def test_seek_from_fresh_replay(flag_first):
+    data, states, recorder = record(flag_first=flag_first)
+    for i, (revealed, flagged) in enumerate(states):
+        # A fresh replay each time, so seeks past a checkpoint have to
+        # rebuild the board first.
+        game = Replay(data).game_at(i)
+        assert (np.asarray(game.revealed) == revealed).all(), i
+        assert (np.asarray(game.flagged) == flagged).all(), i
+        if i > int(flag_first) * 2:
+            assert (game.minefield == recorder.minefield).all(), i
+
+
+def test_play_yields_the_changes():
+    data, states, _ = record()
+    seen = np.zeros((16, 30), dtype=bool)
+    for _, _, _, _, changed in Replay(data).play():
+        for cell in changed:
+            seen[cell] = True
+    revealed, flagged = states[-1]
+    assert (seen >= (revealed | flagged)).all()
+
+
+def test_corrupt_header():
+    data, _, _ = record()
+    with pytest.raises(ValueError):
+        Replay(b'XXXX' + data[4:])
+    with pytest.raises(ValueError):
+        Replay(data[:4] + bytes([99]) + data[5:])
+
+
+def test_clicks_count_only_moves_that_uncover():
+    _, states, recorder = record()
+    uncovered = sum((after[0] != before[0]).any()
+                    for before, after in zip(states, states[1:]))
+    assert recorder.num_clicks == uncovered < recorder.num_moves
+    recorder.reveal(*np.argwhere(recorder.revealed)[0])
+    assert recorder.num_clicks == uncovered
+
+
+def test_truncated_replay():
+    data, _, _ = record()
+    for n in range(len(data)):
+        with pytest.raises(ValueError):
+            Replay(data[:n]).validate()
+
+
+def test_move_off_the_board():
+    recorder = Recorder(Game(9, 9, 10, seed=1))
+    recorder.reveal(4, 4)
+    recorder.record(REVEAL, 9, 0)
+    with pytest.raises(ValueError, match='off the board'):
+        Replay(recorder.to_bytes()).validate()
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from server import Server
+
+
+def test_moves_and_changes():
+    server = Server()
+    games = {}
+    session, status, mines = server.handle(games, 'new 9 9 10 1').split()
+    assert (status, mines) == ('P', '10')
+    words = server.handle(games, ' '.join((session, 'r4,4'))).split()
+    assert words[0] == session and words[1] in 'PW'
+    assert '4,4,' + games[session].cell(4, 4) in words[3:]
+
+
+def test_bad_move_leaves_the_game_alone():
+    server = Server()
+    games = {}
+    session = server.handle(games, 'new 1 1 0').split()[0]
+    for line in ['r0,0 f1,1 c0,0', 'r0,0 x0,0', 'r0,0 r0', 'r0,0 ra,b']:
+        with pytest.raises(ValueError):
+            server.handle(games, ' '.join((session, line)))
+        assert games[session].first
+    assert server.moves == 0
+    words = server.handle(games, session + ' r0,0').split()
+    assert words[1] == 'W' and words[3] == '0,0,0'
+
+
+def test_overlong_line_closes_the_connection():
+    async def talk():
+        listener = await asyncio.start_server(Server().serve_client,
+                                              '127.0.0.1', 0, limit=64)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'new 9 9 10\n' + b'x' * 200 + b'\n')
+            await writer.drain()
+            lines = [line async for line in reader]
+            writer.close()
+            return lines
+
+    lines = asyncio.run(talk())
+    assert lines[0].split()[1:] == [b'P', b'10']
+    assert lines[1:] == [b'err line too long\n']
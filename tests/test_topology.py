@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from topology import KINDS, Topology
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_tables_match_adjacent(kind):
+    topology = Topology(kind, 7, 11)
+    table = topology.adjacent(np.arange(topology.size))
+    for i in range(topology.size):
+        expected = sorted(table[i][table[i] < topology.size].tolist())
+        assert sorted(topology.neighbor_list(i)) == expected
+    cells = np.array([0, 12, 40, topology.size - 1])
+    near = set(cells.tolist())
+    for i in cells.tolist():
+        near.update(topology.neighbor_list(i))
+    assert topology.around(cells).tolist() == sorted(near)
+    assert topology.tables() is topology.tables()
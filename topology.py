@@ -0,0 +1,250 @@
+"""
+Board topologies: which cells neighbour which.
+
+Cells are numbered row-major, cell = r * cols + c.  A Topology describes
+one board shape and is shared by every game of that shape:
+
+    adjacent(cells)   the neighbours of each of the given cells as rows of
+                      a fixed width, padded with the sentinel n (one past
+                      the last cell), so anything indexed with them needs
+                      one spare element on the end and no bounds checks
+    indptr, indices   the neighbours of every cell in CSR form: those of
+                      cell i are indices[indptr[i]:indptr[i + 1]], which
+                      neighbor_list(i), cell_neighbors(i) and around()
+                      slice and gather without any bounds checks
+    table             adjacent() of every cell, an (n, width) array, for
+                      gathering from every cell at once
+
+The tables are built once per topology, when first used, and shared by
+every game of that shape; get_topology() caches the topologies.  Square
+boards only build the CSR tables: their whole-board counts, dilations
+and labels use padded slices and scipy.ndimage instead.
+
+Kinds:
+    square  the usual eight neighbours
+    torus   eight neighbours, wrapping round the edges
+    hex     six neighbours; odd rows sit half a cell to the right
+    knight  the cells a chess knight's move away
+"""
+import functools
+
+import numpy as np
+
+from minefield import MINE, count_neighbors, dilate
+
+KINDS = ['square', 'torus', 'hex', 'knight']
+KING = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+        if dr != 0 or dc != 0]
+KNIGHT = [(dr, dc) for dr in (-2, -1, 1, 2) for dc in (-2, -1, 1, 2)
+          if abs(dr) != abs(dc)]
+# Offsets on even rows and on odd rows.
+HEX = ([(-1, -1), (-1, 0), (0, -1), (0, 1), (1, -1), (1, 0)],
+       [(-1, 0), (-1, 1), (0, -1), (0, 1), (1, 0), (1, 1)])
+# Neighbours worked out per step while building the CSR tables.
+CHUNK = 1 << 20
+
+
+@functools.lru_cache(maxsize=32)
+def get_topology(kind, rows, cols):
+    """The shared Topology of a kind and board shape."""
+    return Topology(kind, rows, cols)
+
+
+class Topology:
+    """
+    The neighbour tables of a rows x cols board of one kind.  Use
+    get_topology() rather than making these directly.
+    """
+    def __init__(self, kind, rows, cols):
+        if kind not in KINDS:
+            raise ValueError(''.join(('Unknown topology ', repr(kind), '.')))
+        self.kind = kind
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        offsets = HEX[0] if kind == 'hex' else \
+            KNIGHT if kind == 'knight' else KING
+        self.dr = np.array([dr for dr, _ in offsets])
+        self.dc = np.array([dc for _, dc in offsets])
+        self.dc_odd = np.array([dc for _, dc in HEX[1]])
+        # Cells this far from the edges have all their neighbours at steps.
+        self.margin = max(abs(dr) for dr, _ in offsets)
+        self.steps = self.dr * cols + self.dc
+        self.steps_odd = self.steps if kind != 'hex' else \
+            self.dr * cols + self.dc_odd
+        self.full = None
+        self.csr = None
+        self.graph = None
+
+    def adjacent(self, cells):
+        """
+        The neighbours of a cell or an array of cells, padded to a fixed
+        width with the sentinel self.size.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        r, c = np.divmod(cells, self.cols)
+        steps = self.steps
+        if self.kind == 'hex':
+            steps = np.where((r % 2 == 1)[..., None], self.steps_odd, steps)
+        around = cells[..., None] + steps
+        m = self.margin
+        edge = (r < m) | (r >= self.rows - m) | (c < m) | (c >= self.cols - m)
+        if edge.any():
+            around[edge] = self.edge_rows(cells[edge])
+        return around
+
+    def edge_rows(self, cells):
+        """adjacent() of cells near the edges, where the steps go wrong."""
+        r, c = np.divmod(cells[:, None], self.cols)
+        dc = self.dc
+        if self.kind == 'hex':
+            dc = np.where(r % 2 == 1, self.dc_odd, dc)
+        x, y = r + self.dr, c + dc
+        if self.kind != 'torus':
+            return np.where((x >= 0) & (x < self.rows) & (y >= 0) &
+                            (y < self.cols), x * self.cols + y, self.size)
+        around = (x % self.rows) * self.cols + y % self.cols
+        # Tiny tori wrap onto the cell itself or onto a cell twice.
+        around[around == cells[:, None]] = self.size
+        around.sort(axis=1)
+        around[:, 1:][around[:, 1:] == around[:, :-1]] = self.size
+        return around
+
+    def neighbor_list(self, i):
+        """The neighbours of the single cell i as a list of cell numbers."""
+        indptr, indices = self.tables()
+        return indices[indptr[i]:indptr[i + 1]].tolist()
+
+    def cell_neighbors(self, i):
+        """neighbor_list(i) as an array, ready to index with."""
+        indptr, indices = self.tables()
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def tables(self):
+        """
+        The CSR tables (indptr, indices), built a band of cells at a time
+        so the padded rows of a huge board never exist all at once.
+        """
+        if self.csr is None:
+            dtype = np.min_scalar_type(self.size)
+            band = max(CHUNK // len(self.steps), 1)
+            counts, indices = [], []
+            for start in range(0, self.size, band):
+                rows = self.adjacent(np.arange(start,
+                                               min(start + band, self.size)))
+                keep = rows < self.size
+                counts.append(np.count_nonzero(keep, axis=1))
+                indices.append(rows[keep].astype(dtype))
+            indices = np.concatenate(indices) if indices else \
+                np.zeros(0, dtype=dtype)
+            indptr = np.zeros(self.size + 1, dtype=np.int64)
+            if counts:
+                np.cumsum(np.concatenate(counts), out=indptr[1:])
+            self.csr = (indptr, indices)
+        return self.csr
+
+    @property
+    def table(self):
+        if self.full is None:
+            self.full = self.adjacent(np.arange(self.size)) \
+                            .astype(np.min_scalar_type(self.size))
+        return self.full
+
+    @property
+    def indptr(self):
+        return self.tables()[0]
+
+    @property
+    def indices(self):
+        return self.tables()[1]
+
+    def rows_of(self, cells):
+        """The neighbours of all the given cells, one after another."""
+        indptr, indices = self.tables()
+        starts = indptr[cells]
+        counts = indptr[cells + 1] - starts
+        ends = np.cumsum(counts)
+        return indices[np.repeat(starts - ends + counts, counts) +
+                       np.arange(ends[-1] if len(ends) else 0)]
+
+    def neighbors(self, r, c):
+        """The (row, col) neighbours of a cell."""
+        return [divmod(j, self.cols)
+                for j in self.neighbor_list(r * self.cols + c)]
+
+    def gather(self, values):
+        """
+        The values of every cell's neighbours, from (..., rows, cols) to
+        (..., cells, width), with zero for the padding.
+        """
+        flat = values.reshape(values.shape[:-2] + (self.size,))
+        padded = np.zeros(flat.shape[:-1] + (self.size + 1,), dtype=flat.dtype)
+        padded[..., :-1] = flat
+        return padded[..., self.table]
+
+    def count(self, mask):
+        """Count the set neighbours of every cell of a (..., rows, cols) mask."""
+        if self.kind == 'square':
+            return count_neighbors(mask)
+        mask = np.asarray(mask, dtype=np.uint8)
+        return self.gather(mask).sum(axis=-1, dtype=np.uint8) \
+                   .reshape(mask.shape)
+
+    def dilate(self, mask):
+        """Grow a (..., rows, cols) mask onto the neighbours of its cells."""
+        if self.kind == 'square':
+            return dilate(mask)
+        mask = np.asarray(mask, dtype=bool)
+        return mask | self.gather(mask).any(axis=-1).reshape(mask.shape)
+
+    def minefield(self, mines):
+        """Turn a (..., rows, cols) mine mask into a minefield."""
+        mines = np.asarray(mines, dtype=bool)
+        minefield = self.count(mines)
+        minefield[mines] = MINE
+        return minefield
+
+    def label(self, mask):
+        """
+        Label the connected regions of a mask 1, 2, ... (0 outside them).
+        Returns the labels and the number of regions.
+        """
+        if self.kind == 'square':
+            from scipy import ndimage  # slow to import
+            return ndimage.label(mask, structure=np.ones((3, 3)))
+        from scipy import sparse
+        from scipy.sparse import csgraph
+        if self.graph is None:
+            self.graph = sparse.csr_matrix(
+                (np.ones(len(self.indices), dtype=bool), self.indices,
+                 self.indptr), shape=(self.size, self.size))
+        cells = np.flatnonzero(mask)
+        n, parts = csgraph.connected_components(
+            self.graph[cells][:, cells], directed=False)
+        labels = np.zeros(self.size, dtype=np.int32)
+        labels[cells] = parts + 1
+        return labels.reshape(self.rows, self.cols), n
+
+    def openings(self, minefield):
+        """
+        The openings of a board (the connected regions of zeros) as their
+        labels and CSR-style cell lists: the cells of opening k are
+        cells[starts[k - 1]:starts[k]].
+        """
+        labels, n = self.label(minefield == 0)
+        labels = labels.astype(np.min_scalar_type(n))
+        flat = labels.ravel()
+        zeros = np.flatnonzero(flat)
+        cells = zeros[np.argsort(flat[zeros], kind='stable')]
+        cells = cells.astype(np.min_scalar_type(self.size))
+        starts = np.cumsum(np.bincount(flat[zeros], minlength=n + 1))
+        return labels, cells, starts
+
+    def around(self, cells):
+        """The given cells and all their neighbours, as sorted cell numbers."""
+        cells = np.asarray(cells, dtype=np.int64)
+        if len(cells) * 128 < self.size:
+            return np.union1d(cells, self.rows_of(cells))
+        hit = np.zeros(self.size, dtype=bool)
+        hit[cells] = True
+        return np.flatnonzero(self.dilate(hit.reshape(self.rows, self.cols)))